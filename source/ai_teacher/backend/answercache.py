@@ -0,0 +1,358 @@
+#
+# Answer cache
+# Copyright (C) 2025 Remeny
+#
+# Students ask the same questions about the same lessons again and
+# again, and every model answer takes seconds. Answers are cached under
+# a key made of the normalized question, the hashes of the lesson chunks
+# it was answered from (see retrieval.py) and the teacher's persona
+# settings, so a changed lesson or persona never returns an old answer.
+#
+# Two tiers: a small in-memory LRU in front of data/.cache/answers.db,
+# a SQLite database (WAL mode) that several instances of the program can
+# share. The database has a size limit (least recently used answers are
+# dropped first) and every answer expires after ttl_hours. Its totals
+# table is kept up to date by triggers, so every instance sees the same
+# size without scanning the table.
+#
+# Anything going wrong with the database (locked for too long, disk
+# full...) only turns into a cache miss: the cache never stops a chat.
+#
+#   python -m ai_teacher.backend.answercache stats
+#   python -m ai_teacher.backend.answercache purge
+#   python -m ai_teacher.backend.answercache clear
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Iterable, Mapping, Union
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# ---[ Variables ]--- #
+DATABASE_FILENAME: str = "answers.db"
+SCHEMA_VERSION: int = 1
+KEY_VERSION: int = 1  # Changing how keys are made must not return old answers
+
+# Last use is only written again when older than this, so hits stay reads
+TOUCH_INTERVAL: float = 60.0
+# When over the size limit, answers are dropped down to this part of it
+EVICT_TO: float = 0.9
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used);
+CREATE INDEX IF NOT EXISTS answers_expires ON answers (expires);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    evictions INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0, 0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS answers_insert AFTER INSERT ON answers BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + new.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS answers_update AFTER UPDATE OF size ON answers BEGIN
+    UPDATE totals SET bytes = bytes + new.size - old.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS answers_delete AFTER DELETE ON answers BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - old.size WHERE id = 0;
+END;
+"""
+
+SQL_GET = "SELECT answer, expires, last_used FROM answers WHERE key = ?"
+SQL_TOUCH = "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE key = ?"
+SQL_PUT = """
+INSERT INTO answers (key, answer, created, expires, last_used, size) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET answer = excluded.answer, created = excluded.created,
+    expires = excluded.expires, last_used = excluded.last_used, size = excluded.size
+"""
+SQL_DELETE = "DELETE FROM answers WHERE key = ?"
+SQL_DELETE_EXPIRED = "DELETE FROM answers WHERE expires <= ?"
+SQL_DELETE_OLDEST = "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT ?)"
+SQL_TOTALS = "SELECT entries, bytes, hits, misses, evictions FROM totals WHERE id = 0"
+SQL_ADD_COUNTS = "UPDATE totals SET hits = hits + ?, misses = misses + ?, evictions = evictions + ? WHERE id = 0"
+
+# ---[ Keys ]--- #
+PUNCTUATION = re.compile(r"[^\w\s]+")
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    """
+    Case, accents, punctuation and spacing do not make a question different.
+    """
+    text = unicodedata.normalize("NFKD", question.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return WHITESPACE.sub(" ", PUNCTUATION.sub(" ", text)).strip()
+
+def cache_key(question: str, chunk_hashes: Iterable[str], persona: Mapping[str, Any]) -> str:
+    """
+    Key of an answer.
+
+    Args:
+        question (str): The student's question as typed.
+        chunk_hashes (Iterable[str]): "hash" of every lesson chunk given to the model.
+        persona (Mapping): Settings that change answers (e.g. shared.settings.teacher.as_dict()).
+    """
+    digest = blake2b(digest_size=16)
+    digest.update(json.dumps([KEY_VERSION, normalize_question(question), sorted(chunk_hashes),
+                              sorted((str(k), v) for k, v in persona.items())],
+                             ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+# ---[ Cache ]--- #
+class AnswerCache:
+    """
+    In-memory LRU in front of a shared SQLite database. Safe to use from
+    several threads and processes.
+
+    Args:
+        path (str): Database file (created if missing).
+        memory_entries (int): Answers kept in memory.
+        max_bytes (int): Size limit of the answers in the database.
+        ttl (float): Seconds an answer stays valid.
+    """
+    def __init__(self, path: str, memory_entries: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 7 * 24 * 3600.0) -> None:
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # {key: (answer, expires)}
+        self._memory: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Counted here, added to the shared totals by flush_counts()
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._unflushed: list[int] = [0, 0, 0]  # hits, misses, evictions
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, cached_statements=32)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush_counts()
+            self._db.close()
+
+    # ---[ Memory tier ]--- #
+    def _remember(self, key: str, answer: str, expires: float) -> None:
+        self._memory[key] = (answer, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # ---[ Reading and writing ]--- #
+    def get(self, key: str) -> Union[str, None]:
+        """
+        The cached answer, or None.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self._unflushed[0] += 1
+                    return entry[0]
+                del self._memory[key]
+            try:
+                row = self._db.execute(SQL_GET, (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    if now - row[2] > TOUCH_INTERVAL:
+                        with self._db:
+                            self._db.execute(SQL_TOUCH, (now, key))
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    self._unflushed[0] += 1
+                    return row[0]
+            except sqlite3.Error as e:
+                f.dbg(f"Answer cache read failed: {e}")
+            self.misses += 1
+            self._unflushed[1] += 1
+            return None
+
+    def put(self, key: str, answer: str, ttl: Union[float, None] = None) -> None:
+        """
+        Stores an answer (replacing the one under the same key).
+        """
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        size = len(answer.encode("utf-8")) + len(key)
+        with self._lock:
+            self._remember(key, answer, expires)
+            if size > self.max_bytes:
+                return
+            try:
+                with self._db:
+                    self._db.execute(SQL_PUT, (key, answer, now, expires, now, size))
+                    self._evict(now)
+            except sqlite3.Error as e:
+                f.dbg(f"Answer cache write failed: {e}")
+
+    def _evict(self, now: float) -> None:
+        """
+        Drops expired answers, then the least recently used ones, while
+        the database is over its size limit. Runs in put()'s transaction,
+        so two instances never evict at the same time.
+        """
+        entries, size = self._db.execute(SQL_TOTALS).fetchone()[:2]
+        if size <= self.max_bytes:
+            return
+        evicted = self._db.execute(SQL_DELETE_EXPIRED, (now,)).rowcount
+        target = self.max_bytes * EVICT_TO
+        while True:
+            entries, size = self._db.execute(SQL_TOTALS).fetchone()[:2]
+            if size <= target or entries <= 1:
+                break
+            # Guess how many to drop from the average size, at least one
+            count = max(1, int((size - target) / max(1.0, size / entries)) + 1)
+            evicted += self._db.execute(SQL_DELETE_OLDEST, (count,)).rowcount
+        self.evictions += evicted
+        self._unflushed[2] += evicted
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+            try:
+                with self._db:
+                    self._db.execute(SQL_DELETE, (key,))
+            except sqlite3.Error as e:
+                f.dbg(f"Answer cache delete failed: {e}")
+
+    def purge_expired(self) -> int:
+        """
+        Deletes expired answers. Returns how many.
+        """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (_, expires) in self._memory.items() if expires <= now]:
+                del self._memory[key]
+            with self._db:
+                return self._db.execute(SQL_DELETE_EXPIRED, (now,)).rowcount
+
+    def clear(self) -> None:
+        """
+        Forgets every answer (other instances keep their memory tier).
+        """
+        with self._lock:
+            self._memory.clear()
+            with self._db:
+                self._db.execute("DELETE FROM answers")
+            self._db.execute("VACUUM")
+
+    # ---[ Counters ]--- #
+    def flush_counts(self) -> None:
+        """
+        Adds this instance's hits, misses and evictions to the shared totals.
+        """
+        with self._lock:
+            if not any(self._unflushed):
+                return
+            try:
+                with self._db:
+                    self._db.execute(SQL_ADD_COUNTS, self._unflushed)
+                self._unflushed = [0, 0, 0]
+            except sqlite3.Error as e:
+                f.dbg(f"Answer cache counters not saved: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        """
+        This instance's counters and the shared totals of the database.
+        """
+        with self._lock:
+            self.flush_counts()
+            entries, size, hits, misses, evictions = self._db.execute(SQL_TOTALS).fetchone()
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "shared": {"entries": entries, "bytes": size, "hits": hits, "misses": misses, "evictions": evictions},
+            }
+
+# Cache of the application, set up by get_cache()
+cache: Union[AnswerCache, None] = None
+cache_lock: threading.Lock = threading.Lock()
+
+def get_cache() -> Union[AnswerCache, None]:
+    """
+    The answer cache configured in [Cache], or None when it is disabled.
+    """
+    from ai_teacher.resources import shared
+    global cache
+    settings = shared.settings.cache
+    if not settings.enable:
+        return None
+    with cache_lock:
+        if cache is None:
+            cache = AnswerCache(
+                os.path.join(shared.app_dir, "data", ".cache", DATABASE_FILENAME),
+                memory_entries=settings.memory_entries,
+                max_bytes=settings.max_size_mb * 1024 * 1024,
+                ttl=settings.ttl_hours * 3600.0
+            )
+    return cache
+
+def close() -> None:
+    global cache
+    with cache_lock:
+        if cache is not None:
+            cache.close()
+            cache = None
+
+# ---[ Command line ]--- #
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    app_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    parser = argparse.ArgumentParser(description="Answer cache maintenance.")
+    parser.add_argument("--database", default=os.path.join(app_dir, "data", ".cache", DATABASE_FILENAME))
+    parser.add_argument("command", choices=("stats", "purge", "clear"))
+    args = parser.parse_args(argv)
+
+    answer_cache = AnswerCache(args.database)
+    try:
+        if args.command == "purge":
+            print(f"{answer_cache.purge_expired()} expired answer(s) deleted")
+        elif args.command == "clear":
+            answer_cache.clear()
+            print("Answer cache cleared")
+        print(json.dumps(answer_cache.stats()["shared"], indent=2))
+    finally:
+        answer_cache.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,10 +6,16 @@
 # ---[ Libraries ]--- #
 from ai_teacher.resources import functions as f
 from ai_teacher.resources import shared
-from typing import Union
+from typing import Callable, Union
 
 import cv2
+import glob
+import json
+import os
 import platform
+import struct
+import threading
+import time
 
 # ---[ Variables ]--- #
 # Items in the following list are the ones which get displayed on camera window
@@ -36,11 +42,155 @@ user_instruction_ini_setting: list[str] = [
 # This variable keeps track of which instruction it's currently at
 user_instruction_count: int = 0
 
-def list_cameras() -> list[tuple[int, str]]:
+# Camera probing cache (see list_cameras)
+camera_cache_lock: threading.Lock = threading.Lock()
+
+# V4L2 capability query (linux/videodev2.h): VIDIOC_QUERYCAP and its capability bits
+VIDIOC_QUERYCAP: int = 0x80685600
+V4L2_CAP_VIDEO_CAPTURE: int = 0x00000001
+V4L2_CAP_VIDEO_CAPTURE_MPLANE: int = 0x00001000
+V4L2_CAP_DEVICE_CAPS: int = 0x80000000
+
+def _cache_file() -> str:
+    return os.path.join(shared.app_dir, "data", "camera_cache.json")
+
+def _load_cache() -> dict[str, dict[str, Union[bool, str, int]]]:
+    try:
+        with open(_cache_file(), "r", encoding="utf-8") as file:
+            cache = json.load(file)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache: dict[str, dict[str, Union[bool, str, int]]]) -> None:
+    path = _cache_file()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(cache, file, indent=1)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        f.dbg(f"Could not save camera cache: {e}")
+
+def video_devices() -> list[tuple[int, str]]:
+    """
+    Lists (index, device node) pairs from /dev/video*, sorted by index.
+    Empty on systems without V4L device nodes.
+    """
+    devices: list[tuple[int, str]] = []
+    for path in glob.glob("/dev/video*"):
+        suffix = path[len("/dev/video"):]
+        if suffix.isdigit():
+            devices.append((int(suffix), path))
+    return sorted(devices)
+
+def device_signature() -> tuple[tuple[str, int], ...]:
+    """
+    Device nodes with their modification times. Changes whenever a
+    camera is plugged in or removed.
+    """
+    signature: list[tuple[str, int]] = []
+    for _, path in video_devices():
+        try:
+            signature.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(signature)
+
+def _device_name(index: int) -> str:
+    """
+    Friendly V4L name of a device, if the kernel exposes one.
+    """
+    try:
+        with open(f"/sys/class/video4linux/video{index}/name", "r", encoding="utf-8") as file:
+            name = file.read().strip()
+        if name:
+            return f"{name} ({index})"
+    except OSError:
+        pass
+    return f"Camera {index}"
+
+def _can_capture(path: str) -> Union[bool, None]:
+    """
+    Whether a V4L device node captures video, asked from the driver
+    without starting a stream (works while another app uses the camera).
+    Metadata nodes, which every UVC camera has next to its capture node,
+    answer False. None if the driver could not be asked.
+    """
+    try:
+        import fcntl
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    except (ImportError, OSError):
+        return None
+    try:
+        buffer = bytearray(104)  # struct v4l2_capability
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buffer)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    capabilities, device_caps = struct.unpack_from("=II", buffer, 84)
+    if capabilities & V4L2_CAP_DEVICE_CAPS:
+        capabilities = device_caps  # The caps of this node, not of the whole device
+    return bool(capabilities & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE))
+
+def _probe(index: int) -> bool:
+    """
+    Opens a camera index and tries to read one frame.
+    """
+    cap = cv2.VideoCapture(index)
+    try:
+        f.dbg(f"Trying capture: {cap}")
+        return check_camera(cap)
+    finally:
+        cap.release()
+
+def _probe_all(indices: list[int], timeout: float) -> dict[int, Union[bool, None]]:
+    """
+    Probes camera indices in parallel. A probe that does not finish
+    within the timeout is reported as None (unknown).
+
+    Probes run on daemon threads: a probe stuck in cv2.VideoCapture is
+    left behind and does not keep the app from exiting (executor
+    workers would be joined at exit).
+    """
+    results: dict[int, Union[bool, None]] = {}
+    finished: dict[int, bool] = {}
+
+    def run(index: int) -> None:
+        try:
+            finished[index] = _probe(index)
+        except Exception as e:
+            f.dbg(f"Camera {index} probe failed: {e}")
+            finished[index] = False
+
+    threads = {index: threading.Thread(target=run, args=(index,), name=f"camera-probe-{index}", daemon=True)
+               for index in indices}
+    for thread in threads.values():
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for index, thread in threads.items():
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if index in finished:
+            results[index] = finished[index]
+        else:
+            f.dbg(f"Camera {index} did not answer within {timeout} seconds")
+            results[index] = None
+    return results
+
+def list_cameras(use_cache: bool = True) -> list[tuple[int, str]]:
     """
     List available cameras.
+
+    On Linux the candidates come from /dev/video*. They are probed in
+    parallel, and results are cached in data/camera_cache.json keyed by
+    device node and modification time, so unchanged devices are not
+    opened again on the next launch. Working cameras and nodes that
+    cannot capture at all (metadata nodes) are cached; a capture node
+    that was busy or slow to open is probed again next time.
     """
     cameras: list[tuple[int, str]] = []
+    timeout: float = shared.settings.camera.probe_timeout
 
     if platform.system() == "Windows":
         # Windows
@@ -49,24 +199,76 @@ def list_cameras() -> list[tuple[int, str]]:
         devices = graph.get_input_devices()
         for i, name in enumerate(devices):
             cameras.append((i, name))
+    elif video_devices():
+        # Linux
+        with camera_cache_lock:
+            cache = _load_cache() if use_cache else {}
+            fresh: dict[str, dict[str, Union[bool, str, int]]] = {}
+            to_probe: dict[int, str] = {}
+
+            for index, path in video_devices():
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                entry = cache.get(path)
+                if entry and entry.get("mtime") == mtime and (entry.get("ok") or entry.get("capture") is False):
+                    fresh[path] = entry
+                    continue
+                fresh[path] = {"index": index, "mtime": mtime, "ok": False, "name": _device_name(index)}
+                if _can_capture(path) is False:
+                    fresh[path]["capture"] = False  # Definitely not a camera, never probed again
+                else:
+                    to_probe[index] = path
+
+            f.dbg(f"Probing cameras {list(to_probe)}, {len(fresh) - len(to_probe)} taken from cache")
+            for index, ok in _probe_all(list(to_probe), timeout).items():
+                path = to_probe[index]
+                if ok:
+                    fresh[path]["ok"] = True
+                else:
+                    fresh.pop(path, None)  # Busy, failed or unknown, probe again next time
+
+            _save_cache(fresh)
+
+        for entry in sorted(fresh.values(), key=lambda e: int(e["index"])):
+            if entry["ok"]:
+                cameras.append((int(entry["index"]), str(entry["name"])))
     else:
-        # Linux, mac
-        i = 0
-        fails = 0
-        while fails < 3:  # stop after 3 failed indices in a row
-            cap = cv2.VideoCapture(i)
-            f.dbg(f"Trying capture: {cap}")
-            if check_camera(cap):
-                cameras.append((i, f"Camera {i}"))
-                fails = 0
-            else:
-                fails += 1
-            cap.release()
-            i += 1
+        # Mac and others: no device nodes, probe the first few indices
+        for index, ok in sorted(_probe_all(list(range(4)), timeout).items()):
+            if ok:
+                cameras.append((index, f"Camera {index}"))
 
     f.dbg(f"Available cameras: {cameras}")
     return cameras
 
+def watch_cameras(callback: Callable[[list[tuple[int, str]]], None],
+                  interval: float = 2.0) -> threading.Event:
+    """
+    Re-scans cameras on a background thread whenever /dev/video* changes
+    and calls callback(cameras) from that thread.
+
+    Returns an Event; set it to stop watching.
+    """
+    stop = threading.Event()
+
+    def watch() -> None:
+        signature = device_signature()
+        while not stop.wait(interval):
+            current = device_signature()
+            if current == signature:
+                continue
+            signature = current
+            f.dbg("Camera devices changed, re-scanning")
+            try:
+                callback(list_cameras())
+            except Exception as e:
+                f.dbg(f"Camera re-scan failed: {e}")
+
+    threading.Thread(target=watch, name="camera-watch", daemon=True).start()
+    return stop
+
 def check_camera(camera: "cv2.VideoCapture") -> bool:
     """
     Check if the camera is working
@@ -106,10 +308,16 @@ def capture_face_points(left_eye: list[float], right_eye: list[float], nose: lis
     key = user_instruction_ini_setting[user_instruction_count]
     points = {'left': left_eye, 'right': right_eye, 'nose': nose}
     
-    for name, coords in points.items():
-        f.dbg(name.upper(), coords)
-        for axis, value in zip('xyz', coords):
-            f.update_user_config('Facemarks', f"{key}_{name}_{axis}", value)
+    # One write for all 9 values
+    with f.config_transaction():
+        for name, coords in points.items():
+            f.dbg(name.upper(), coords)
+            for axis, value in zip('xyz', coords):
+                f.update_user_config('Facemarks', f"{key}_{name}_{axis}", value)
+    
+    # Every capture is also kept as a sample, so re-calibrations build up a history
+    if shared.user_store is not None:
+        shared.user_store.add_calibration_sample(key, [nose, left_eye, right_eye])
     
     user_instruction_count += 1
     return user_instructions[user_instruction_count]
\ No newline at end of file
@@ -0,0 +1,466 @@
+#
+# Head movement events
+# Copyright (C) 2025 Remeny
+#
+# Turns the landmark stream into simple, timestamped events such as
+# USER_TURN_LEFT that the AI can react to. Detection uses hysteresis
+# (separate enter/exit thresholds) and debouncing (a new state must hold
+# for a while before it is reported), so jitter does not produce event
+# storms.
+#
+# Events are published on a bus. Subscribers get their own bounded
+# drop-oldest buffer, either as a blocking generator or as an async
+# iterator; a slow subscriber never slows down the camera thread.
+#
+# Recorded landmark sequences can be replayed without a camera:
+#
+#   python -m ai_teacher.backend.events recording.npz
+#
+# and --check replays a synthetic sequence with known events, to verify
+# the hysteresis, hold and face lost timing after changes:
+#
+#   python -m ai_teacher.backend.events --check
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources.pipeline import DropQueue, QueueClosed
+from ai_teacher.backend.facetrack import TRACKED_LANDMARKS
+
+from configparser import ConfigParser
+from enum import Enum
+from typing import Any, AsyncIterator, Iterable, Iterator, Union
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+# ---[ Event types ]--- #
+class EventType(str, Enum):
+    USER_TURN_LEFT = "USER_TURN_LEFT"
+    USER_TURN_RIGHT = "USER_TURN_RIGHT"
+    USER_LOOK_UP = "USER_LOOK_UP"
+    USER_LOOK_DOWN = "USER_LOOK_DOWN"
+    USER_LOOK_CENTER = "USER_LOOK_CENTER"
+    USER_FACE_LOST = "USER_FACE_LOST"
+    USER_FACE_FOUND = "USER_FACE_FOUND"
+
+class HeadEvent:
+    """
+    One detected event. value is the yaw or pitch that triggered it
+    (0.0 for face found/lost).
+    """
+    __slots__ = ("type", "timestamp", "value")
+
+    def __init__(self, type: EventType, timestamp: float, value: float = 0.0) -> None:
+        self.type = type
+        self.timestamp = timestamp
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"HeadEvent({self.type.value}, t={self.timestamp:.3f}, value={self.value:.3f})"
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, HeadEvent) and self.type == other.type
+                and self.timestamp == other.timestamp and self.value == other.value)
+
+# ---[ Detector ]--- #
+class HeadEventDetector:
+    """
+    Detects head turns from [nose, left iris, right iris] points.
+
+    Yaw and pitch are the nose offset from the middle of the eyes,
+    divided by the distance between the eyes. They are measured
+    against a neutral baseline that slowly follows the user while
+    they look straight ahead.
+
+    Args:
+        enter (float): Offset from the baseline needed to enter a turned state.
+        exit (float): Offset below which the head counts as centred again.
+        hold (float): Seconds a new state must hold before it is reported.
+        lost_after (float): Seconds without a face before USER_FACE_LOST.
+        baseline_rate (float): How fast the baseline follows (0 = fixed).
+        mirrored (bool): True if frames are mirrored (selfie view).
+    """
+    def __init__(self, enter: float = 0.25, exit: float = 0.15, hold: float = 0.15,
+                 lost_after: float = 0.5, baseline_rate: float = 0.02,
+                 mirrored: bool = False) -> None:
+        if exit > enter:
+            raise ValueError("The exit threshold must not be larger than the enter threshold")
+        self.enter = enter
+        self.exit = exit
+        self.hold = hold
+        self.lost_after = lost_after
+        self.baseline_rate = baseline_rate
+        self.mirrored = mirrored
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config: "ConfigParser") -> "HeadEventDetector":
+        """
+        Creates a detector using the [Camera] section of configuration.ini.
+        """
+        return cls(
+            enter=config.getfloat('Camera', 'event_enter_threshold', fallback=0.25),
+            exit=config.getfloat('Camera', 'event_exit_threshold', fallback=0.15),
+            hold=config.getfloat('Camera', 'event_hold_time', fallback=0.15)
+        )
+
+    def reset(self) -> None:
+        self.baseline: Union[tuple[float, float], None] = None
+        # Confirmed and candidate state per axis: -1, 0 or 1
+        self._state: dict[str, int] = {"yaw": 0, "pitch": 0}
+        self._candidate: dict[str, tuple[int, float]] = {"yaw": (0, 0.0), "pitch": (0, 0.0)}
+        self._face: bool = False
+        self._last_seen: float = 0.0
+
+    @staticmethod
+    def head_angles(points: Any) -> Union[tuple[float, float], None]:
+        """
+        (yaw, pitch) proxies of one set of [nose, left, right] points.
+        Plain floats are much faster than numpy for nine values.
+        """
+        (nx, ny, _), (lx, ly, _), (rx, ry, _) = points
+        span = ((lx - rx) ** 2 + (ly - ry) ** 2) ** 0.5
+        if span < 1e-6:
+            return None
+        return (nx - (lx + rx) * 0.5) / span, (ny - (ly + ry) * 0.5) / span
+
+    def _axis(self, axis: str, offset: float, timestamp: float) -> Union[int, None]:
+        """
+        Hysteresis + debounce for one axis. Returns the new confirmed
+        state when it changes, else None.
+        """
+        state = self._state[axis]
+        if state == 0:
+            target = 1 if offset >= self.enter else -1 if offset <= -self.enter else 0
+        else:
+            # Stay turned until we are back inside the exit band (or turned the other way)
+            if offset * state <= -self.enter:
+                target = -state
+            elif abs(offset) <= self.exit:
+                target = 0
+            else:
+                target = state
+
+        if target == state:
+            self._candidate[axis] = (state, timestamp)
+            return None
+        candidate, since = self._candidate[axis]
+        if candidate != target:
+            self._candidate[axis] = (target, timestamp)
+            since = timestamp
+        if timestamp - since < self.hold:
+            return None
+        self._state[axis] = target
+        return target
+
+    def update(self, points: Any, timestamp: Union[float, None] = None) -> list[HeadEvent]:
+        """
+        Feeds one frame. points is a (3, 3) [nose, left, right] array,
+        a full (N, 3) landmark array or None when no face was found.
+        Returns the events this frame produced (usually none).
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        events: list[HeadEvent] = []
+
+        if points is not None and len(points) > 3:
+            points = np.asarray(points)[list(TRACKED_LANDMARKS)]
+        angles = self.head_angles(points.tolist() if isinstance(points, np.ndarray) else points) if points is not None else None
+
+        if angles is None:
+            if self._face and timestamp - self._last_seen >= self.lost_after:
+                self._face = False
+                self._state = {"yaw": 0, "pitch": 0}
+                self._candidate = {"yaw": (0, timestamp), "pitch": (0, timestamp)}
+                events.append(HeadEvent(EventType.USER_FACE_LOST, timestamp))
+            return events
+
+        self._last_seen = timestamp
+        if not self._face:
+            self._face = True
+            events.append(HeadEvent(EventType.USER_FACE_FOUND, timestamp))
+
+        yaw, pitch = angles
+        if self.mirrored:
+            yaw = -yaw
+        if self.baseline is None:
+            self.baseline = (yaw, pitch)
+        yaw_offset = yaw - self.baseline[0]
+        pitch_offset = pitch - self.baseline[1]
+
+        was_centered = self._state["yaw"] == 0 and self._state["pitch"] == 0
+        yaw_state = self._axis("yaw", yaw_offset, timestamp)
+        pitch_state = self._axis("pitch", pitch_offset, timestamp)
+
+        # Nose moves to the image right when the user turns to their left
+        if yaw_state == 1:
+            events.append(HeadEvent(EventType.USER_TURN_LEFT, timestamp, yaw_offset))
+        elif yaw_state == -1:
+            events.append(HeadEvent(EventType.USER_TURN_RIGHT, timestamp, yaw_offset))
+        if pitch_state == 1:
+            events.append(HeadEvent(EventType.USER_LOOK_DOWN, timestamp, pitch_offset))
+        elif pitch_state == -1:
+            events.append(HeadEvent(EventType.USER_LOOK_UP, timestamp, pitch_offset))
+
+        centered = self._state["yaw"] == 0 and self._state["pitch"] == 0
+        if centered and not was_centered:
+            events.append(HeadEvent(EventType.USER_LOOK_CENTER, timestamp))
+        if centered and self.baseline_rate > 0:
+            # Follow slow posture changes while looking straight ahead
+            rate = self.baseline_rate
+            self.baseline = (self.baseline[0] + (yaw - self.baseline[0]) * rate,
+                             self.baseline[1] + (pitch - self.baseline[1]) * rate)
+        return events
+
+# ---[ Event bus ]--- #
+class Subscription:
+    """
+    A subscriber's bounded buffer. Iterate over it to receive events;
+    iteration ends when the subscription (or bus) is closed.
+    """
+    def __init__(self, bus: "EventBus", maxsize: int) -> None:
+        self.bus = bus
+        self.queue = DropQueue(maxsize)
+
+    @property
+    def dropped(self) -> int:
+        return self.queue.dropped
+
+    def get(self, timeout: Union[float, None] = None) -> Union[HeadEvent, None]:
+        """
+        Waits for the next event. Returns None on timeout or when closed.
+        """
+        try:
+            return self.queue.get(timeout)
+        except QueueClosed:
+            return None
+
+    def drain(self) -> list[HeadEvent]:
+        """
+        Returns all buffered events without waiting.
+        """
+        events: list[HeadEvent] = []
+        while len(self.queue):
+            event = self.get(0)
+            if event is None:
+                break
+            events.append(event)
+        return events
+
+    def __iter__(self) -> Iterator[HeadEvent]:
+        while True:
+            try:
+                event = self.queue.get()
+            except QueueClosed:
+                return
+            if event is not None:
+                yield event
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+        self.queue.close()
+
+class AsyncSubscription:
+    """
+    asyncio version of Subscription: 'async for event in subscription'.
+    Events are handed to the event loop thread-safely; when the buffer
+    is full the oldest event is dropped.
+    """
+    def __init__(self, bus: "EventBus", maxsize: int, loop: asyncio.AbstractEventLoop) -> None:
+        self.bus = bus
+        self.loop = loop
+        self.queue: "asyncio.Queue[Union[HeadEvent, None]]" = asyncio.Queue(maxsize)
+        self.dropped: int = 0
+        self.closed: bool = False
+
+    def _put(self, event: Union[HeadEvent, None]) -> None:
+        # Runs in the event loop thread
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def put(self, event: HeadEvent) -> None:
+        if not self.closed:
+            self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self) -> Union[HeadEvent, None]:
+        return await self.queue.get()
+
+    def __aiter__(self) -> AsyncIterator[HeadEvent]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[HeadEvent]:
+        while True:
+            event = await self.queue.get()
+            if event is None:
+                return
+            yield event
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.bus.unsubscribe(self)
+        self.closed = True
+        self.loop.call_soon_threadsafe(self._put, None)
+
+class EventBus:
+    """
+    Fans events out to all subscribers. publish() never blocks.
+    """
+    def __init__(self) -> None:
+        self._subscribers: list[Union[Subscription, AsyncSubscription]] = []
+        self._lock = threading.Lock()
+        self.published: int = 0
+
+    def subscribe(self, maxsize: int = 64) -> Subscription:
+        subscription = Subscription(self, maxsize)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def subscribe_async(self, maxsize: int = 64,
+                        loop: Union[asyncio.AbstractEventLoop, None] = None) -> AsyncSubscription:
+        """
+        Subscribes from asyncio code (uses the running loop by default).
+        """
+        subscription = AsyncSubscription(self, maxsize, loop or asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Union[Subscription, AsyncSubscription]) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def publish(self, events: Iterable[HeadEvent]) -> None:
+        for event in events:
+            self.published += 1
+            with self._lock:
+                subscribers = tuple(self._subscribers)
+            for subscription in subscribers:
+                if isinstance(subscription, Subscription):
+                    subscription.queue.put(event)
+                else:
+                    subscription.put(event)
+
+    def close(self) -> None:
+        with self._lock:
+            subscribers = tuple(self._subscribers)
+        for subscription in subscribers:
+            subscription.close()
+
+# Bus the camera publishes its events on
+bus: EventBus = EventBus()
+
+# ---[ Recording and replay ]--- #
+def save_recording(path: str, landmarks: np.ndarray, timestamps: np.ndarray) -> None:
+    """
+    Saves a landmark sequence (e.g. LandmarkHistory.last(k, copy=True)) for replay.
+    """
+    np.savez_compressed(path, landmarks=np.asarray(landmarks, dtype=np.float32),
+                        timestamps=np.asarray(timestamps, dtype=np.float64))
+
+def load_recording(path: str) -> tuple[np.ndarray, np.ndarray]:
+    with np.load(path, allow_pickle=False) as data:
+        return data["landmarks"], data["timestamps"]
+
+def replay(landmarks: Iterable[Any], timestamps: Iterable[float],
+           detector: Union[HeadEventDetector, None] = None) -> Iterator[HeadEvent]:
+    """
+    Runs a detector over a recorded sequence and yields its events.
+    A frame may be NaN-filled or None to mark "no face".
+    """
+    detector = detector or HeadEventDetector()
+    for points, timestamp in zip(landmarks, timestamps):
+        if points is not None and np.isnan(np.asarray(points, dtype=np.float32)).any():
+            points = None
+        yield from detector.update(points, float(timestamp))
+
+# ---[ Replay check ]--- #
+CHECK_FPS: int = 64  # A power of two, so every timestamp of the check is an exact float
+
+def synthetic_recording() -> tuple[np.ndarray, np.ndarray]:
+    """
+    A made-up landmark sequence at CHECK_FPS with known events (see
+    check_replay()). Frames without a face are NaN-filled.
+    """
+    yaws: list[Union[float, None]] = (
+        [0.0] * 20      # Frames 0-19: centred
+        + [0.3] * 6     # 20-25: a blip past enter, shorter than hold (no event)
+        + [0.0] * 38    # 26-63: centred
+        + [0.3] * 64    # 64-127: turned left
+        + [0.2] * 32    # 128-159: between exit and enter, still turned
+        + [0.1] * 40    # 160-199: inside the exit band, centred again
+        + [None] * 40   # 200-239: no face
+        + [0.0] * 16    # 240-255: face back
+    )
+    frames = np.full((len(yaws), 3, 3), np.nan, dtype=np.float32)
+    for i, yaw in enumerate(yaws):
+        if yaw is not None:
+            # [nose, left iris, right iris], 0.2 apart: the nose offset is yaw * 0.2
+            frames[i] = ((0.5 + yaw * 0.2, 0.55, 0.0), (0.6, 0.5, 0.0), (0.4, 0.5, 0.0))
+    return frames, np.arange(len(yaws), dtype=np.float64) / CHECK_FPS
+
+def check_replay() -> list[str]:
+    """
+    Replays synthetic_recording() and compares the events with the exact
+    expected sequence. Returns the differences (empty when correct).
+    """
+    detector = HeadEventDetector(enter=0.25, exit=0.15, hold=0.125, lost_after=0.5, baseline_rate=0.0)
+    hold = round(detector.hold * CHECK_FPS)         # 8 frames
+    lost = round(detector.lost_after * CHECK_FPS)   # 32 frames
+    expected = [
+        (EventType.USER_FACE_FOUND, 0),
+        (EventType.USER_TURN_LEFT, 64 + hold),      # Turned at frame 64, held for hold
+        (EventType.USER_LOOK_CENTER, 160 + hold),   # Back inside the exit band at 160
+        (EventType.USER_FACE_LOST, 199 + lost),     # Last face at 199
+        (EventType.USER_FACE_FOUND, 240),
+    ]
+    landmarks, timestamps = synthetic_recording()
+    events = [(event.type, event.timestamp * CHECK_FPS) for event in replay(landmarks, timestamps, detector)]
+    problems = [f"Event {i}: expected {want[0].value} at frame {want[1]}, got "
+                + (f"{got[0].value} at frame {got[1]:g}" if got else "nothing")
+                for i, (want, got) in enumerate(zip(expected, events + [None] * len(expected))) # type: ignore
+                if got is None or got[0] != want[0] or got[1] != want[1]]
+    problems.extend(f"Unexpected {event_type.value} at frame {frame:g}" for event_type, frame in events[len(expected):])
+    return problems
+
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a landmark recording and print head movement events.")
+    parser.add_argument("recording", nargs="?", help=".npz file with 'landmarks' and 'timestamps' arrays")
+    parser.add_argument("--repeat", type=int, default=1, help="replay this many times (for timing)")
+    parser.add_argument("--check", action="store_true", help="verify the detector against a synthetic sequence")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check_replay()
+        for problem in problems:
+            print(problem)
+        print("Replay check " + ("failed" if problems else "passed"))
+        return 1 if problems else 0
+    if args.recording is None:
+        parser.error("a recording is needed (or --check)")
+
+    landmarks, timestamps = load_recording(args.recording)
+    start = time.perf_counter()
+    count = 0
+    for i in range(args.repeat):
+        for event in replay(landmarks, timestamps):
+            count += 1
+            if i == 0:
+                print(event)
+    elapsed = time.perf_counter() - start
+    frames = len(timestamps) * args.repeat
+    print(f"{frames} frames, {count} events in {elapsed:.3f} s "
+          f"({frames / elapsed if elapsed > 0 else 0:.0f} frames/s, {elapsed / max(frames, 1) * 1e6:.1f} us/frame)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
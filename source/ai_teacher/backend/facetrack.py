@@ -0,0 +1,601 @@
+#
+# Headless face tracking engine
+# Copyright (C) 2025 Remeny
+#
+# Wraps MediaPipe FaceMesh and the nose/iris extraction so it can run
+# without the GUI, on any frame source. Also works as a benchmark:
+#
+#   python -m ai_teacher.backend.facetrack synthetic:1280x720 --frames 300
+#   python -m ai_teacher.backend.facetrack path/to/video.mp4 --realtime
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources.pipeline import DropQueue, QueueClosed, start_stage
+from ai_teacher.backend.landmarks import LandmarkHistory
+
+from configparser import ConfigParser
+from typing import Any, Callable, Iterable, Iterator, Union
+
+import os
+import time
+import threading
+
+import cv2
+import numpy as np
+
+# ---[ Variables ]--- #
+# FaceMesh landmark indices we care about
+NOSE_TIP: int = 1
+LEFT_IRIS: int = 468
+RIGHT_IRIS: int = 473
+TRACKED_LANDMARKS: tuple[int, int, int] = (NOSE_TIP, LEFT_IRIS, RIGHT_IRIS)
+
+# Names used for the tracked points, same order as TRACKED_LANDMARKS
+POINT_NAMES: tuple[str, str, str] = ("nose", "left_iris", "right_iris")
+
+# Stage names reported by the engine metrics
+STAGES: tuple[str, ...] = ("read", "convert", "inference", "extract", "total")
+
+IMAGE_EXTENSIONS: tuple[str, ...] = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+Point = tuple[float, float, float]
+
+# ---[ Frame sources ]--- #
+class FrameSource:
+    """
+    Base class for anything that yields BGR uint8 frames.
+    Subclasses implement frames() and optionally close().
+    """
+    name: str = "source"
+    fps: float = 0.0  # Nominal rate, 0 if unknown/as fast as possible
+
+    def frames(self) -> Iterator[np.ndarray]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.frames()
+
+class CameraSource(FrameSource):
+    """
+    Live camera through cv2.VideoCapture.
+    """
+    def __init__(self, index: int) -> None:
+        self.name = f"camera:{index}"
+        self.capture = cv2.VideoCapture(index)
+        self.fps = float(self.capture.get(cv2.CAP_PROP_FPS) or 0.0)
+
+    def frames(self) -> Iterator[np.ndarray]:
+        while self.capture.isOpened():
+            ret, frame = self.capture.read()
+            if not ret:
+                break
+            yield frame
+
+    def close(self) -> None:
+        self.capture.release()
+
+class VideoFileSource(FrameSource):
+    """
+    Frames from a video file, optionally looping forever.
+    """
+    def __init__(self, path: str, loop: bool = False) -> None:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Video file not found: {path}")
+        self.name = path
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        self.fps = float(self.capture.get(cv2.CAP_PROP_FPS) or 0.0)
+
+    def frames(self) -> Iterator[np.ndarray]:
+        while True:
+            ret, frame = self.capture.read()
+            if ret:
+                yield frame
+            elif self.loop:
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            else:
+                return
+
+    def close(self) -> None:
+        self.capture.release()
+
+class ImageDirectorySource(FrameSource):
+    """
+    Frames from the images in a directory, in file name order.
+    """
+    def __init__(self, path: str, loop: bool = False) -> None:
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"Image directory not found: {path}")
+        self.name = path
+        self.loop = loop
+        self.files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+        if not self.files:
+            raise FileNotFoundError(f"No images found in: {path}")
+
+    def frames(self) -> Iterator[np.ndarray]:
+        while True:
+            for file in self.files:
+                frame = cv2.imread(file, cv2.IMREAD_COLOR)
+                if frame is not None:
+                    yield frame
+            if not self.loop:
+                return
+
+class ArraySource(FrameSource):
+    """
+    Frames from any in-memory iterable (list, generator...) of arrays.
+    """
+    def __init__(self, frames: Iterable[np.ndarray], name: str = "array", fps: float = 0.0) -> None:
+        self.name = name
+        self.fps = fps
+        self._frames = frames
+
+    def frames(self) -> Iterator[np.ndarray]:
+        for frame in self._frames:
+            yield np.ascontiguousarray(frame, dtype=np.uint8)
+
+class SyntheticSource(FrameSource):
+    """
+    Generated frames (a moving blob on a gradient). Nothing for FaceMesh
+    to find, but it exercises the whole pipeline at a known resolution.
+    """
+    def __init__(self, width: int = 640, height: int = 480, count: int = 0, fps: float = 0.0) -> None:
+        self.name = f"synthetic:{width}x{height}"
+        self.width = width
+        self.height = height
+        self.count = count  # 0 = endless
+        self.fps = fps
+
+    def frames(self) -> Iterator[np.ndarray]:
+        gradient = np.linspace(0, 255, self.width, dtype=np.uint8)
+        background = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        background[:] = gradient[None, :, None]
+        radius = max(4, min(self.width, self.height) // 8)
+        i = 0
+        while self.count <= 0 or i < self.count:
+            frame = background.copy()
+            x = int((0.5 + 0.35 * np.sin(i / 15.0)) * self.width)
+            y = int((0.5 + 0.25 * np.cos(i / 20.0)) * self.height)
+            cv2.circle(frame, (x, y), radius, (60, 170, 230), -1)
+            yield frame
+            i += 1
+
+def open_source(spec: str, loop: bool = False) -> FrameSource:
+    """
+    Opens a frame source from a short text description:
+        camera:<index>, synthetic[:<width>x<height>], a directory or a video file.
+    """
+    if spec.startswith("camera:"):
+        return CameraSource(int(spec.split(":", 1)[1]))
+    if spec == "synthetic" or spec.startswith("synthetic:"):
+        size = spec.split(":", 1)[1] if ":" in spec else "640x480"
+        width, height = (int(v) for v in size.lower().split("x"))
+        return SyntheticSource(width, height)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, loop=loop)
+    return VideoFileSource(spec, loop=loop)
+
+# ---[ Tracker ]--- #
+class TrackResult:
+    """
+    Result of tracking one frame.
+
+    rgb is the converted frame (callers may draw on it), points is a
+    (nose, left_iris, right_iris) tuple of rounded xyz points or None
+    when no face was found. landmarks is a (N, 3) float32 array in
+    full-frame normalized coordinates. inferred is False when the
+    adaptive rate skipped FaceMesh and the previous result was reused,
+    roi is True when FaceMesh only saw the cropped face region.
+    """
+    __slots__ = ("rgb", "points", "landmarks", "timings", "inferred", "roi")
+
+    def __init__(self, rgb: np.ndarray, points: Union[tuple[Point, Point, Point], None],
+                 landmarks: Union[np.ndarray, None], timings: dict[str, float],
+                 inferred: bool = True, roi: bool = False) -> None:
+        self.rgb = rgb
+        self.points = points
+        self.landmarks = landmarks
+        self.timings = timings
+        self.inferred = inferred
+        self.roi = roi
+
+def landmarks_to_array(landmarks: Any) -> np.ndarray:
+    """
+    Converts a FaceMesh landmark list into a (N, 3) float32 array.
+    """
+    count = len(landmarks)
+    return np.fromiter(
+        (value for lm in landmarks for value in (lm.x, lm.y, lm.z)),
+        dtype=np.float32, count=count * 3
+    ).reshape(count, 3)
+
+def extract_points(landmarks: np.ndarray) -> tuple[Point, Point, Point]:
+    """
+    Pulls the nose tip and both iris centres out of a landmark
+    array, rounded to 5 decimals.
+    """
+    rows = np.round(landmarks[list(TRACKED_LANDMARKS)].astype(np.float64), 5).tolist()
+    return tuple(tuple(row) for row in rows) # type: ignore
+
+class FaceTracker:
+    """
+    MediaPipe FaceMesh plus nose/iris extraction.
+
+    With roi_tracking, once a face is found FaceMesh only sees a padded
+    crop around it, downscaled to at most roi_size pixels. With
+    adaptive_rate, FaceMesh is skipped for up to max_skip_frames frames
+    in a row while landmarks move less than motion_threshold (normalized
+    units per frame), and runs every frame again as soon as they move.
+    Set precise to True to temporarily get full-frame, every-frame
+    results (used while capturing calibration points).
+    """
+    def __init__(self, max_faces: int = 1, refine_landmarks: bool = True,
+                 roi_tracking: bool = False, roi_padding: float = 0.3, roi_size: int = 320,
+                 adaptive_rate: bool = False, motion_threshold: float = 0.004,
+                 max_skip_frames: int = 3) -> None:
+        import mediapipe as mp # type: ignore
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(False, max_faces, refine_landmarks=refine_landmarks)
+        self.roi_tracking = roi_tracking
+        self.roi_padding = roi_padding
+        self.roi_size = roi_size
+        self.adaptive_rate = adaptive_rate
+        self.motion_threshold = motion_threshold
+        self.max_skip_frames = max_skip_frames
+        self.precise: bool = False
+
+        self._last: Union[TrackResult, None] = None
+        self._skip_budget: int = 0
+        self._skipped: int = 0
+
+    @classmethod
+    def from_config(cls, config: "ConfigParser") -> "FaceTracker":
+        """
+        Creates a tracker using the [Camera] section of configuration.ini.
+        """
+        return cls(
+            roi_tracking=config.getboolean('Camera', 'roi_tracking', fallback=False),
+            roi_padding=config.getfloat('Camera', 'roi_padding', fallback=0.3),
+            roi_size=config.getint('Camera', 'roi_size', fallback=320),
+            adaptive_rate=config.getboolean('Camera', 'adaptive_rate', fallback=False),
+            motion_threshold=config.getfloat('Camera', 'motion_threshold', fallback=0.004),
+            max_skip_frames=config.getint('Camera', 'max_skip_frames', fallback=3)
+        )
+
+    def _roi(self, width: int, height: int) -> Union[tuple[int, int, int, int], None]:
+        """
+        Padded pixel bounding box (x0, y0, x1, y1) around the last face.
+        """
+        if self._last is None or self._last.landmarks is None:
+            return None
+        xy = self._last.landmarks[:, :2]
+        (min_x, min_y), (max_x, max_y) = xy.min(axis=0), xy.max(axis=0)
+        pad_x = (max_x - min_x) * self.roi_padding
+        pad_y = (max_y - min_y) * self.roi_padding
+        x0 = max(0, int((min_x - pad_x) * width))
+        y0 = max(0, int((min_y - pad_y) * height))
+        x1 = min(width, int((max_x + pad_x) * width) + 1)
+        y1 = min(height, int((max_y + pad_y) * height) + 1)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return x0, y0, x1, y1
+
+    def _infer(self, image: np.ndarray) -> Union[np.ndarray, None]:
+        results = self.face_mesh.process(image)
+        if not results.multi_face_landmarks:
+            return None
+        return landmarks_to_array(results.multi_face_landmarks[0].landmark)
+
+    def _infer_roi(self, rgb: np.ndarray, box: tuple[int, int, int, int]) -> Union[np.ndarray, None]:
+        height, width = rgb.shape[:2]
+        x0, y0, x1, y1 = box
+        crop = rgb[y0:y1, x0:x1]
+        crop_w, crop_h = x1 - x0, y1 - y0
+        scale = self.roi_size / max(crop_w, crop_h)
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int(crop_w * scale)), max(1, int(crop_h * scale))),
+                              interpolation=cv2.INTER_LINEAR)
+        else:
+            crop = np.ascontiguousarray(crop)
+
+        landmarks = self._infer(crop)
+        if landmarks is None:
+            return None
+        # Back to full-frame normalized coordinates (z is relative to width)
+        landmarks[:, 0] = (x0 + landmarks[:, 0] * crop_w) / width
+        landmarks[:, 1] = (y0 + landmarks[:, 1] * crop_h) / height
+        landmarks[:, 2] *= crop_w / width
+        return landmarks
+
+    def _update_rate(self, landmarks: Union[np.ndarray, None]) -> None:
+        """
+        Grows the skip budget while the face is still, resets it on motion.
+        """
+        previous = self._last.landmarks if self._last is not None else None
+        if landmarks is None or previous is None or not self.adaptive_rate:
+            self._skip_budget = 0
+            return
+        idx = list(TRACKED_LANDMARKS)
+        motion = float(np.abs(landmarks[idx, :2] - previous[idx, :2]).mean())
+        # Motion per frame, the last inference may have been several frames ago
+        motion /= self._skipped + 1
+        if motion < self.motion_threshold:
+            self._skip_budget = min(self.max_skip_frames, self._skip_budget + 1)
+        else:
+            self._skip_budget = 0
+
+    def process(self, frame_bgr: np.ndarray) -> TrackResult:
+        """
+        Runs FaceMesh on a BGR frame.
+        """
+        t0 = time.perf_counter()
+        rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        t1 = time.perf_counter()
+
+        last = self._last
+        if (not self.precise and last is not None and last.landmarks is not None
+                and self._skipped < self._skip_budget):
+            self._skipped += 1
+            return TrackResult(rgb, last.points, last.landmarks, {"convert": t1 - t0},
+                               inferred=False, roi=last.roi)
+
+        landmarks = None
+        roi = False
+        box = self._roi(*rgb.shape[1::-1]) if self.roi_tracking and not self.precise else None
+        if box is not None:
+            landmarks = self._infer_roi(rgb, box)
+            roi = landmarks is not None
+        if landmarks is None:
+            # First detection, lost face or precise mode: whole frame
+            landmarks = self._infer(rgb)
+        t2 = time.perf_counter()
+
+        points = extract_points(landmarks) if landmarks is not None else None
+        self._update_rate(landmarks)
+        self._skipped = 0
+        t3 = time.perf_counter()
+
+        timings = {"convert": t1 - t0, "inference": t2 - t1, "extract": t3 - t2}
+        self._last = TrackResult(rgb, points, landmarks, timings, inferred=True, roi=roi)
+        return self._last
+
+    def warm_up(self, width: int = 640, height: int = 480) -> None:
+        """
+        Runs FaceMesh once on a blank frame so the model is loaded and
+        the graph is allocated before the first real frame arrives.
+        """
+        self.process(np.zeros((height, width, 3), dtype=np.uint8))
+        self._last = None
+        self._skip_budget = 0
+        self._skipped = 0
+
+    def close(self) -> None:
+        self.face_mesh.close()
+
+# ---[ Metrics ]--- #
+class EngineMetrics:
+    """
+    Frame counters and per-stage latency samples (seconds).
+    """
+    def __init__(self, window: int = 10000) -> None:
+        self.window = window
+        self.samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+        self.frames: int = 0
+        self.faces: int = 0
+        self.dropped: int = 0
+        self.inferences: int = 0  # Frames FaceMesh actually ran on
+        self.roi_inferences: int = 0  # ...of which on a cropped face region
+        self.started: float = time.perf_counter()
+        self.stopped: float = 0.0
+
+    def add(self, stage: str, seconds: float) -> None:
+        samples = self.samples.setdefault(stage, [])
+        samples.append(seconds)
+        if len(samples) > self.window * 2:
+            del samples[:-self.window]
+
+    def percentiles(self, stage: str, q: tuple[float, ...] = (50, 95, 99)) -> dict[str, float]:
+        samples = self.samples.get(stage) or [0.0]
+        values = np.percentile(np.asarray(samples[-self.window:]), q)
+        return {f"p{int(p)}": float(v) * 1000.0 for p, v in zip(q, values)}
+
+    @property
+    def elapsed(self) -> float:
+        return (self.stopped or time.perf_counter()) - self.started
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "faces": self.faces,
+            "dropped": self.dropped,
+            "inferences": self.inferences,
+            "roi_inferences": self.roi_inferences,
+            "skipped": self.frames - self.inferences,
+            "seconds": round(self.elapsed, 3),
+            "fps": round(self.fps, 2),
+            "latency_ms": {
+                stage: {k: round(v, 3) for k, v in self.percentiles(stage).items()}
+                for stage in self.samples if self.samples[stage]
+            }
+        }
+
+# ---[ Engine ]--- #
+class FaceTrackEngine:
+    """
+    Runs a FaceTracker over a FrameSource and collects metrics.
+
+    Offline mode (the default) processes every frame in order. Realtime
+    mode reads the source on its own thread, paced at the source fps if
+    known, and hands frames over through a drop-oldest queue like the
+    GUI does, so slow inference shows up as dropped frames.
+    """
+    def __init__(self, source: FrameSource, tracker: Union[FaceTracker, None] = None,
+                 realtime: bool = False, queue_size: int = 1,
+                 history: Union[LandmarkHistory, None] = None) -> None:
+        self.source = source
+        self.tracker = tracker or FaceTracker()
+        self.history = history
+        self.realtime = realtime
+        self.queue_size = queue_size
+        self.metrics = EngineMetrics()
+        self.stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run(self, max_frames: int = 0,
+            on_result: Union[Callable[[TrackResult], None], None] = None) -> EngineMetrics:
+        """
+        Processes frames until the source ends, max_frames is reached
+        (0 = no limit) or stop() is called. Returns the metrics.
+        """
+        self.metrics = EngineMetrics()
+        try:
+            if self.realtime:
+                self._run_realtime(max_frames, on_result)
+            else:
+                self._run_offline(max_frames, on_result)
+        finally:
+            self.metrics.stopped = time.perf_counter()
+        return self.metrics
+
+    def _handle(self, frame: np.ndarray, read_time: float,
+                on_result: Union[Callable[[TrackResult], None], None]) -> None:
+        start = time.perf_counter()
+        result = self.tracker.process(frame)
+        metrics = self.metrics
+        metrics.add("read", read_time)
+        for stage, seconds in result.timings.items():
+            metrics.add(stage, seconds)
+        metrics.add("total", read_time + time.perf_counter() - start)
+        metrics.frames += 1
+        if result.points is not None:
+            metrics.faces += 1
+        if result.inferred:
+            metrics.inferences += 1
+            if self.history is not None and result.landmarks is not None:
+                self.history.push(result.landmarks)
+            if result.roi:
+                metrics.roi_inferences += 1
+        if on_result is not None:
+            on_result(result)
+
+    def _run_offline(self, max_frames: int,
+                     on_result: Union[Callable[[TrackResult], None], None]) -> None:
+        frames = iter(self.source)
+        while not self.stop_event.is_set():
+            if max_frames and self.metrics.frames >= max_frames:
+                break
+            t0 = time.perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                break
+            self._handle(frame, time.perf_counter() - t0, on_result)
+
+    def _run_realtime(self, max_frames: int,
+                      on_result: Union[Callable[[TrackResult], None], None]) -> None:
+        frame_queue = DropQueue(self.queue_size)
+        reader = start_stage("facetrack-read", self._read_loop, frame_queue)
+        try:
+            while not self.stop_event.is_set():
+                if max_frames and self.metrics.frames >= max_frames:
+                    break
+                try:
+                    item = frame_queue.get(timeout=0.1)
+                except QueueClosed:
+                    break
+                if item is not None:
+                    frame, read_time = item
+                    self._handle(frame, read_time, on_result)
+        finally:
+            self.stop_event.set()
+            frame_queue.close()
+            reader.join(timeout=2.0)
+            self.metrics.dropped = frame_queue.dropped
+
+    def _read_loop(self, frame_queue: DropQueue) -> None:
+        interval = 1.0 / self.source.fps if self.source.fps > 0 else 0.0
+        next_time = time.perf_counter()
+        frames = iter(self.source)
+        while not self.stop_event.is_set():
+            t0 = time.perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                break
+            frame_queue.put((frame, time.perf_counter() - t0))
+            if interval:
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    self.stop_event.wait(delay)
+        frame_queue.close()
+
+# ---[ Command line ]--- #
+def format_summary(summary: dict[str, Any]) -> str:
+    """
+    Human-readable version of EngineMetrics.summary().
+    """
+    lines = [
+        f"Frames: {summary['frames']} (faces in {summary['faces']}, dropped {summary['dropped']})",
+        f"FaceMesh runs: {summary['inferences']} ({summary['roi_inferences']} on face region, {summary['skipped']} frames skipped)",
+        f"Time: {summary['seconds']:.2f} s, throughput: {summary['fps']:.1f} frames/s",
+        f"{'stage':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    ]
+    for stage, values in summary["latency_ms"].items():
+        lines.append(f"{stage:<10} {values['p50']:>9.3f} {values['p95']:>9.3f} {values['p99']:>9.3f}")
+    return "\n".join(lines)
+
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Benchmark the face tracking hot path without the GUI.")
+    parser.add_argument("source", help="camera:<index>, synthetic[:WxH], an image directory or a video file")
+    parser.add_argument("--frames", type=int, default=0, help="stop after this many frames (0 = whole source)")
+    parser.add_argument("--loop", action="store_true", help="loop video files and image directories")
+    parser.add_argument("--realtime", action="store_true", help="read on a separate thread and drop late frames")
+    parser.add_argument("--queue-size", type=int, default=1, help="frame queue size in realtime mode")
+    parser.add_argument("--config", help="configuration.ini to read [Camera] tracking settings from")
+    parser.add_argument("--roi", action=argparse.BooleanOptionalAction, default=None, help="crop to the face region after the first detection")
+    parser.add_argument("--adaptive", action=argparse.BooleanOptionalAction, default=None, help="skip inference while the face is still")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    config = ConfigParser()
+    config_file = args.config or os.path.join(os.path.dirname(__file__), "..", "..", "settings", "configuration.ini")
+    config.read(config_file)
+    if args.roi is not None:
+        config.read_dict({"Camera": {"roi_tracking": str(args.roi)}})
+    if args.adaptive is not None:
+        config.read_dict({"Camera": {"adaptive_rate": str(args.adaptive)}})
+
+    source = open_source(args.source, loop=args.loop)
+    if isinstance(source, SyntheticSource) and not args.frames:
+        source.count = 300
+    tracker = FaceTracker.from_config(config)
+    engine = FaceTrackEngine(source, tracker, realtime=args.realtime, queue_size=args.queue_size)
+    try:
+        metrics = engine.run(max_frames=args.frames)
+    except KeyboardInterrupt:
+        metrics = engine.metrics
+    finally:
+        tracker.close()
+        source.close()
+
+    summary = metrics.summary()
+    summary["source"] = source.name
+    print(json.dumps(summary, indent=2) if args.json else format_summary(summary))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,221 @@
+#
+# Gaze direction predictor
+# Copyright (C) 2025 Remeny
+#
+# Learns where the user is looking from the head positions captured by
+# the camera trainer (the newest calibration sample of every position in
+# the user store, or the [Facemarks] section of the user config) and
+# predicts it for every tracked frame.
+#
+# Training uses scikit-learn (StandardScaler + NearestCentroid). The
+# fitted parameters are saved as plain arrays in <user_dir>/gaze_model.npz
+# and prediction is done with numpy, which keeps it well under a
+# millisecond per frame.
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+from ai_teacher.resources import shared
+from ai_teacher.backend.camera import user_instruction_ini_setting
+
+from configparser import ConfigParser
+from typing import Union
+
+import os
+import threading
+import warnings
+
+import numpy as np
+
+# ---[ Variables ]--- #
+MODEL_FILENAME: str = "gaze_model.npz"
+
+# Order of the points in a (3, 3) point array, same as facetrack.TRACKED_LANDMARKS
+POINT_KEYS: tuple[str, str, str] = ("nose", "left", "right")
+
+# ---[ Features ]--- #
+def feature_matrix(points: np.ndarray) -> np.ndarray:
+    """
+    Turns (n, 3, 3) [nose, left iris, right iris] xyz points (or a
+    single (3, 3) set) into an (n, 6) float32 feature matrix.
+
+    The features are relative to the eyes and scaled by the distance
+    between them, so they mostly describe head rotation and do not
+    depend much on how far the user sits from the camera.
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3, 3)
+    nose, left, right = points[:, 0], points[:, 1], points[:, 2]
+    middle = (left + right) * 0.5
+    span = np.linalg.norm(left[:, :2] - right[:, :2], axis=1)
+    span = np.maximum(span, 1e-6)[:, None]
+
+    features = np.empty((len(points), 6), dtype=np.float32)
+    features[:, 0:3] = (nose - middle) / span          # Yaw/pitch/depth of the nose
+    features[:, 3:4] = (left[:, 2:3] - right[:, 2:3]) / span  # Eye depth difference (yaw)
+    features[:, 4:6] = middle[:, :2]                     # Where the face is in the frame
+    return features
+
+def calibration_points(config: ConfigParser) -> tuple[np.ndarray, list[str]]:
+    """
+    Reads the captured calibration points from a user config.
+    Returns (n, 3, 3) points and the head position name of each.
+    Positions that were not (fully) captured are skipped.
+    """
+    points: list[list[list[float]]] = []
+    labels: list[str] = []
+    for position in user_instruction_ini_setting:
+        try:
+            sample = [
+                [config.getfloat('Facemarks', f"{position}_{name}_{axis}") for axis in "xyz"]
+                for name in POINT_KEYS
+            ]
+        except (ValueError, KeyError, LookupError):
+            continue
+        points.append(sample)
+        labels.append(position)
+    return np.asarray(points, dtype=np.float32).reshape(-1, 3, 3), labels
+
+# ---[ Model ]--- #
+class GazeModel:
+    """
+    Fitted nearest-centroid model, stored as plain arrays.
+    """
+    def __init__(self, classes: np.ndarray, centroids: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> None:
+        self.classes = np.asarray(classes)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    def predict(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predicts head positions for (n, 3, 3) points.
+        Returns (labels, confidence) arrays of length n. Confidence is
+        1 - d_best / d_second, so 0 means "right between two positions".
+        """
+        x = (feature_matrix(points) - self.mean) / self.scale
+        distances = ((x[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+        # Only a handful of classes, a full sort is cheapest
+        order = np.argsort(distances, axis=1)
+        rows = np.arange(len(x))
+        best = distances[rows, order[:, 0]]
+        second = distances[rows, order[:, 1]]
+        confidence = 1.0 - np.sqrt(best / np.maximum(second, 1e-12))
+        return self.classes[order[:, 0]], confidence
+
+    def save(self, path: str) -> None:
+        temp_file = f"{path}.tmp.npz"
+        np.savez(temp_file, classes=self.classes.astype(str), centroids=self.centroids,
+                 mean=self.mean, scale=self.scale)
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path: str) -> "GazeModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["classes"], data["centroids"], data["mean"], data["scale"])
+
+def train(points: np.ndarray, labels: list[str]) -> GazeModel:
+    """
+    Fits a gaze model on calibration points with scikit-learn.
+    """
+    from sklearn.neighbors import NearestCentroid # type: ignore
+    from sklearn.preprocessing import StandardScaler # type: ignore
+
+    if len(set(labels)) < 2:
+        raise ValueError("At least two captured head positions are needed to train the gaze model.")
+
+    features = feature_matrix(points)
+    scaler = StandardScaler().fit(features)
+    scale = np.where(scaler.scale_ > 0, scaler.scale_, 1.0)
+    with warnings.catch_warnings():
+        # One sample per position makes sklearn's (unused) variance estimate divide by zero
+        warnings.simplefilter("ignore", RuntimeWarning)
+        classifier = NearestCentroid().fit((features - scaler.mean_) / scale, labels)
+    return GazeModel(classifier.classes_, classifier.centroids_, scaler.mean_, scale)
+
+# ---[ Predictor ]--- #
+class GazePredictor:
+    """
+    Per-user gaze predictor that loads (or trains) its model lazily on a
+    background thread. predict() never waits: it returns None until the
+    model is ready.
+    """
+    def __init__(self, user_dir: str) -> None:
+        self.model_file = os.path.join(user_dir, MODEL_FILENAME)
+        self.model: Union[GazeModel, None] = None
+        self._loading: bool = False
+        self._attempted: bool = False  # Only try loading once, retrain() tries again
+        self._lock = threading.Lock()
+
+    def _start(self, target) -> None: # type: ignore
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+            self._attempted = True
+        threading.Thread(target=target, name="gaze-model", daemon=True).start()
+
+    def _load(self) -> None:
+        try:
+            if os.path.isfile(self.model_file):
+                self.model = GazeModel.load(self.model_file)
+                f.dbg(f"Gaze model loaded from {self.model_file}")
+            else:
+                self._fit()
+        except Exception as e:
+            f.dbg(f"Could not load gaze model: {e}")
+        finally:
+            self._loading = False
+
+    def _fit(self) -> None:
+        if shared.user_store is not None:
+            points, labels = shared.user_store.latest_calibration()
+        else:
+            points, labels = calibration_points(shared.user_config)
+        if len(set(labels)) < 2:
+            f.dbg("Not enough calibration data to train the gaze model yet")
+            return
+        model = train(points, labels)
+        model.save(self.model_file)
+        self.model = model
+        f.dbg(f"Gaze model trained on {len(labels)} positions, saved to {self.model_file}")
+
+    def _retrain(self) -> None:
+        try:
+            self._fit()
+        except Exception as e:
+            f.dbg(f"Could not train gaze model: {e}")
+        finally:
+            self._loading = False
+
+    def retrain(self) -> None:
+        """
+        Trains a new model from the current calibration data in the background.
+        """
+        self._start(self._retrain)
+
+    def predict(self, points: Union[np.ndarray, tuple, None]) -> Union[tuple[str, float], None]: # type: ignore
+        """
+        Predicts the head position for one (3, 3) set of points.
+        Returns (position, confidence) or None if there is no model (yet).
+        """
+        model = self.model
+        if model is None:
+            if not self._attempted:
+                self._start(self._load)
+            return None
+        if points is None:
+            return None
+        labels, confidence = model.predict(np.asarray(points, dtype=np.float32))
+        return str(labels[0]), float(confidence[0])
+
+# Predictor of the logged in user, see get_predictor()
+predictor: Union[GazePredictor, None] = None
+
+def get_predictor() -> GazePredictor:
+    """
+    Returns the gaze predictor of the logged in user.
+    """
+    global predictor
+    if predictor is None or predictor.model_file != os.path.join(shared.user_dir, MODEL_FILENAME):
+        predictor = GazePredictor(shared.user_dir)
+    return predictor
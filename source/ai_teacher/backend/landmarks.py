@@ -0,0 +1,108 @@
+#
+# Landmark history for face tracking
+# Copyright (C) 2025 Remeny
+#
+# Every tracked frame's landmarks (all 478 of them) are stored as one
+# (N, 3) float32 row in a preallocated ring buffer, together with a
+# timestamp. Consumers (gaze, events, smoothing...) read numpy views
+# instead of building Python objects per frame.
+#
+
+# ---[ Libraries ]--- #
+from typing import Union
+
+import threading
+import time
+
+import numpy as np
+
+# ---[ Variables ]--- #
+FACE_LANDMARKS: int = 478  # FaceMesh with refine_landmarks=True (468 without)
+
+# ---[ Classes ]--- #
+class LandmarkHistory:
+    """
+    Fixed-size ring buffer of landmark frames.
+
+    The buffer is stored twice back to back (every frame is written to
+    slot i and i + capacity), so the last k frames are always one
+    contiguous slice and can be returned as a view without copying.
+
+    Views are read-only and stay valid until about capacity - k more
+    frames have been pushed; pass copy=True to keep data for longer.
+
+    Args:
+        capacity (int): Number of frames kept.
+        landmarks (int): Landmarks per frame.
+    """
+    def __init__(self, capacity: int = 256, landmarks: int = FACE_LANDMARKS) -> None:
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.landmarks = landmarks
+        self._frames = np.full((capacity * 2, landmarks, 3), np.nan, dtype=np.float32)
+        self._times = np.zeros(capacity * 2, dtype=np.float64)
+        self._head: int = 0  # Next slot to write, 0 <= head < capacity
+        self._count: int = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def push(self, landmarks: np.ndarray, timestamp: Union[float, None] = None) -> None:
+        """
+        Appends one (landmarks, 3) frame. Extra columns/rows are not allowed.
+        """
+        if landmarks.shape != (self.landmarks, 3):
+            raise ValueError(f"Expected landmarks of shape ({self.landmarks}, 3), got {landmarks.shape}")
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self._lock:
+            head = self._head
+            self._frames[head] = landmarks
+            self._frames[head + self.capacity] = landmarks
+            self._times[head] = timestamp
+            self._times[head + self.capacity] = timestamp
+            self._head = (head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def last(self, k: int, copy: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (frames, timestamps) of the last k frames, oldest first.
+        frames has shape (k, landmarks, 3). k is capped at len(self).
+        """
+        with self._lock:
+            k = max(0, min(k, self._count))
+            end = self._head + self.capacity
+            frames = self._frames[end - k:end]
+            times = self._times[end - k:end]
+        if copy:
+            return frames.copy(), times.copy()
+        frames = frames.view()
+        times = times.view()
+        frames.flags.writeable = False
+        times.flags.writeable = False
+        return frames, times
+
+    def latest(self, copy: bool = False) -> Union[tuple[np.ndarray, float], None]:
+        """
+        Returns (landmarks, timestamp) of the newest frame, or None if empty.
+        """
+        frames, times = self.last(1, copy=copy)
+        if not len(frames):
+            return None
+        return frames[0], float(times[0])
+
+    def points(self, indices: Union[list[int], tuple[int, ...]], k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (k, len(indices), 3) coordinates of selected landmarks
+        over the last k frames (a copy) and their timestamps.
+        """
+        frames, times = self.last(k)
+        return frames[:, list(indices)], times.copy()
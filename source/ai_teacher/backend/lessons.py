@@ -0,0 +1,424 @@
+#
+# Lesson ingestion
+# Copyright (C) 2025 Remeny
+#
+# Turns the lesson and textbook files in text/lessons (.txt and .md)
+# into chunks of a paragraph or so, the unit the teacher retrieves.
+#
+# Files are streamed: read in blocks, decoded incrementally, split into
+# paragraphs, normalized, merged into chunks and written out one at a
+# time, so memory use does not depend on the size of a file or of the
+# whole corpus. Markdown headings ('# Title') start a new section, and
+# every chunk remembers the section it came from.
+#
+# Each source file gets its own JSON Lines file of chunks in
+# data/.lessons/chunks, and data/.lessons/manifest.json records the
+# size, modification time and content hash of every file. A re-run skips
+# files whose size and modification time did not change, and files that
+# were only touched (same hash). Chunks of removed files are deleted.
+#
+#   python -m ai_teacher.backend.lessons [lesson directory] [--force]
+#
+
+# ---[ Libraries ]--- #
+from typing import Any, Callable, Iterable, Iterator, Union
+
+import codecs
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+
+# ---[ Variables ]--- #
+LESSON_EXTENSIONS: tuple[str, ...] = (".txt", ".md")
+MANIFEST_FILENAME: str = "manifest.json"
+MANIFEST_VERSION: int = 1
+CHUNK_DIRECTORY: str = "chunks"
+
+READ_BLOCK_SIZE: int = 1024 * 1024
+# A "paragraph" without blank lines longer than this is cut at a line end
+MAX_PARAGRAPH_CHARS: int = 64 * 1024
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t\f\v]*\n")
+# Starts with the literal '-' so the regex engine can skip ahead quickly
+HYPHENATED_LINE_BREAK = re.compile(r"-(?<=\w-)\n[ \t]*(?=\w)")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+HEADING = re.compile(r"#{1,6}[ \t]+(.+)")
+
+# Characters that only get in the way (soft hyphen, zero-width spaces, BOM)
+INVISIBLE_CHARACTERS = dict.fromkeys(map(ord, "\u00ad\u200b\u200c\u200d\u2060\ufeff"))
+
+# ---[ Reading ]--- #
+def _hash_file(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while block := file.read(READ_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_text_blocks(path: str, digest: Any = None, counter: Union[list[int], None] = None) -> Iterator[str]:
+    """
+    Yields the decoded text of a file block by block. Invalid UTF-8 is
+    replaced, not fatal. Raw bytes are fed to digest (a hashlib object)
+    and counted in counter[0] when given.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    with open(path, "rb") as file:
+        while block := file.read(READ_BLOCK_SIZE):
+            if digest is not None:
+                digest.update(block)
+            if counter is not None:
+                counter[0] += len(block)
+            text = decoder.decode(block)
+            if text:
+                yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def iter_paragraphs(blocks: Iterable[str]) -> Iterator[str]:
+    """
+    Splits streamed text at blank lines. Only the unfinished last
+    paragraph of a block is kept between blocks.
+    """
+    rest = ""
+    for block in blocks:
+        text, carry = rest + block, ""
+        if text.endswith("\r"):  # Maybe the first half of a \r\n
+            text, carry = text[:-1], "\r"
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        parts = PARAGRAPH_BREAK.split(text)
+        rest = parts.pop() + carry
+        yield from parts
+        while len(rest) > MAX_PARAGRAPH_CHARS:
+            cut = rest.rfind("\n", 0, MAX_PARAGRAPH_CHARS)
+            cut = cut if cut > 0 else MAX_PARAGRAPH_CHARS
+            yield rest[:cut]
+            rest = rest[cut:]
+    if rest:
+        yield rest
+
+def normalize(text: str) -> str:
+    """
+    Normalizes a paragraph: NFKC, no invisible characters, words split
+    over two lines joined again, all whitespace runs as one space.
+    """
+    if not text.isascii():  # Plain ASCII needs neither
+        text = unicodedata.normalize("NFKC", text).translate(INVISIBLE_CHARACTERS)
+    if "-\n" in text:
+        text = HYPHENATED_LINE_BREAK.sub("", text)
+    return " ".join(text.split())
+
+# ---[ Chunking ]--- #
+def split_long(text: str, max_chars: int) -> Iterator[str]:
+    """
+    Cuts text longer than max_chars at sentence ends, or at spaces
+    when a single sentence is too long.
+    """
+    if len(text) <= max_chars:
+        yield text
+        return
+    current = ""
+    for sentence in SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                yield current
+                current = ""
+            yield sentence[:cut]
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            yield current
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        yield current
+
+def iter_chunks_of_paragraphs(paragraphs: Iterable[str], max_chars: int = 1200,
+                              min_chars: int = 200) -> Iterator[tuple[str, str]]:
+    """
+    Merges normalized paragraphs into (section, text) chunks of up to
+    max_chars. Paragraphs shorter than min_chars are joined with the
+    next one of the same section.
+    """
+    section = ""
+    current = ""
+    for raw in paragraphs:
+        lines = raw.strip().split("\n", 1)
+        heading = HEADING.fullmatch(lines[0].strip())
+        if heading is not None:
+            if current:
+                yield section, current
+                current = ""
+            section = normalize(heading.group(1)).strip("# ")
+            raw = lines[1] if len(lines) > 1 else ""
+        paragraph = normalize(raw)
+        if not paragraph:
+            continue
+        for piece in split_long(paragraph, max_chars):
+            if current and (len(current) >= min_chars or len(current) + 1 + len(piece) > max_chars):
+                yield section, current
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        yield section, current
+
+def chunk_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+# ---[ Ingestion ]--- #
+class IngestReport:
+    """
+    What an ingest() run did.
+    """
+    __slots__ = ("files", "processed", "unchanged", "touched", "removed", "failed",
+                 "bytes", "chunks", "seconds", "changed_sources")
+
+    def __init__(self) -> None:
+        self.files = 0       # Lesson files found
+        self.processed = 0   # New or changed files chunked again
+        self.unchanged = 0   # Same size and modification time
+        self.touched = 0     # New modification time, same content
+        self.removed = 0     # Files gone since the last run
+        self.failed = 0
+        self.bytes = 0       # Bytes read (hashing and chunking)
+        self.chunks = 0      # Chunks written
+        self.seconds = 0.0
+        self.changed_sources: list[str] = []  # Processed and removed files
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values["seconds"] = round(self.seconds, 3)
+        values["mb_per_second"] = round(self.mb_per_second, 2)
+        return values
+
+    def __str__(self) -> str:
+        return (f"{self.files} lesson file(s): {self.processed} processed, {self.unchanged} unchanged, "
+                f"{self.touched} touched, {self.removed} removed, {self.failed} failed\n"
+                f"{self.chunks} chunk(s) written, {self.bytes / 1e6:.1f} MB read in {self.seconds:.2f} s "
+                f"({self.mb_per_second:.1f} MB/s)")
+
+class LessonStore:
+    """
+    Chunk files and manifest of ingested lessons.
+
+    Args:
+        lesson_directory (str): Directory of the lesson files (searched recursively).
+        output_directory (str): Directory for the manifest and chunk files.
+        max_chars (int): Longest chunk.
+        min_chars (int): Shorter paragraphs are merged with the next one.
+    """
+    def __init__(self, lesson_directory: str, output_directory: str,
+                 max_chars: int = 1200, min_chars: int = 200) -> None:
+        self.lesson_directory = lesson_directory
+        self.output_directory = output_directory
+        self.chunk_directory = os.path.join(output_directory, CHUNK_DIRECTORY)
+        self.manifest_file = os.path.join(output_directory, MANIFEST_FILENAME)
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        # {source path relative to lesson_directory: {"size", "mtime", "hash", "chunks", "chunk_file"}}
+        self.files: dict[str, dict[str, Any]] = {}
+
+    # ---[ Manifest ]--- #
+    def load_manifest(self) -> None:
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            if manifest.get("version") != MANIFEST_VERSION or manifest.get("chunking") != [self.max_chars, self.min_chars]:
+                raise ValueError("made with another version or other chunk sizes")
+            self.files = manifest["files"]
+        except FileNotFoundError:
+            self.files = {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            from ai_teacher.resources import functions as f
+            f.dbg(f"Lesson manifest {self.manifest_file} not used, everything is ingested again: {e}")
+            self.files = {}
+
+    def save_manifest(self) -> None:
+        os.makedirs(self.output_directory, exist_ok=True)
+        temp_file = f"{self.manifest_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump({"version": MANIFEST_VERSION, "chunking": [self.max_chars, self.min_chars],
+                       "files": self.files}, file, indent=1)
+        os.replace(temp_file, self.manifest_file)
+
+    # ---[ Sources ]--- #
+    def list_sources(self) -> dict[str, os.stat_result]:
+        """
+        {relative path: stat} of every lesson file, found with scandir.
+        """
+        sources: dict[str, os.stat_result] = {}
+        pending = [self.lesson_directory]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(LESSON_EXTENSIONS):
+                    relative = os.path.relpath(entry.path, self.lesson_directory).replace(os.sep, "/")
+                    sources[relative] = entry.stat()
+        return sources
+
+    def _chunk_file(self, source: str) -> str:
+        name = hashlib.blake2b(source.encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(self.chunk_directory, f"{name}.jsonl")
+
+    def _process(self, source: str, report: IngestReport) -> tuple[str, int]:
+        """
+        Streams one lesson file into its chunk file. Returns (content hash, chunk count).
+        """
+        path = os.path.join(self.lesson_directory, source)
+        chunk_file = self._chunk_file(source)
+        temp_file = f"{chunk_file}.tmp"
+        digest = hashlib.blake2b(digest_size=16)
+        counter = [0]
+        count = 0
+        paragraphs = iter_paragraphs(read_text_blocks(path, digest, counter))
+        try:
+            with open(temp_file, "w", encoding="utf-8") as file:
+                for section, text in iter_chunks_of_paragraphs(paragraphs, self.max_chars, self.min_chars):
+                    file.write(json.dumps({"id": f"{source}#{count}", "source": source, "section": section,
+                                           "hash": chunk_hash(text), "text": text}, ensure_ascii=False))
+                    file.write("\n")
+                    count += 1
+            os.replace(temp_file, chunk_file)
+        finally:
+            report.bytes += counter[0]
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        return digest.hexdigest(), count
+
+    def ingest(self, force: bool = False,
+               progress: Union[Callable[[str, IngestReport], None], None] = None) -> IngestReport:
+        """
+        Brings the chunk files up to date with the lesson directory.
+        With force, every file is processed again.
+        """
+        report = IngestReport()
+        start = time.perf_counter()
+        self.load_manifest()
+        os.makedirs(self.chunk_directory, exist_ok=True)
+
+        sources = self.list_sources()
+        report.files = len(sources)
+        for source in [source for source in self.files if source not in sources]:
+            entry = self.files.pop(source)
+            try:
+                os.remove(os.path.join(self.output_directory, entry["chunk_file"]))
+            except OSError:
+                pass
+            report.removed += 1
+            report.changed_sources.append(source)
+
+        for source, stat in sorted(sources.items()):
+            entry = self.files.get(source)
+            if not force and entry is not None:
+                if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                    report.unchanged += 1
+                    continue
+                if entry["size"] == stat.st_size:
+                    # Same size: maybe only touched, hashing is cheaper than chunking
+                    path = os.path.join(self.lesson_directory, source)
+                    try:
+                        content_hash = _hash_file(path)
+                    except OSError:
+                        content_hash = ""
+                    report.bytes += stat.st_size
+                    if content_hash == entry["hash"]:
+                        entry["mtime"] = stat.st_mtime_ns
+                        report.touched += 1
+                        continue
+            try:
+                content_hash, count = self._process(source, report)
+            except OSError as e:
+                from ai_teacher.resources import functions as f
+                f.dbg(f"Could not ingest lesson {source}: {e}")
+                report.failed += 1
+                continue
+            self.files[source] = {
+                "size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": content_hash, "chunks": count,
+                "chunk_file": os.path.relpath(self._chunk_file(source), self.output_directory)
+            }
+            report.processed += 1
+            report.chunks += count
+            report.changed_sources.append(source)
+            if progress is not None:
+                progress(source, report)
+
+        self.save_manifest()
+        report.seconds = time.perf_counter() - start
+        return report
+
+    # ---[ Reading chunks ]--- #
+    def iter_chunks(self, sources: Union[Iterable[str], None] = None) -> Iterator[dict[str, Any]]:
+        """
+        Yields the chunks ({"id", "source", "section", "hash", "text"}) of
+        all ingested files, or only of the given ones, one at a time.
+        """
+        if not self.files:
+            self.load_manifest()
+        for source in (sorted(self.files) if sources is None else sources):
+            entry = self.files.get(source)
+            if entry is None:
+                continue
+            try:
+                with open(os.path.join(self.output_directory, entry["chunk_file"]), "r", encoding="utf-8") as file:
+                    for line in file:
+                        yield json.loads(line)
+            except FileNotFoundError:
+                continue
+
+def get_store() -> LessonStore:
+    """
+    LessonStore of the application, using [Lessons] in configuration.ini.
+    """
+    from ai_teacher.resources import shared
+    lessons = shared.settings.lessons
+    return LessonStore(
+        os.path.join(shared.app_dir, lessons.directory),
+        os.path.join(shared.app_dir, "data", ".lessons"),
+        max_chars=lessons.max_chunk_chars,
+        min_chars=lessons.min_chunk_chars
+    )
+
+# ---[ Command line ]--- #
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    app_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    parser = argparse.ArgumentParser(description="Chunk lesson files for the teacher, skipping unchanged ones.")
+    parser.add_argument("directory", nargs="?", default=os.path.join(app_dir, "text", "lessons"),
+                        help="lesson directory (default: text/lessons)")
+    parser.add_argument("--output", default=os.path.join(app_dir, "data", ".lessons"),
+                        help="directory for the manifest and chunks (default: data/.lessons)")
+    parser.add_argument("--max-chars", type=int, default=1200, help="longest chunk")
+    parser.add_argument("--min-chars", type=int, default=200, help="shorter paragraphs are merged")
+    parser.add_argument("--force", action="store_true", help="process every file again")
+    parser.add_argument("--verbose", action="store_true", help="print every processed file")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    def progress(source: str, report: IngestReport) -> None:
+        print(f"{source}: {report.bytes / 1e6:.1f} MB read so far")
+
+    store = LessonStore(args.directory, args.output, args.max_chars, args.min_chars)
+    report = store.ingest(force=args.force, progress=progress if args.verbose else None)
+    print(json.dumps(report.as_dict(), indent=2) if args.json else report)
+    return 1 if report.failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
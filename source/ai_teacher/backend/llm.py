@@ -0,0 +1,609 @@
+#
+# Language model client
+# Copyright (C) 2025 Remeny
+#
+# Talks to a local OpenAI compatible server (llama.cpp's llama-server,
+# vLLM, Ollama's /v1, LM Studio...) set in [LLM] of configuration.ini.
+# The API key, if the server wants one, is read from the environment
+# variable AI_TEACHER_LLM_API_KEY or from a .env file in the program
+# directory (with python-dotenv), never from configuration.ini.
+#
+# Everything is asyncio, with plain HTTP/1.1 over asyncio streams:
+#
+# - Connections are kept alive and reused (pool_size at most). A reused
+#   connection the server closed in the meantime is replaced once.
+# - stream() yields the answer token by token (server-sent events).
+# - A request fails with LLMTimeout when connecting, the first token or
+#   any later token takes too long. Leaving the async for loop (or
+#   cancelling the task) stops the request and closes its connection.
+# - Identical requests that are in flight at the same time are sent
+#   once: the later ones get the tokens of the first one, including
+#   those it already received. The request is only stopped when every
+#   one of them has stopped listening.
+#
+# The GUI is not async: start() runs the client on its own event loop
+# thread and submit() hands coroutines to it.
+#
+# Against the stub server (llmstub.py) or a real one:
+#
+#   python -m ai_teacher.backend.llm ask "What is photosynthesis?"
+#   python -m ai_teacher.backend.llm bench --stub --requests 200 --concurrency 16
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Union
+from urllib.parse import urlsplit
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+# ---[ Variables ]--- #
+API_KEY_VARIABLE: str = "AI_TEACHER_LLM_API_KEY"
+MAX_HEADER_LINES: int = 100
+
+# ---[ Exceptions ]--- #
+class LLMError(Exception):
+    """
+    The server could not be reached or returned an error.
+    """
+
+class LLMTimeout(LLMError):
+    """
+    Waiting for a free connection, connecting, the first token or a
+    later token took too long.
+    """
+
+class _StaleConnection(LLMError):
+    """
+    A kept-alive connection was closed by the server before it answered.
+    """
+
+# ---[ HTTP ]--- #
+class Connection:
+    """
+    One HTTP/1.1 connection of the pool.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.requests: int = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.writer.is_closing() or self.reader.at_eof()
+
+    def close(self) -> None:
+        self.writer.close()
+
+class Response:
+    """
+    Status and headers of a response; the body is read with iter_body().
+    """
+    def __init__(self, connection: Connection, status: int, headers: dict[str, str]) -> None:
+        self.connection = connection
+        self.status = status
+        self.headers = headers
+        self.complete = False  # Whole body read, the connection can be reused
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.complete and self.headers.get("connection", "").lower() != "close"
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        reader = self.connection.reader
+        if "chunked" in self.headers.get("transfer-encoding", "").lower():
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass  # Trailers
+                    break
+                data = await reader.readexactly(size + 2)
+                yield data[:-2]
+        elif "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            while remaining > 0:
+                data = await reader.read(min(remaining, 65536))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+        else:  # Body until the server closes the connection
+            while data := await reader.read(65536):
+                yield data
+            self.headers["connection"] = "close"
+        self.complete = True
+
+    async def read(self) -> bytes:
+        return b"".join([data async for data in self.iter_body()])
+
+class ConnectionPool:
+    """
+    Kept-alive connections to one server.
+
+    Args:
+        host (str), port (int): Server address.
+        size (int): Connections open at most (requests wait for a free one).
+        use_ssl (bool): https.
+        connect_timeout (float): Seconds to open a connection.
+        queue_timeout (float): Seconds to wait for a free connection when all are in use.
+    """
+    def __init__(self, host: str, port: int, size: int = 4, use_ssl: bool = False, connect_timeout: float = 5.0,
+                 queue_timeout: float = 30.0) -> None:
+        self.host = host
+        self.port = port
+        self.size = max(1, size)
+        self.use_ssl = use_ssl
+        self.connect_timeout = connect_timeout
+        self.queue_timeout = queue_timeout
+        self.opened: int = 0  # Connections opened so far
+        self.queue_timeouts: int = 0  # Requests that never got a connection
+        self._idle: list[Connection] = []
+        self._slots: Union[asyncio.Semaphore, None] = None  # Made on the loop that uses it
+
+    async def acquire(self, fresh: bool = False) -> tuple[Connection, bool]:
+        """
+        A connection and whether it was reused.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.queue_timeouts += 1
+            raise LLMTimeout(f"All {self.size} connections to {self.host}:{self.port} stayed busy "
+                             f"for {self.queue_timeout} s") from None
+        try:
+            while self._idle and not fresh:
+                connection = self._idle.pop()
+                if not connection.closed:
+                    return connection, True
+                connection.close()
+            try:
+                async with asyncio.timeout(self.connect_timeout):
+                    reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.use_ssl or None)
+            except TimeoutError:
+                raise LLMTimeout(f"Connecting to {self.host}:{self.port} took more than {self.connect_timeout} s") from None
+            except OSError as e:
+                raise LLMError(f"Could not connect to {self.host}:{self.port}: {e}") from None
+            self.opened += 1
+            return Connection(reader, writer), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection: Connection, reusable: bool) -> None:
+        if reusable and not connection.closed:
+            self._idle.append(connection)
+        else:
+            connection.close()
+        if self._slots is not None:
+            self._slots.release()
+
+    def close(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle = []
+
+    async def request(self, method: str, path: str, headers: dict[str, str], body: bytes = b"",
+                      response_timeout: Union[float, None] = None) -> Response:
+        """
+        Sends a request and reads the response head. The caller must
+        read the body and then call release(response.connection,
+        response.keep_alive).
+
+        response_timeout limits the wait for the response head once the
+        request is sent (TimeoutError), not the wait for a connection.
+        """
+        connection, reused = await self.acquire()
+        held: Union[Connection, None] = connection  # Holds a slot until released (exactly once)
+        try:
+            try:
+                return await self._send(connection, method, path, headers, body, reused, response_timeout)
+            except _StaleConnection:
+                held = None
+                self.release(connection, False)
+                # acquire() gives its slot back itself when it fails
+                connection, reused = await self.acquire(fresh=True)
+                held = connection
+                return await self._send(connection, method, path, headers, body, False, response_timeout)
+        except BaseException:
+            if held is not None:
+                self.release(held, False)
+            raise
+
+    async def _send(self, connection: Connection, method: str, path: str, headers: dict[str, str],
+                    body: bytes, reused: bool, response_timeout: Union[float, None] = None) -> Response:
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        head.extend(f"{name}: {value}" for name, value in headers.items())
+        connection.requests += 1
+        try:
+            connection.writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+            await connection.writer.drain()
+        except ConnectionError as e:
+            if reused:
+                raise _StaleConnection() from None
+            raise LLMError(f"Connection to {self.host}:{self.port} lost: {e}") from None
+        # The request is sent: from here on the time is the server's
+        async with asyncio.timeout(response_timeout):
+            try:
+                status_line = await connection.reader.readuntil(b"\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                if reused:
+                    raise _StaleConnection() from None
+                raise LLMError(f"Connection to {self.host}:{self.port} lost: {e}") from None
+            try:
+                status = int(status_line.split(b" ", 2)[1])
+            except (IndexError, ValueError):
+                raise LLMError(f"Not an HTTP response: {status_line[:80]!r}") from None
+            response_headers: dict[str, str] = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await connection.reader.readuntil(b"\r\n")
+                if line == b"\r\n":
+                    return Response(connection, status, response_headers)
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+        raise LLMError("Too many response headers")
+
+# ---[ Client ]--- #
+class _Flight:
+    """
+    One request in flight and what it received so far, shared by every
+    identical request made while it runs.
+    """
+    def __init__(self) -> None:
+        self.tokens: list[str] = []
+        self.done: bool = False
+        self.error: Union[BaseException, None] = None
+        self.listeners: int = 0
+        self.changed = asyncio.Condition()
+        self.task: Union[asyncio.Task[None], None] = None
+
+class LLMClient:
+    """
+    Streaming chat completion client for one server.
+
+    Args:
+        url (str): Base URL of the OpenAI compatible API (".../v1").
+        model (str): Model name sent with every request.
+        api_key (str): Bearer token, empty for none.
+        pool_size (int): Connections kept open at most.
+        connect_timeout (float): Seconds to connect.
+        first_token_timeout (float): Seconds to the first token once the request is sent (prompt processing).
+        token_timeout (float): Seconds between two tokens.
+        queue_timeout (float): Seconds to wait for a free connection when all pool_size are in use.
+    """
+    def __init__(self, url: str, model: str = "", api_key: str = "", pool_size: int = 4,
+                 connect_timeout: float = 5.0, first_token_timeout: float = 60.0, token_timeout: float = 15.0,
+                 queue_timeout: float = 30.0) -> None:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Not an http(s) URL: {url}")
+        self.url = url
+        self.base_path = parts.path.rstrip("/")
+        self.model = model
+        self.first_token_timeout = first_token_timeout
+        self.token_timeout = token_timeout
+        self.pool = ConnectionPool(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), pool_size,
+                                   use_ssl=parts.scheme == "https", connect_timeout=connect_timeout,
+                                   queue_timeout=queue_timeout)
+        self.headers = {"Content-Type": "application/json", "Accept": "text/event-stream", "Connection": "keep-alive"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+
+        self._flights: dict[str, _Flight] = {}
+        # Counters
+        self.requests: int = 0  # Sent to the server
+        self.coalesced: int = 0  # Served by a request already in flight
+        self.timeouts: int = 0  # The server was too slow (not counting waits for a free connection)
+        self.cancelled: int = 0
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def stats(self) -> dict[str, int]:
+        return {"requests": self.requests, "coalesced": self.coalesced, "timeouts": self.timeouts,
+                "cancelled": self.cancelled, "queue_timeouts": self.pool.queue_timeouts, "connections_opened": self.pool.opened, "in_flight": len(self._flights)}
+
+    # ---[ Requests ]--- #
+    def _body(self, messages: list[dict[str, str]], params: dict[str, Any]) -> bytes:
+        request = {"model": self.model, "messages": messages, "stream": True, **params}
+        return json.dumps(request, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+    async def stream(self, messages: list[dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        """
+        Yields the tokens of the answer to a chat.
+
+        Args:
+            messages (list): [{"role": "system" | "user" | "assistant", "content": ...}]
+            params: Other request fields (temperature, max_tokens...).
+        """
+        body = self._body(messages, params)
+        key = body.decode("utf-8")
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(self._run(key, body, flight))
+        else:
+            self.coalesced += 1
+
+        flight.listeners += 1
+        index = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: index < len(flight.tokens) or flight.done)
+                while index < len(flight.tokens):
+                    index += 1
+                    yield flight.tokens[index - 1]
+                if flight.done and index == len(flight.tokens):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.listeners -= 1
+            if flight.listeners == 0 and not flight.done and flight.task is not None:
+                self.cancelled += 1
+                flight.task.cancel()  # Nobody is listening anymore
+
+    async def complete(self, messages: list[dict[str, str]], **params: Any) -> str:
+        """
+        The whole answer at once (still streamed and coalesced).
+        """
+        return "".join([token async for token in self.stream(messages, **params)])
+
+    async def _run(self, key: str, body: bytes, flight: _Flight) -> None:
+        """
+        Sends one request and passes its tokens to the flight.
+        """
+        try:
+            async for token in self._request(body):
+                async with flight.changed:
+                    flight.tokens.append(token)
+                    flight.changed.notify_all()
+        except asyncio.CancelledError:
+            flight.error = LLMError("Request cancelled")
+        except BaseException as e:
+            flight.error = e
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
+
+    async def _request(self, body: bytes) -> AsyncIterator[str]:
+        self.requests += 1
+        response: Union[Response, None] = None
+        try:
+            try:
+                response = await self.pool.request("POST", f"{self.base_path}/chat/completions", self.headers, body,
+                                                   response_timeout=self.first_token_timeout)
+            except TimeoutError:
+                self.timeouts += 1
+                raise LLMTimeout(f"No answer from {self.url} within {self.first_token_timeout} s") from None
+            if response.status != 200:
+                text = (await response.read())[:500].decode("utf-8", "replace")
+                raise LLMError(f"{self.url} answered {response.status}: {text}")
+
+            buffer = b""
+            body_iterator = response.iter_body().__aiter__()
+            first = True
+            while True:
+                timeout = self.first_token_timeout if first else self.token_timeout
+                try:
+                    async with asyncio.timeout(timeout):
+                        data = await body_iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                except TimeoutError:
+                    self.timeouts += 1
+                    raise LLMTimeout(f"{self.url} sent nothing for {timeout} s") from None
+                except (asyncio.IncompleteReadError, ConnectionError) as e:
+                    raise LLMError(f"Connection to {self.url} lost: {e}") from None
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    token = self._parse_event(line.strip())
+                    if token is None:
+                        continue
+                    if token is StopIteration:
+                        # Read to the end of the body so the connection stays usable
+                        async for _ in body_iterator:
+                            pass
+                        return
+                    first = False
+                    yield token # type: ignore
+        finally:
+            if response is not None:
+                self.pool.release(response.connection, response.keep_alive)
+
+    @staticmethod
+    def _parse_event(line: bytes) -> Any:
+        """
+        Token of one server-sent event line, None for other lines,
+        StopIteration at the end of the answer.
+        """
+        if not line.startswith(b"data:"):
+            return None
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return StopIteration
+        try:
+            event = json.loads(data)
+            choice = event["choices"][0]
+            token = choice.get("delta", {}).get("content") or choice.get("text") or ""
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            if b"error" in data:
+                raise LLMError(f"Server error: {data[:500].decode('utf-8', 'replace')}") from None
+            return None
+        return token or None
+
+# ---[ Application client ]--- #
+client: Union[LLMClient, None] = None
+loop: Union[asyncio.AbstractEventLoop, None] = None
+loop_thread: Union[threading.Thread, None] = None
+start_lock: threading.Lock = threading.Lock()
+
+def read_api_key(app_dir: str) -> str:
+    """
+    The API key from the environment or the .env file of the program.
+    """
+    try:
+        from dotenv import load_dotenv # type: ignore
+        load_dotenv(os.path.join(app_dir, ".env"), override=False)
+    except ImportError:
+        pass  # Only the environment then
+    return os.environ.get(API_KEY_VARIABLE, "")
+
+def start() -> LLMClient:
+    """
+    Starts the event loop thread and the client of [LLM] (once).
+    """
+    from ai_teacher.resources import shared
+    global client, loop, loop_thread
+    with start_lock:
+        if client is None:
+            settings = shared.settings.llm
+            client = LLMClient(settings.url, settings.model, read_api_key(shared.app_dir), settings.pool_size,
+                               settings.connect_timeout, settings.first_token_timeout, settings.token_timeout,
+                               settings.queue_timeout)
+            loop = asyncio.new_event_loop()
+            loop_thread = threading.Thread(target=loop.run_forever, name="llm", daemon=True)
+            loop_thread.start()
+            f.dbg(f"Language model client started for {settings.url} ({settings.model or 'default model'})")
+    return client
+
+def submit(coroutine: Coroutine[Any, Any, Any]) -> "Future[Any]":
+    """
+    Runs a coroutine on the client's loop. Cancelling the returned
+    future cancels it (and the request it is making).
+    """
+    start()
+    return asyncio.run_coroutine_threadsafe(coroutine, loop) # type: ignore
+
+def stop() -> None:
+    global client, loop, loop_thread
+    with start_lock:
+        if loop is not None:
+            if client is not None:
+                loop.call_soon_threadsafe(client.close)
+            loop.call_soon_threadsafe(loop.stop)
+            if loop_thread is not None:
+                loop_thread.join(2.0)
+        client = loop = loop_thread = None
+
+# ---[ Command line ]--- #
+def _percentiles(values: list[float]) -> str:
+    if not values:
+        return "-"
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(p / 100 * len(values)))]
+    return f"p50 {pick(50) * 1000:.0f} ms, p95 {pick(95) * 1000:.0f} ms, max {values[-1] * 1000:.0f} ms"
+
+async def benchmark(llm: LLMClient, requests: int, concurrency: int, duplicates: float, max_tokens: int) -> dict[str, Any]:
+    """
+    Sends requests (concurrency at a time) and measures time to first
+    token and tokens per second. A duplicates part of them repeat an
+    earlier prompt, to show coalescing.
+    """
+    first_token_times: list[float] = []
+    stream_rates: list[float] = []
+    tokens_total = 0
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(number: int) -> None:
+        nonlocal tokens_total, errors
+        prompt = number if number / max(1, requests) >= duplicates else number % max(1, concurrency // 2)
+        messages = [{"role": "user", "content": f"Benchmark question {prompt}: explain photosynthesis."}]
+        async with semaphore:
+            start = time.perf_counter()
+            first = 0.0
+            count = 0
+            try:
+                async for _ in llm.stream(messages, max_tokens=max_tokens, temperature=0):
+                    if count == 0:
+                        first = time.perf_counter() - start
+                    count += 1
+            except LLMError as e:
+                errors += 1
+                f.dbg(f"Benchmark request failed: {e}")
+                return
+            elapsed = time.perf_counter() - start
+            first_token_times.append(first)
+            if count > 1 and elapsed > first:
+                stream_rates.append((count - 1) / (elapsed - first))
+            tokens_total += count
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "tokens": tokens_total, "errors": errors, "first_token": first_token_times,
+            "stream_rates": stream_rates, "client": llm.stats()}
+
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Language model client.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/v1", help="OpenAI compatible API base URL")
+    parser.add_argument("--model", default="")
+    parser.add_argument("--pool-size", type=int, default=0, help="connections at most (0 = --concurrency, or 4)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ask_parser = commands.add_parser("ask", help="stream the answer to a question")
+    ask_parser.add_argument("question")
+    bench_parser = commands.add_parser("bench", help="measure time to first token and tokens per second")
+    bench_parser.add_argument("--requests", type=int, default=100)
+    bench_parser.add_argument("--concurrency", type=int, default=8)
+    bench_parser.add_argument("--duplicates", type=float, default=0.0, help="part of the requests that repeat a prompt")
+    bench_parser.add_argument("--max-tokens", type=int, default=128)
+    bench_parser.add_argument("--stub", action="store_true", help="start the stub server (llmstub.py) and use it")
+    args = parser.parse_args(argv)
+
+    async def run() -> int:
+        stub = None
+        url = args.url
+        if getattr(args, "stub", False):
+            from ai_teacher.backend.llmstub import StubServer
+            stub = await StubServer(port=0).start()
+            url = stub.url
+        pool_size = args.pool_size or getattr(args, "concurrency", 4)
+        llm = LLMClient(url, args.model, os.environ.get(API_KEY_VARIABLE, ""), pool_size)
+        try:
+            if args.command == "ask":
+                start = time.perf_counter()
+                async for token in llm.stream([{"role": "user", "content": args.question}]):
+                    print(token, end="", flush=True)
+                print(f"\n({time.perf_counter() - start:.2f} s)")
+                return 0
+            result = await benchmark(llm, args.requests, args.concurrency, args.duplicates, args.max_tokens)
+            rates = sorted(result["stream_rates"])
+            print(f"{args.requests} requests, {args.concurrency} at a time, {result['errors']} failed, {result['seconds']:.2f} s")
+            print(f"Time to first token: {_percentiles(result['first_token'])}")
+            if rates:
+                print(f"Tokens/s per stream: median {rates[len(rates) // 2]:.0f}, slowest {rates[0]:.0f}")
+            print(f"Tokens/s in total:   {result['tokens'] / result['seconds']:.0f}")
+            print(f"Client: {result['client']}")
+            if stub is not None:
+                print(f"Stub server: {stub.stats()}")
+            return 1 if result["errors"] else 0
+        except LLMError as e:
+            print(f"Error: {e}")
+            return 1
+        finally:
+            llm.close()
+            if stub is not None:
+                await stub.stop()
+
+    return asyncio.run(run())
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,173 @@
+#
+# Stub language model server
+# Copyright (C) 2025 Remeny
+#
+# A tiny OpenAI compatible server for trying the client (llm.py) and the
+# chat without a model: POST /v1/chat/completions answers with made-up
+# but deterministic words (the same messages always get the same
+# answer), streamed as server-sent events when "stream" is true. The
+# delay before the first token and between tokens are set on the
+# command line, so timeouts and slow servers are easy to reproduce.
+# GET /stats returns its counters.
+#
+#   python -m ai_teacher.backend.llmstub --port 8080 --first-token 0.2 --token-delay 0.02
+#
+
+# ---[ Libraries ]--- #
+from hashlib import blake2b
+from typing import Any, Union
+
+import asyncio
+import json
+import random
+import time
+
+# ---[ Variables ]--- #
+WORDS: tuple[str, ...] = (
+    "the", "cell", "energy", "light", "plant", "water", "because", "so", "which", "is", "uses", "makes",
+    "sugar", "oxygen", "leaf", "chlorophyll", "carbon", "dioxide", "into", "from", "and", "of", "a", "this",
+)
+
+# ---[ Server ]--- #
+class StubServer:
+    """
+    Args:
+        host (str), port (int): Address to listen on (port 0 = any free port).
+        first_token_delay (float): Seconds before the first token.
+        token_delay (float): Seconds between tokens.
+        tokens (int): Tokens per answer unless the request has a smaller max_tokens.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, first_token_delay: float = 0.05,
+                 token_delay: float = 0.005, tokens: int = 64) -> None:
+        self.host = host
+        self.port = port
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.connections: int = 0
+        self.requests: int = 0
+        self.cancelled: int = 0
+        self._server: Union[asyncio.base_events.Server, None] = None
+        self._handlers: dict[asyncio.Task[Any], asyncio.StreamWriter] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def stats(self) -> dict[str, int]:
+        return {"connections": self.connections, "requests": self.requests, "cancelled": self.cancelled}
+
+    async def start(self) -> "StubServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Close the kept-alive connections, so their handlers end on their own
+            for writer in self._handlers.values():
+                writer.close()
+            if self._handlers:
+                await asyncio.wait(list(self._handlers), timeout=1.0)
+            await self._server.wait_closed()
+
+    def answer(self, messages: Any, count: int) -> list[str]:
+        seed = blake2b(json.dumps(messages, sort_keys=True).encode("utf-8"), digest_size=8).digest()
+        rng = random.Random(seed)
+        return [("" if i == 0 else " ") + rng.choice(WORDS) for i in range(count)]
+
+    # ---[ HTTP ]--- #
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        task = asyncio.current_task()
+        if task is not None:
+            self._handlers[task] = writer
+        try:
+            while True:  # Keep-alive: one request after the other
+                try:
+                    request_line = await reader.readuntil(b"\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                headers = {}
+                while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                method, path = request_line.decode("latin-1").split(" ")[:2]
+                if method == "GET" and path == "/stats":
+                    await self._send_json(writer, 200, self.stats())
+                elif method == "POST" and path.endswith("/chat/completions"):
+                    await self._completion(writer, body)
+                else:
+                    await self._send_json(writer, 404, {"error": {"message": f"No {method} {path}"}})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.cancelled += 1  # The client went away in the middle of an answer
+        finally:
+            writer.close()
+            self._handlers.pop(task, None) # type: ignore
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: Any) -> None:
+        body = json.dumps(data).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _completion(self, writer: asyncio.StreamWriter, body: bytes) -> None:
+        self.requests += 1
+        try:
+            request = json.loads(body)
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError):
+            await self._send_json(writer, 400, {"error": {"message": "Expected a JSON body with messages"}})
+            return
+        tokens = self.answer(messages, min(self.tokens, int(request.get("max_tokens") or self.tokens)))
+        created = int(time.time())
+        await asyncio.sleep(self.first_token_delay)
+        if not request.get("stream"):
+            await self._send_json(writer, 200, {"object": "chat.completion", "created": created, "model": "stub",
+                                                "choices": [{"index": 0, "finish_reason": "stop",
+                                                             "message": {"role": "assistant", "content": "".join(tokens)}}]})
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            event = {"object": "chat.completion.chunk", "created": created, "model": "stub",
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self._write_chunk(writer, f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            await writer.drain()
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+# ---[ Command line ]--- #
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stub OpenAI compatible chat server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--first-token", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per answer")
+    args = parser.parse_args(argv)
+
+    async def run() -> None:
+        server = await StubServer(args.host, args.port, args.first_token, args.token_delay, args.tokens).start()
+        print(f"Stub server on {server.url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,7 +5,11 @@
 # ---[ Libraries ]--- #
 from ai_teacher.resources import functions as f
 from ai_teacher.resources import shared
+from ai_teacher.resources import settings
+from ai_teacher.gui import gui
 from ai_teacher.gui import login as gui_login
+from ai_teacher.backend import users
+from ai_teacher.backend import userdata
 
 import os
 
@@ -31,16 +35,31 @@ def login():
         default_config: str = os.path.join(shared.app_dir, "settings", "default.ini")
         f.dbg(f"Loading default user configuration from '{default_config}'")
         shared.user_config = f.load_config(default_config)
-        f.dbg(f"Writing default values to user configuration")
+        f.dbg(f"Adding pretty name {shared.user_name}")
+        if not shared.user_config.has_section('Account'):
+            shared.user_config.add_section('Account')
+        shared.user_config['Account']['pretty_name'] = shared.user_name
         
-        with open (shared.user_config_file, 'w', encoding='utf-8') as file:
+        f.dbg(f"Writing default values to user configuration")
+        temp_file = f"{shared.user_config_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
             shared.user_config.write(file)
-            
-        f.dbg(f"Adding pretty name {shared.user_name}")
-        f.update_user_config('Account', 'pretty_name', shared.user_name)
-        f.dbg(f"Reloading to make sure changes are made")
-        shared.user_config.clear()
-        shared.user_config = f.load_config(shared.user_config_file)
+        os.replace(temp_file, shared.user_config_file)
+    
+    # Typed user settings (invalid values fall back to their defaults)
+    settings.apply_user(settings.load_user(shared.user_config))
+    if shared.user_settings.problems:
+        f.dbg(f"Invalid user settings: {shared.user_settings.problems}")
+        gui.warn("Some of your settings are invalid, defaults are used instead:\n" + "\n".join(shared.user_settings.problems))
+    
+    # Calibration, sessions and events live in the user's SQLite store
+    userdata.open_store(shared.user_dir)
+    
+    # Keep the user index up to date (new user, last login time)
+    users.get_registry().add(
+        shared.user_settings.account.pretty_name or shared.user_name,
+        os.path.basename(shared.user_dir)
+    )
     
     f.dbg(f"Logging in as {shared.user_name}")
     f.dbg(f"User directory full path at: {shared.user_dir}")
@@ -0,0 +1,533 @@
+#
+# Lesson retrieval index
+# Copyright (C) 2025 Remeny
+#
+# Finds the lesson chunks (see lessons.py) that best match a question,
+# for the "basic" text chat session.
+#
+# Chunks are turned into hashed term vectors with scikit-learn's
+# HashingVectorizer (no vocabulary to keep), weighted with sublinear TF
+# and L2 normalized. Queries are weighted with IDF from the document
+# frequencies of all appended chunks.
+#
+# The index is a list of segments in data/.lessons/index. Each segment
+# stores its vectors column by column (an inverted index: for every
+# hashed term, the chunks containing it and their weights) as .npy
+# files that are opened memory-mapped, so opening a big index reads
+# nothing but a small JSON file. A query only touches the postings of
+# its own terms, adds them up with bincount and picks the best chunks
+# with argpartition.
+#
+# New and changed lesson files are appended as new segments; chunks of
+# changed and removed files are only marked deleted. When there are too
+# many segments they are merged into one (which also drops the deleted
+# chunks and recounts the document frequencies).
+#
+#   python -m ai_teacher.backend.retrieval build
+#   python -m ai_teacher.backend.retrieval search "what do mitochondria do"
+#   python -m ai_teacher.backend.retrieval bench --chunks 100000
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from typing import Any, Iterable, Iterator, Union
+
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+# ---[ Variables ]--- #
+INDEX_VERSION: int = 1
+INDEX_FILENAME: str = "index.json"
+DF_FILENAME: str = "df.npy"
+
+N_FEATURES: int = 2 ** 18
+# Chunks vectorized at a time, and chunks per segment when appending
+BATCH_SIZE: int = 2000
+SEGMENT_SIZE: int = 50000
+# More segments than this are merged after an update
+MAX_SEGMENTS: int = 8
+
+# ---[ Vectorizing ]--- #
+def make_vectorizer(n_features: int = N_FEATURES) -> Any:
+    from sklearn.feature_extraction.text import HashingVectorizer # type: ignore
+    return HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None,
+                             strip_accents="unicode", dtype=np.float32)
+
+def weigh_documents(counts: Any) -> Any:
+    """
+    Sublinear TF (1 + log tf), then L2 normalized rows.
+    """
+    from sklearn.preprocessing import normalize # type: ignore
+    counts = counts.tocsr(copy=True)
+    np.log(counts.data, out=counts.data)
+    counts.data += 1.0
+    return normalize(counts, norm="l2", copy=False)
+
+# ---[ Segments ]--- #
+class Segment:
+    """
+    One memory-mapped part of the index.
+
+    Args:
+        directory (str): Segment directory.
+        info (dict): Its entry of index.json ({"name", "docs", "sources"}).
+    """
+    def __init__(self, directory: str, info: dict[str, Any]) -> None:
+        self.directory = directory
+        self.info = info
+        self.name: str = info["name"]
+        self.docs: int = info["docs"]
+        # {source: [first doc, end doc]}, chunks of one source are contiguous
+        self.sources: dict[str, list[int]] = info["sources"]
+        self.term_ptr = np.load(os.path.join(directory, "term_ptr.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(directory, "doc_ids.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(directory, "weights.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "meta_offsets.npy"), mmap_mode="r")
+        # Deletions are written straight into the file
+        self.live = np.load(os.path.join(directory, "live.npy"), mmap_mode="r+")
+        self.meta_file = os.path.join(directory, "meta.jsonl")
+
+    def score(self, terms: np.ndarray, query_weights: np.ndarray) -> np.ndarray:
+        """
+        Dot products of the query with every chunk of the segment
+        (0 for deleted chunks).
+        """
+        starts, ends = self.term_ptr[terms], self.term_ptr[terms + 1]
+        lengths = ends - starts
+        if not lengths.any():
+            return np.zeros(self.docs, dtype=np.float32)
+        docs = np.concatenate([self.doc_ids[s:e] for s, e in zip(starts, ends)])
+        weights = np.concatenate([self.weights[s:e] for s, e in zip(starts, ends)])
+        weights *= np.repeat(query_weights, lengths)
+        scores = np.bincount(docs, weights=weights, minlength=self.docs).astype(np.float32)
+        scores[~self.live] = 0.0
+        return scores
+
+    def metadata(self, docs: Iterable[int]) -> list[dict[str, Any]]:
+        with open(self.meta_file, "rb") as file:
+            result = []
+            for doc in docs:
+                file.seek(int(self.offsets[doc]))
+                result.append(json.loads(file.readline()))
+        return result
+
+    def matrix(self) -> Any:
+        """
+        The segment's (docs x features) weights as a CSR matrix.
+        """
+        from scipy.sparse import csc_matrix # type: ignore
+        n_features = len(self.term_ptr) - 1
+        return csc_matrix((np.asarray(self.weights), np.asarray(self.doc_ids), np.asarray(self.term_ptr)),
+                          shape=(self.docs, n_features)).tocsr()
+
+    def close(self) -> None:
+        self.live.flush()
+        # Drop the maps so the files can be deleted (Windows)
+        del self.term_ptr, self.doc_ids, self.weights, self.offsets, self.live
+
+def write_segment(directory: str, matrix: Any, metadata: list[dict[str, Any]]) -> dict[str, list[int]]:
+    """
+    Writes a segment from a (docs x features) weight matrix and the
+    chunks' metadata. Returns its {source: [first doc, end doc]}.
+    """
+    temp_directory = f"{directory}.tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    os.makedirs(temp_directory)
+    csc = matrix.tocsc()
+    csc.sort_indices()
+    np.save(os.path.join(temp_directory, "term_ptr.npy"), csc.indptr.astype(np.int64))
+    np.save(os.path.join(temp_directory, "doc_ids.npy"), csc.indices.astype(np.int32))
+    np.save(os.path.join(temp_directory, "weights.npy"), csc.data.astype(np.float32))
+    np.save(os.path.join(temp_directory, "live.npy"), np.ones(len(metadata), dtype=bool))
+
+    sources: dict[str, list[int]] = {}
+    offsets = np.empty(len(metadata), dtype=np.int64)
+    with open(os.path.join(temp_directory, "meta.jsonl"), "wb") as file:
+        for doc, chunk in enumerate(metadata):
+            offsets[doc] = file.tell()
+            file.write(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+            span = sources.setdefault(chunk.get("source", ""), [doc, doc + 1])
+            span[1] = doc + 1
+    np.save(os.path.join(temp_directory, "meta_offsets.npy"), offsets)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temp_directory, directory)
+    return sources
+
+# ---[ Index ]--- #
+class LessonIndex:
+    """
+    Segmented, memory-mapped retrieval index.
+
+    Args:
+        directory (str): Index directory (created if missing).
+        n_features (int): Hashed feature count. Changing it rebuilds the index.
+    """
+    def __init__(self, directory: str, n_features: int = N_FEATURES) -> None:
+        self.directory = directory
+        self.n_features = n_features
+        self.index_file = os.path.join(directory, INDEX_FILENAME)
+        self.segments: list[Segment] = []
+        self.documents: int = 0  # Chunks ever appended (for the IDF)
+        self.df: np.ndarray = np.zeros(n_features, dtype=np.int32)
+        self.next_segment: int = 0
+        self._vectorizer: Any = None
+        self._idf: Union[np.ndarray, None] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        """
+        Number of chunks that are not deleted.
+        """
+        return sum(int(np.count_nonzero(segment.live)) for segment in self.segments)
+
+    @property
+    def vectorizer(self) -> Any:
+        if self._vectorizer is None:
+            self._vectorizer = make_vectorizer(self.n_features)
+        return self._vectorizer
+
+    @property
+    def sources(self) -> set[str]:
+        return {source for segment in self.segments for source in segment.sources}
+
+    # ---[ Opening and saving ]--- #
+    def open(self) -> "LessonIndex":
+        """
+        Maps the segments listed in index.json. Anything else in the
+        directory (left over by an interrupted update) is removed.
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as file:
+                    index = json.load(file)
+                if index.get("version") != INDEX_VERSION or index.get("n_features") != self.n_features:
+                    raise ValueError("made with another version or feature count")
+                self.documents = index["documents"]
+                self.next_segment = index["next_segment"]
+                self.segments = [Segment(os.path.join(self.directory, info["name"]), info) for info in index["segments"]]
+                self.df = np.load(os.path.join(self.directory, DF_FILENAME), mmap_mode="r")
+            except FileNotFoundError:
+                self.segments, self.documents, self.next_segment = [], 0, 0
+                self.df = np.zeros(self.n_features, dtype=np.int32)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                f.dbg(f"Lesson index {self.directory} is unusable, starting a new one: {e}")
+                self.segments, self.documents, self.next_segment = [], 0, 0
+                self.df = np.zeros(self.n_features, dtype=np.int32)
+            self._idf = None
+
+            names = {segment.name for segment in self.segments} | {INDEX_FILENAME, DF_FILENAME}
+            for name in os.listdir(self.directory):
+                if name not in names:
+                    path = os.path.join(self.directory, name)
+                    shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        return self
+
+    def _save(self) -> None:
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump({"version": INDEX_VERSION, "n_features": self.n_features, "documents": self.documents,
+                       "next_segment": self.next_segment, "segments": [segment.info for segment in self.segments]}, file)
+        os.replace(temp_file, self.index_file)
+
+    def _save_df(self, df: np.ndarray) -> None:
+        temp_file = os.path.join(self.directory, "df.tmp.npy")
+        np.save(temp_file, df.astype(np.int32))
+        # Drop the map of the old file first, Windows cannot replace a mapped file
+        self.df = df
+        os.replace(temp_file, os.path.join(self.directory, DF_FILENAME))
+        self.df = np.load(os.path.join(self.directory, DF_FILENAME), mmap_mode="r")
+        self._idf = None
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+
+    # ---[ Updating ]--- #
+    def _add_segment(self, matrix: Any, metadata: list[dict[str, Any]], df: np.ndarray) -> None:
+        name = f"seg{self.next_segment:05d}"
+        self.next_segment += 1
+        directory = os.path.join(self.directory, name)
+        sources = write_segment(directory, matrix, metadata)
+        df += np.bincount(matrix.indices, minlength=self.n_features).astype(np.int32)
+        self.documents += len(metadata)
+        self.segments = self.segments + [Segment(directory, {"name": name, "docs": len(metadata), "sources": sources})]
+
+    def append(self, chunks: Iterable[dict[str, Any]]) -> int:
+        """
+        Adds chunks ({"id", "source", "section", "hash", "text"}) as new
+        segments, SEGMENT_SIZE chunks at most each. Returns the number added.
+        """
+        from scipy.sparse import vstack # type: ignore
+
+        added = 0
+        with self._lock:
+            df = np.array(self.df, dtype=np.int32)
+            matrices: list[Any] = []
+            metadata: list[dict[str, Any]] = []
+            batch: list[dict[str, Any]] = []
+
+            def vectorize() -> None:
+                matrices.append(weigh_documents(self.vectorizer.transform([chunk["text"] for chunk in batch])))
+                metadata.extend(batch)
+                batch.clear()
+
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= BATCH_SIZE:
+                    vectorize()
+                    if len(metadata) >= SEGMENT_SIZE:
+                        self._add_segment(vstack(matrices, format="csr"), metadata, df)
+                        added += len(metadata)
+                        matrices, metadata = [], []
+            if batch:
+                vectorize()
+            if metadata:
+                self._add_segment(vstack(matrices, format="csr"), metadata, df)
+                added += len(metadata)
+            if added:
+                self._save_df(df)
+                self._save()
+        return added
+
+    def delete_sources(self, sources: Iterable[str]) -> int:
+        """
+        Marks the chunks of the given lesson files deleted.
+        Returns the number of chunks deleted.
+        """
+        sources = set(sources)
+        deleted = 0
+        with self._lock:
+            kept: list[Segment] = []
+            for segment in self.segments:
+                for source in sources.intersection(segment.sources):
+                    start, end = segment.sources.pop(source)
+                    deleted += int(np.count_nonzero(segment.live[start:end]))
+                    segment.live[start:end] = False
+                if segment.sources:
+                    segment.live.flush()
+                    kept.append(segment)
+                else:  # Nothing left in it
+                    directory = segment.directory
+                    segment.close()
+                    shutil.rmtree(directory, ignore_errors=True)
+            self.segments = kept
+            if deleted:
+                self._save()
+        return deleted
+
+    def compact(self) -> None:
+        """
+        Merges all segments into one without the deleted chunks, and
+        counts the document frequencies again.
+        """
+        from scipy.sparse import vstack # type: ignore
+
+        with self._lock:
+            old = self.segments
+            if not old:
+                return
+            matrices, metadata = [], []
+            for segment in old:
+                live = np.flatnonzero(segment.live)
+                matrices.append(segment.matrix()[live])
+                metadata.extend(segment.metadata(live))
+            matrix = vstack(matrices, format="csr")
+            self.segments, self.documents = [], 0
+            df = np.zeros(self.n_features, dtype=np.int32)
+            if metadata:
+                self._add_segment(matrix, metadata, df)
+            self._save_df(df)
+            self._save()
+            for segment in old:
+                directory = segment.directory
+                segment.close()
+                shutil.rmtree(directory, ignore_errors=True)
+        f.dbg(f"Lesson index compacted: {len(old)} segment(s) into {len(self.segments)}, {len(metadata)} chunks")
+
+    def sync(self, store: Any, force: bool = False) -> dict[str, Any]:
+        """
+        Ingests the lesson files (lessons.LessonStore) and brings the
+        index up to date with them: chunks of changed and removed files
+        are deleted, those of new and changed files appended.
+        """
+        start = time.perf_counter()
+        report = store.ingest(force=force)
+        with self._lock:
+            indexed = self.sources
+            current = set(store.files)
+            changed = set(report.changed_sources)
+            deleted = self.delete_sources((changed & indexed) | (indexed - current))
+            added = self.append(store.iter_chunks(sorted((changed & current) | (current - indexed))))
+            if len(self.segments) > MAX_SEGMENTS:
+                self.compact()
+        summary = {"ingest": report.as_dict(), "added": added, "deleted": deleted, "chunks": len(self),
+                   "segments": len(self.segments), "seconds": round(time.perf_counter() - start, 3)}
+        f.dbg(f"Lesson index updated: {added} chunk(s) added, {deleted} deleted, {summary['chunks']} in total")
+        return summary
+
+    # ---[ Searching ]--- #
+    def idf(self) -> np.ndarray:
+        if self._idf is None:
+            self._idf = (np.log((self.documents + 1.0) / (np.asarray(self.df, dtype=np.float32) + 1.0)) + 1.0).astype(np.float32)
+        return self._idf
+
+    def search(self, query: str, k: int = 5) -> list[dict[str, Any]]:
+        """
+        The k best matching chunks, best first, each with a "score".
+        """
+        counts = self.vectorizer.transform([query])
+        if counts.nnz == 0 or k <= 0:
+            return []
+        terms = counts.indices.astype(np.int64)
+        query_weights = (1.0 + np.log(counts.data)) * self.idf()[terms]
+        query_weights /= np.linalg.norm(query_weights)
+
+        segments = self.segments  # Appends swap the list, a search keeps using its own
+        candidates: list[tuple[float, int, int]] = []
+        for number, segment in enumerate(segments):
+            scores = segment.score(terms, query_weights.astype(np.float32))
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            candidates.extend((float(scores[doc]), number, int(doc)) for doc in top if scores[doc] > 0.0)
+        candidates.sort(reverse=True)
+
+        hits = []
+        for score, number, doc in candidates[:k]:
+            chunk = segments[number].metadata((doc,))[0]
+            chunk["score"] = round(score, 4)
+            hits.append(chunk)
+        return hits
+
+# ---[ Application index ]--- #
+index: Union[LessonIndex, None] = None
+ready: threading.Event = threading.Event()
+thread: Union[threading.Thread, None] = None
+
+def start() -> None:
+    """
+    Opens the lesson index and brings it up to date on a background
+    thread (once). get_index() waits for it.
+    """
+    global thread
+    if thread is not None:
+        return
+
+    def run() -> None:
+        global index
+        from ai_teacher.backend import lessons
+        from ai_teacher.resources import shared
+        try:
+            lesson_index = LessonIndex(os.path.join(shared.app_dir, "data", ".lessons", "index")).open()
+            lesson_index.sync(lessons.get_store())
+            index = lesson_index
+        except Exception as e:
+            f.dbg(f"Lesson index could not be prepared: {e}")
+        finally:
+            ready.set()
+
+    thread = threading.Thread(target=run, name="lesson-index", daemon=True)
+    thread.start()
+
+def get_index(timeout: Union[float, None] = None) -> Union[LessonIndex, None]:
+    """
+    The application's lesson index, or None if it is not (yet) available.
+    """
+    start()
+    ready.wait(timeout)
+    return index
+
+def search(query: str, k: Union[int, None] = None) -> list[dict[str, Any]]:
+    """
+    The best lesson chunks for a question (top_k in [Lessons] by
+    default), or none while the index is not ready.
+    """
+    from ai_teacher.resources import shared
+    lesson_index = index if ready.is_set() else None
+    if lesson_index is None:
+        return []
+    return lesson_index.search(query, k if k is not None else shared.settings.lessons.top_k)
+
+# ---[ Command line ]--- #
+def _synthetic_chunks(count: int, seed: int = 0) -> Iterator[dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(50000)])
+    # Zipf-like word frequencies, like real text
+    probabilities = 1.0 / np.arange(1, len(vocabulary) + 1)
+    probabilities /= probabilities.sum()
+    for i in range(count):
+        words = rng.choice(vocabulary, size=int(rng.integers(60, 200)), p=probabilities)
+        yield {"id": f"synthetic#{i}", "source": f"synthetic{i // 1000}.txt", "section": "",
+               "hash": f"{i:016x}", "text": " ".join(words)}
+
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+    import tempfile
+    from ai_teacher.backend.lessons import LessonStore
+
+    app_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    parser = argparse.ArgumentParser(description="Lesson retrieval index.")
+    parser.add_argument("--index", default=os.path.join(app_dir, "data", ".lessons", "index"), help="index directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="ingest text/lessons and update the index")
+    build_parser.add_argument("--lessons", default=os.path.join(app_dir, "text", "lessons"), help="lesson directory")
+    build_parser.add_argument("--force", action="store_true", help="ingest every file again")
+    search_parser = commands.add_parser("search", help="print the best chunks for a question")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=5)
+    bench_parser = commands.add_parser("bench", help="build a synthetic index and time it")
+    bench_parser.add_argument("--chunks", type=int, default=100000)
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        lesson_index = LessonIndex(args.index).open()
+        store = LessonStore(args.lessons, os.path.dirname(os.path.abspath(args.index)))
+        print(json.dumps(lesson_index.sync(store, force=args.force), indent=2))
+        return 0
+
+    if args.command == "search":
+        lesson_index = LessonIndex(args.index).open()
+        for hit in lesson_index.search(args.query, args.k):
+            print(f"{hit['score']:.3f}  {hit['id']}  [{hit.get('section', '')}]\n       {hit['text'][:160]}")
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        start_time = time.perf_counter()
+        LessonIndex(directory).open().append(_synthetic_chunks(args.chunks))
+        print(f"Build:  {args.chunks} chunks in {time.perf_counter() - start_time:.1f} s")
+
+        start_time = time.perf_counter()
+        lesson_index = LessonIndex(directory).open()
+        print(f"Open:   {(time.perf_counter() - start_time) * 1000:.1f} ms, {len(lesson_index.segments)} segment(s)")
+
+        start_time = time.perf_counter()
+        lesson_index.append(_synthetic_chunks(1000, seed=1))
+        print(f"Append: 1000 chunks in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
+        rng = np.random.default_rng(2)
+        lesson_index.search("w1 w2", args.k)  # Vectorizer set up
+        times = []
+        for _ in range(args.queries):
+            query = " ".join(f"w{int(i)}" for i in rng.integers(0, 2000, size=int(rng.integers(3, 12))))
+            start_time = time.perf_counter()
+            lesson_index.search(query, args.k)
+            times.append(time.perf_counter() - start_time)
+        p50, p95, p99 = np.percentile(times, (50, 95, 99)) * 1000.0
+        print(f"Search: p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms (top {args.k})")
+        lesson_index.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,549 @@
+#
+# Streaming text to speech
+# Copyright (C) 2025 Remeny
+#
+# Reads the teacher's answer aloud while it is still being written.
+#
+# feed() takes the streamed text of the answer (from any thread) and
+# splits it into sentences (SentenceSplitter). Each sentence is
+# synthesized on a small worker pool by a SpeechEngine (espeak-ng, or the
+# deterministic StubEngine for tests and machines without one), at most
+# prefetch sentences ahead of what is playing. A player thread takes the
+# results in sentence order, converts them to the mixer's format and
+# queues them on the speech channel of the SoundManager (sounds.py):
+# pygame plays a queued sound right after the current one, so there are
+# no gaps between sentences.
+#
+# Speech starts as soon as the first sentence is synthesized, not when
+# the whole answer is there. cancel() stops speaking and forgets
+# everything queued (the student moved on).
+#
+# Without a mixer (no audio device, sounds off) the pipeline is not
+# created and nothing is spoken. Timing with the stub engine and no
+# audio device:
+#
+#   python -m ai_teacher.backend.speech bench --engine stub --delay 0.08
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from hashlib import blake2b
+from typing import Any, Union
+
+import os
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+# ---[ Variables ]--- #
+# Words ending in a dot that do not end a sentence
+ABBREVIATIONS: frozenset[str] = frozenset((
+    "dr", "mr", "mrs", "ms", "prof", "st", "vs", "etc", "e.g", "i.e", "fig", "approx", "ca", "cf", "p",
+))
+# Words that are only abbreviations before a number ("No. 5", but "The answer is no. Next...")
+NUMBER_ABBREVIATIONS: frozenset[str] = frozenset(("no", "nr", "vol"))
+# End of a sentence: . ! ? (or several, or …) with closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r"([.!?…]+)([\"'”’)\]]*)(\s+)")
+PLAYER_POLL: float = 0.005  # Seconds between checks whether the channel can take the next sound
+
+# ---[ Sentences ]--- #
+class SentenceSplitter:
+    """
+    Splits streamed text into sentences.
+
+    A sentence is complete when its end mark is followed by whitespace,
+    or at a line break. Sentences longer than max_chars are cut at the
+    last comma, semicolon or space before the limit, so a long first
+    sentence does not hold speech back.
+
+    Args:
+        max_chars (int): Longest piece returned.
+    """
+    def __init__(self, max_chars: int = 200) -> None:
+        self.max_chars = max(20, max_chars)
+        self._buffer: str = ""
+
+    def feed(self, text: str) -> list[str]:
+        """
+        Adds text. Returns the sentences it completed.
+        """
+        self._buffer += text
+        sentences: list[str] = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            end = match.end(2)
+            if match.group(1) == ".":
+                before = self._buffer[start:match.start(1)]
+                if self._no_end(before):
+                    continue
+                if self._last_word(before) in NUMBER_ABBREVIATIONS:
+                    following = self._buffer[match.end():match.end() + 1]
+                    if not following:
+                        break  # Not known yet whether a number follows
+                    if following.isdigit():
+                        continue
+            sentences.extend(self._pieces(self._buffer[start:end]))
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        # Line breaks end a sentence too (lists, headings)
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            sentences.extend(self._pieces(line))
+        # Cut overlong text even without an end mark yet
+        while len(self._buffer) > self.max_chars:
+            piece, self._buffer = self._cut(self._buffer)
+            sentences.extend(self._pieces(piece))
+        return sentences
+
+    def flush(self) -> list[str]:
+        """
+        The rest of the text (end of the answer).
+        """
+        rest, self._buffer = self._buffer, ""
+        return self._pieces(rest)
+
+    def reset(self) -> None:
+        self._buffer = ""
+
+    @staticmethod
+    def _no_end(before: str) -> bool:
+        """
+        Whether a dot after this text is not the end of a sentence
+        (abbreviation, initial, number like 3.5 is never matched).
+        """
+        word = SentenceSplitter._last_word(before)
+        return word in ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+    @staticmethod
+    def _last_word(text: str) -> str:
+        return text.rsplit(None, 1)[-1].lower() if text.strip() else ""
+
+    def _cut(self, text: str) -> tuple[str, str]:
+        limit = text[:self.max_chars]
+        for separator in (", ", "; ", ": ", " "):
+            position = limit.rfind(separator)
+            if position > self.max_chars // 3:
+                return text[:position + 1], text[position + 1:]
+        return text[:self.max_chars], text[self.max_chars:]
+
+    def _pieces(self, text: str) -> list[str]:
+        text = " ".join(text.split())
+        pieces = []
+        while len(text) > self.max_chars:
+            piece, text = self._cut(text)
+            pieces.append(piece.strip())
+        pieces.append(text.strip())
+        # Skip pieces without anything to say (e.g. only "**" or "-")
+        return [piece for piece in pieces if any(c.isalnum() for c in piece)]
+
+# ---[ Engines ]--- #
+class SpeechError(Exception):
+    """
+    A speech engine could not be used.
+    """
+
+class SpeechEngine:
+    """
+    Turns one sentence into audio. synthesize() is called from several
+    worker threads at the same time.
+    """
+    name: str = "none"
+    sample_rate: int = 22050
+
+    def synthesize(self, text: str) -> np.ndarray:
+        """
+        Mono int16 samples at sample_rate.
+        """
+        raise NotImplementedError
+
+class StubEngine(SpeechEngine):
+    """
+    Deterministic stand-in: a soft tone per sentence, its pitch from the
+    text and its length from the number of characters.
+
+    Args:
+        sample_rate (int): Output sample rate.
+        chars_per_second (float): Speaking speed.
+        delay (float): Seconds each sentence takes to "synthesize".
+    """
+    name = "stub"
+
+    def __init__(self, sample_rate: int = 22050, chars_per_second: float = 15.0, delay: float = 0.0) -> None:
+        self.sample_rate = sample_rate
+        self.chars_per_second = chars_per_second
+        self.delay = delay
+
+    def synthesize(self, text: str) -> np.ndarray:
+        if self.delay:
+            time.sleep(self.delay)
+        seconds = max(0.2, len(text) / self.chars_per_second)
+        pitch = 180 + blake2b(text.encode("utf-8"), digest_size=1).digest()[0]
+        t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+        envelope = np.minimum(1.0, np.minimum(t, seconds - t) * 20.0)  # 50 ms fade in and out
+        return (np.sin(2 * np.pi * pitch * t) * envelope * 6000).astype(np.int16)
+
+class EspeakEngine(SpeechEngine):
+    """
+    espeak-ng (or espeak) command line synthesizer.
+
+    Args:
+        voice (str): Voice/language, e.g. "en", "en-us", "hu".
+        rate (int): Words per minute.
+        executable (str | None): Program to run, found on PATH by default.
+    """
+    name = "espeak"
+
+    def __init__(self, voice: str = "en", rate: int = 170, executable: Union[str, None] = None) -> None:
+        self.voice = voice
+        self.rate = rate
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.executable:
+            raise SpeechError("espeak-ng is not installed")
+        self.sample_rate = 22050
+
+    def synthesize(self, text: str) -> np.ndarray:
+        try:
+            # Text on stdin (-b 1: UTF-8), so it can never be taken for an option
+            result = subprocess.run([self.executable, "--stdout", "-b", "1", "-v", self.voice, "-s", str(self.rate)],
+                                    input=text.encode("utf-8"), capture_output=True, timeout=30, check=True)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise SpeechError(f"espeak failed: {e}") from None
+        samples, rate = read_wav(result.stdout)
+        return resample(samples, rate, self.sample_rate)
+
+def read_wav(data: bytes) -> tuple[np.ndarray, int]:
+    """
+    Mono int16 samples and sample rate of a 16 bit PCM WAV. Written to
+    a pipe, the sizes in the header are often wrong, so the data chunk
+    is simply taken to the end.
+    """
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise SpeechError("Not a WAV file")
+    position, channels, rate = 12, 1, 22050
+    while position + 8 <= len(data):
+        chunk, size = data[position:position + 4], struct.unpack("<I", data[position + 4:position + 8])[0]
+        if chunk == b"fmt ":
+            channels, rate = struct.unpack("<HI", data[position + 10:position + 16])
+        elif chunk == b"data":
+            body = data[position + 8:]
+            samples = np.frombuffer(body[:len(body) // 2 * 2], dtype="<i2")
+            if channels > 1:
+                samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1).astype(np.int16)
+            return samples, rate
+        position += 8 + size + (size & 1)
+    raise SpeechError("WAV without data")
+
+def make_engine(name: str, voice: str = "en", rate: int = 170) -> Union[SpeechEngine, None]:
+    """
+    The engine called name ("espeak", "stub", or "auto": espeak if it is
+    installed), or None ("off", or espeak missing with "auto").
+    """
+    name = name.lower()
+    if name == "stub":
+        return StubEngine()
+    if name in ("espeak", "auto"):
+        try:
+            return EspeakEngine(voice, rate)
+        except SpeechError as e:
+            if name == "espeak":
+                f.dbg(f"Speech is off: {e}")
+    return None
+
+# ---[ Pipeline ]--- #
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """
+    Linear interpolation, good enough for speech.
+    """
+    if rate == target_rate or not len(samples):
+        return samples
+    count = int(len(samples) * target_rate / rate)
+    return np.interp(np.arange(count) * (rate / target_rate), np.arange(len(samples)), samples).astype(np.int16)
+
+def to_mixer_format(samples: np.ndarray, rate: int, mixer_rate: int, mixer_channels: int) -> bytes:
+    """
+    Mono int16 samples in the mixer's rate and channel count
+    (signed 16 bit, interleaved).
+    """
+    samples = resample(samples, rate, mixer_rate)
+    if mixer_channels > 1:
+        samples = np.repeat(samples, mixer_channels)
+    return samples.astype("<i2").tobytes()
+
+class SpeechPipeline:
+    """
+    Sentence splitting, synthesis and gapless playback of streamed text.
+
+    Args:
+        engine (SpeechEngine): Synthesizer.
+        channel: pygame.mixer.Channel reserved for speech.
+        workers (int): Sentences synthesized at the same time.
+        prefetch (int): Sentences synthesized ahead of the one playing.
+        max_sentence_chars (int): Longer sentences are split.
+    """
+    def __init__(self, engine: SpeechEngine, channel: Any, workers: int = 2, prefetch: int = 3,
+                 max_sentence_chars: int = 200) -> None:
+        import pygame
+
+        self.engine = engine
+        self.channel = channel
+        self.splitter = SentenceSplitter(max_sentence_chars)
+        self.mixer_rate, _, self.mixer_channels = pygame.mixer.get_init()
+        self._sound = pygame.mixer.Sound
+        self._executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix="speech")
+        self._slots = threading.Semaphore(max(1, prefetch))
+
+        # (generation, sentence, time it was complete) and (generation, future, time)
+        self._sentences: "queue.SimpleQueue[Union[tuple[int, str, float], None]]" = queue.SimpleQueue()
+        self._ready: "queue.SimpleQueue[Union[tuple[int, Future[np.ndarray], float], None]]" = queue.SimpleQueue()
+        self._generation: int = 0
+        self._started: int = -1  # Last generation that got a sentence
+        self._first_sentence: dict[int, float] = {}  # Generations that have not started playing yet
+        self._busy_until: float = 0.0  # When the channel runs out of queued speech
+        self._lock = threading.Lock()
+        self.first_audio: list[float] = []  # Seconds from the first sentence to its playback, per answer
+        self.underruns: int = 0  # Times the channel ran dry while the next sentence was already there
+
+        self._threads = [threading.Thread(target=self._dispatch_loop, name="speech-dispatch", daemon=True),
+                         threading.Thread(target=self._play_loop, name="speech-player", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    # ---[ Input (any thread) ]--- #
+    def feed(self, text: str) -> None:
+        """
+        Adds streamed text of the current answer.
+        """
+        with self._lock:
+            sentences = self.splitter.feed(text)
+            self._queue(sentences)
+
+    def end(self) -> None:
+        """
+        The answer is complete: speaks what is left of it.
+        """
+        with self._lock:
+            self._queue(self.splitter.flush())
+
+    def say(self, text: str) -> None:
+        """
+        Speaks a whole text (after what is already queued).
+        """
+        with self._lock:
+            self._queue(self.splitter.feed(text) + self.splitter.flush())
+
+    def _queue(self, sentences: list[str]) -> None:
+        now = time.perf_counter()
+        for sentence in sentences:
+            if self._started != self._generation:
+                self._started = self._generation
+                self._first_sentence[self._generation] = now
+            self._sentences.put((self._generation, sentence, now))
+
+    def cancel(self) -> None:
+        """
+        Stops speaking and drops everything queued.
+        """
+        with self._lock:
+            self._generation += 1
+            self.splitter.reset()
+            self._first_sentence.clear()
+            # Under the lock, so _enqueue() cannot start a sound of the old answer afterwards
+            self.channel.stop()
+            if self.channel.get_queue() is not None:
+                self.channel.stop()  # Older pygame plays the queued sound when the current one is stopped
+
+    def close(self) -> None:
+        self.cancel()
+        self._sentences.put(None)
+        for thread in self._threads:
+            thread.join(2.0)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def speaking(self) -> bool:
+        return bool(self.channel.get_busy())
+
+    @property
+    def pending(self) -> bool:
+        """
+        Whether sentences of the current answer are still to be played.
+        """
+        return not (self._sentences.empty() and self._ready.empty()) or self._generation in self._first_sentence
+
+    # ---[ Threads ]--- #
+    def _dispatch_loop(self) -> None:
+        """
+        Hands sentences to the workers, at most prefetch ahead of playback.
+        """
+        while True:
+            item = self._sentences.get()
+            if item is None:
+                self._ready.put(None)
+                return
+            generation, sentence, queued = item
+            if generation != self._generation:
+                continue
+            self._slots.acquire()  # Released by the player
+            if generation != self._generation:
+                self._slots.release()
+                continue
+            self._ready.put((generation, self._executor.submit(self._synthesize, sentence), queued))
+
+    def _synthesize(self, sentence: str) -> bytes:
+        samples = self.engine.synthesize(sentence)
+        return to_mixer_format(samples, self.engine.sample_rate, self.mixer_rate, self.mixer_channels)
+
+    def _play_loop(self) -> None:
+        """
+        Queues synthesized sentences on the channel, in order.
+        """
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+            generation, future, queued = item
+            try:
+                data = future.result()
+                if generation == self._generation and data:
+                    self._enqueue(generation, self._sound(buffer=data), queued)
+            except CancelledError:
+                pass
+            except Exception as e:
+                f.dbg(f"Could not synthesize a sentence: {e}")
+            finally:
+                self._slots.release()
+
+    def _enqueue(self, generation: int, sound: Any, queued: float) -> None:
+        # A channel holds one playing and one queued sound: wait for the queued one to start
+        while True:
+            with self._lock:  # The check and the play/queue call are one step for cancel()
+                if generation != self._generation:
+                    return
+                now = time.perf_counter()
+                if not self.channel.get_busy():
+                    self.channel.play(sound)
+                    first = self._first_sentence.pop(generation, None)
+                    if first is not None:
+                        self.first_audio.append(now - first)
+                    elif queued < self._busy_until:
+                        self.underruns += 1  # Synthesis was too slow
+                    self._busy_until = now + sound.get_length()
+                    break
+                if self.channel.get_queue() is None:
+                    self.channel.queue(sound)
+                    self._busy_until += sound.get_length()
+                    return
+            time.sleep(PLAYER_POLL)
+        if first is not None:
+            f.dbg(f"Speech started {(now - first) * 1000:.0f} ms after the first sentence")
+
+# ---[ Application pipeline ]--- #
+pipeline: Union[SpeechPipeline, None] = None
+pipeline_lock: threading.Lock = threading.Lock()
+
+def get_pipeline(timeout: float = 0.0) -> Union[SpeechPipeline, None]:
+    """
+    The speech pipeline configured in [Speech], or None when speech is
+    off or there is no mixer (waits up to timeout for the mixer to start).
+    """
+    from ai_teacher.resources import shared
+    from ai_teacher.resources import sounds
+    global pipeline
+    speech = shared.settings.speech
+    if not speech.enable or sounds.manager is None or not sounds.manager.wait(timeout):
+        return None
+    with pipeline_lock:
+        if pipeline is None:
+            channel = sounds.manager.speech_channel
+            engine = make_engine(speech.engine, speech.voice, speech.rate)
+            if engine is None or channel is None:
+                return None
+            channel.set_volume(speech.volume)
+            pipeline = SpeechPipeline(engine, channel, speech.workers, speech.prefetch, speech.max_sentence_chars)
+            f.dbg(f"Speech pipeline started with {engine.name}")
+    return pipeline
+
+def close() -> None:
+    global pipeline
+    with pipeline_lock:
+        if pipeline is not None:
+            pipeline.close()
+            pipeline = None
+
+# ---[ Command line ]--- #
+BENCH_TEXT: str = (
+    "Plants make their own food. They use light, water and carbon dioxide to make sugar! "
+    "This is called photosynthesis. It happens in the chloroplasts, e.g. in the leaves. "
+    "Oxygen is released as a by-product, which is why forests matter so much. Any questions?"
+)
+
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Streaming text to speech timing.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench_parser = commands.add_parser("bench", help="stream a text into the pipeline and time it")
+    bench_parser.add_argument("--engine", default="stub", choices=("stub", "espeak"))
+    bench_parser.add_argument("--delay", type=float, default=0.05, help="stub synthesis seconds per sentence")
+    bench_parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    bench_parser.add_argument("--answers", type=int, default=2)
+    bench_parser.add_argument("--workers", type=int, default=2)
+    bench_parser.add_argument("--prefetch", type=int, default=3)
+    say_parser = commands.add_parser("say", help="speak a text")
+    say_parser.add_argument("text")
+    say_parser.add_argument("--voice", default="en")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    try:
+        pygame.mixer.init(44100, -16, 2, 512)
+    except pygame.error:
+        os.environ["SDL_AUDIODRIVER"] = "dummy"  # No audio device: time it anyway
+        pygame.mixer.init(44100, -16, 2, 512)
+    pygame.mixer.set_reserved(1)
+    channel = pygame.mixer.Channel(0)
+
+    if args.command == "say":
+        engine = make_engine("espeak", args.voice) or StubEngine()
+        speech = SpeechPipeline(engine, channel)
+        speech.say(args.text)
+        time.sleep(0.5)
+        while speech.speaking:
+            time.sleep(0.1)
+        speech.close()
+        return 0
+
+    engine = StubEngine(delay=args.delay) if args.engine == "stub" else make_engine("espeak")
+    if engine is None:
+        print("espeak-ng is not installed")
+        return 1
+    speech = SpeechPipeline(engine, channel, args.workers, args.prefetch)
+    tokens = re.findall(r"\S+\s*", BENCH_TEXT)
+    for _ in range(args.answers):
+        for token in tokens:
+            speech.feed(token)
+            time.sleep(1.0 / args.tokens_per_second)
+        speech.end()
+        while speech.speaking or speech.pending:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        speech.cancel()
+    speech.close()
+    pygame.mixer.quit()
+    latencies = sorted(speech.first_audio)
+    if latencies:
+        print(f"{engine.name}: first audio {latencies[len(latencies) // 2] * 1000:.0f} ms after the first sentence "
+              f"(median of {len(latencies)}, worst {latencies[-1] * 1000:.0f} ms), {speech.underruns} gap(s)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,311 @@
+#
+# Out-of-process face tracking
+# Copyright (C) 2025 Remeny
+#
+# With out_of_process = true in [Camera], the camera is read and
+# FaceMesh runs in a child process, so neither competes with Tk for the
+# GIL of the application process.
+#
+# Frames never go through a pipe. The child writes each tracked frame
+# (RGB, with the tracked points drawn) into a slot of a shared memory
+# ring (FrameRing) and only sends the slot number, the points, the
+# landmark array and the timings over the pipe. A slot belongs to the
+# parent until it sends it back with release(), so the child never
+# overwrites a frame that is still being read; when no slot is free the
+# child still sends the landmarks, just without a frame.
+#
+# Messages from the child:
+#   ("ready", ring name, frame shape, slot count)
+#   ("frame", slot or -1, timestamp, points, landmarks or None, timings)
+#   ("error", text)
+# Commands to the child:
+#   ("stream",), ("release", slot), ("precise", bool), ("configure", options), ("stop",)
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Union
+
+import multiprocessing
+import signal
+import threading
+import time
+
+import numpy as np
+
+# ---[ Variables ]--- #
+# FaceTracker arguments that come from [Camera]
+TRACKER_OPTIONS: tuple[str, ...] = ("roi_tracking", "roi_padding", "roi_size",
+                                    "adaptive_rate", "motion_threshold", "max_skip_frames")
+
+# Colors of the tracked points drawn on the preview (nose, left iris, right iris)
+POINT_COLORS: tuple[tuple[int, int, int], ...] = ((0, 255, 0), (255, 0, 0), (0, 0, 255))
+
+# ---[ Shared memory ring ]--- #
+class FrameRing:
+    """
+    Fixed number of equally sized uint8 frame slots in one shared memory block.
+
+    Args:
+        shape (tuple[int, ...]): Shape of one frame (height, width, 3).
+        slots (int): Number of slots.
+        name (str | None): Existing block to attach to, None to create a new one.
+    """
+    def __init__(self, shape: tuple[int, ...], slots: int, name: Union[str, None] = None) -> None:
+        self.shape = tuple(shape)
+        self.slot_count = slots
+        self.owner = name is None
+        size = slots * int(np.prod(self.shape))
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.name = self.memory.name
+        self.slots: list[np.ndarray] = list(np.ndarray((slots, *self.shape), dtype=np.uint8, buffer=self.memory.buf))
+
+    def close(self) -> None:
+        """
+        Detaches from the block (and frees it, in the process that created it).
+        """
+        self.slots = []  # The views must be gone before the buffer can be closed
+        try:
+            self.memory.close()
+            if self.owner:
+                self.memory.unlink()
+        except (BufferError, FileNotFoundError):
+            pass
+
+def options_from_settings(camera: Any) -> dict[str, Any]:
+    """
+    FaceTracker arguments from a settings.CameraSettings section.
+    """
+    return {name: getattr(camera, name) for name in TRACKER_OPTIONS}
+
+# ---[ Child process ]--- #
+def _child_main(conn: Any, camera_index: int, options: dict[str, Any], slot_count: int) -> None:
+    """
+    Entry point of the child: capture thread + tracking loop.
+    """
+    import cv2
+    from ai_teacher.backend.facetrack import FaceTracker
+    from ai_teacher.resources.pipeline import DropQueue, QueueClosed, start_stage
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The application decides when to stop
+    capture = cv2.VideoCapture(camera_index)
+    tracker: Union[FaceTracker, None] = None
+    ring: Union[FrameRing, None] = None
+    stop = threading.Event()
+    frames = DropQueue(1)
+    capture_thread: Union[threading.Thread, None] = None
+    try:
+        ok, frame = capture.read() if capture.isOpened() else (False, None)
+        if not ok:
+            conn.send(("error", f"Camera {camera_index} could not be opened"))
+            return
+        tracker = FaceTracker(**options)
+        tracker.warm_up(frame.shape[1], frame.shape[0])
+        ring = FrameRing(frame.shape, slot_count)
+        free: deque[int] = deque(range(slot_count))
+
+        def capture_loop() -> None:
+            while not stop.is_set():
+                ok, frame = capture.read()
+                if ok:
+                    frames.put((frame, time.monotonic()))
+                else:
+                    stop.wait(0.01)
+            frames.close()
+
+        capture_thread = start_stage("tracker-capture", capture_loop)
+        conn.send(("ready", ring.name, ring.shape, slot_count))
+
+        streaming = False
+        while True:
+            # Commands first, they are few and small
+            while conn.poll():
+                command = conn.recv()
+                if command[0] == "release":
+                    free.append(command[1])
+                elif command[0] == "stream":
+                    streaming = True
+                elif command[0] == "precise":
+                    tracker.precise = command[1]
+                elif command[0] == "configure":
+                    for name, value in command[1].items():
+                        setattr(tracker, name, value)
+                elif command[0] == "stop":
+                    return
+            try:
+                item = frames.get(timeout=0.05)
+            except QueueClosed:
+                conn.send(("error", f"Camera {camera_index} stopped delivering frames"))
+                return
+            if item is None or not streaming:
+                continue
+            frame, timestamp = item
+
+            result = tracker.process(frame)
+            rgb, points = result.rgb, result.points
+            slot = free.popleft() if free else -1
+            if slot >= 0:
+                if points is not None:
+                    h, w = rgb.shape[:2]
+                    for pt, color in zip(points, POINT_COLORS):
+                        cv2.circle(rgb, (int(pt[0] * w), int(pt[1] * h)), 3, color, -1)
+                if rgb.shape == ring.shape:
+                    np.copyto(ring.slots[slot], rgb)
+                else:  # The camera changed its resolution
+                    cv2.resize(rgb, (ring.shape[1], ring.shape[0]), dst=ring.slots[slot])
+            landmarks = result.landmarks if result.inferred else None
+            conn.send(("frame", slot, timestamp, points, landmarks, result.timings))
+    except (EOFError, BrokenPipeError):
+        pass  # The application is gone
+    except Exception as e:
+        try:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        except (OSError, EOFError):
+            pass
+    finally:
+        stop.set()
+        if capture_thread is not None:
+            capture_thread.join(2.0)
+        capture.release()
+        if tracker is not None:
+            tracker.close()
+        if ring is not None:
+            ring.close()
+        conn.close()
+
+# ---[ Parent side ]--- #
+class TrackerProcess:
+    """
+    Handle of the child process that tracks one camera.
+
+    start() returns right away; the child opens the camera and builds
+    FaceMesh on its own. wait_ready() then attaches the frame ring, and
+    frames are only sent after stream().
+
+    Args:
+        camera_index (int): Camera to open in the child.
+        options (dict): FaceTracker arguments (see options_from_settings()).
+        slots (int): Frames in the ring. The parent holds at most one or two at a time.
+    """
+    def __init__(self, camera_index: int, options: dict[str, Any], slots: int = 3) -> None:
+        self.camera_index = camera_index
+        self.options = dict(options)
+        self.slot_count = max(2, slots)
+        self.ring: Union[FrameRing, None] = None
+        self.error: str = ""
+
+        self._process: Any = None
+        self._conn: Any = None
+        self._send_lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> "TrackerProcess":
+        # spawn: the child must not inherit Tk, the camera or any threads
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe(duplex=True)
+        self._process = context.Process(
+            target=_child_main,
+            args=(child_conn, self.camera_index, self.options, self.slot_count),
+            name=f"tracker-{self.camera_index}",
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        f.dbg(f"Tracking process {self._process.pid} started for camera {self.camera_index}")
+        return self
+
+    def _send(self, *command: Any) -> None:
+        with self._send_lock:
+            try:
+                self._conn.send(command)
+            except (OSError, EOFError):
+                pass  # The child is gone, receive() reports it
+
+    def wait_ready(self, timeout: float = 0.1) -> Union[bool, None]:
+        """
+        Waits up to timeout for the child to be ready. Returns True when
+        it is, None while it is still starting, False if it failed (see error).
+        """
+        if self.ring is not None:
+            return True
+        for message in self.receive(timeout):
+            if message[0] == "ready":
+                _, name, shape, slots = message
+                try:
+                    self.ring = FrameRing(shape, slots, name)
+                except FileNotFoundError:  # The child already quit and freed it
+                    self.error = self.error or "The tracking process stopped"
+                    return False
+                f.dbg(f"Tracking process ready: {shape[1]}x{shape[0]} frames, {slots} slots")
+                return True
+            if message[0] == "error":
+                return False
+        return False if self.error else None
+
+    def receive(self, timeout: float = 0.1) -> list[tuple[Any, ...]]:
+        """
+        Every message waiting in the pipe (waits up to timeout for the
+        first one). Errors are also kept in error.
+        """
+        messages: list[tuple[Any, ...]] = []
+        try:
+            if self._conn.poll(timeout):
+                while True:
+                    messages.append(self._conn.recv())
+                    if not self._conn.poll():
+                        break
+        except (OSError, EOFError):
+            if not self.error:
+                self.error = "The tracking process stopped"
+        for message in messages:
+            if message[0] == "error":
+                self.error = message[1]
+        return messages
+
+    def frame(self, slot: int) -> Union[np.ndarray, None]:
+        """
+        The RGB frame in a slot, without copying. Valid until release(slot).
+        """
+        if self.ring is None or slot < 0:
+            return None
+        return self.ring.slots[slot]
+
+    def release(self, slot: int) -> None:
+        if slot >= 0:
+            self._send("release", slot)
+
+    def stream(self) -> None:
+        self._send("stream")
+
+    def set_precise(self, precise: bool) -> None:
+        self._send("precise", precise)
+
+    def configure(self, options: dict[str, Any]) -> None:
+        self.options.update(options)
+        self._send("configure", options)
+
+    def stop(self, timeout: float = 3.0) -> None:
+        """
+        Stops the child and detaches from the ring.
+        """
+        if self._process is None:
+            return
+        self._send("stop")
+        deadline = time.monotonic() + timeout
+        while self._process.is_alive() and time.monotonic() < deadline:
+            self.receive(0.05)  # Keep the pipe empty so the child is not stuck sending
+        if self._process.is_alive():
+            f.dbg(f"Tracking process {self._process.pid} did not stop, terminating it")
+            self._process.terminate()
+            self._process.join(1.0)
+        self._conn.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self._process = None
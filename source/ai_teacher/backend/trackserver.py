@@ -0,0 +1,574 @@
+#
+# Face tracking service
+# Copyright (C) 2025 Remeny
+#
+# Lets one machine do the face tracking for a room of thin clients.
+# Clients POST encoded frames (JPEG/PNG) over HTTP and get the FaceMesh
+# landmarks back; FaceMesh runs on a pool of worker processes, one per
+# core by default.
+#
+#   POST /track   body: encoded frame, header X-Client-Id: <name>
+#                 200: (N, 3) float32 little endian landmarks, with the
+#                      shape in X-Landmarks (N = 0 when there is no face),
+#                      or JSON when the request has Accept: application/json
+#                 429: that client already has max_pending frames waiting
+#   GET /stats    counters and latency percentiles as JSON
+#
+# Every client has its own small queue and the queues are served round
+# robin, so a client sending as fast as it can does not slow the others
+# down, it just gets 429s. Only a few frames per worker are handed to
+# the pool at a time; the rest wait in the client queues.
+#
+# Frames of different clients go to whatever worker is free, so the
+# workers track every frame on its own (no ROI tracking, no skipped
+# frames, see FaceTracker).
+#
+# Started with `python main.py --serve` ([Server] in configuration.ini),
+# or stand-alone, which also has a load test:
+#
+#   python -m ai_teacher.backend.trackserver serve --workers 4
+#   python -m ai_teacher.backend.trackserver loadtest video.mp4 --clients 30 --fps 15
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Union
+from urllib.parse import parse_qs, urlsplit
+
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+# ---[ Variables ]--- #
+DEFAULT_HOST: str = "127.0.0.1"
+DEFAULT_PORT: int = 8765
+
+# Set in each worker process by _init_worker()
+worker_tracker: Any = None
+worker_decode_only: bool = False
+
+# ---[ Worker processes ]--- #
+def _init_worker(decode_only: bool) -> None:
+    global worker_tracker, worker_decode_only
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is for the server, which stops the pool
+    worker_decode_only = decode_only
+    import cv2  # Loaded now, not on the first frame
+    if not decode_only:
+        from ai_teacher.backend.facetrack import FaceTracker
+        worker_tracker = FaceTracker()
+        worker_tracker.warm_up()
+
+def _ping() -> int:
+    return os.getpid()
+
+def _track_frame(data: bytes) -> tuple[int, bytes, float]:
+    """
+    Decodes and tracks one frame in a worker process.
+    Returns (landmark count, float32 landmarks, inference seconds).
+    """
+    import cv2
+    import numpy as np
+
+    start = time.perf_counter()
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("The frame could not be decoded")
+    if worker_decode_only:
+        return 0, b"", time.perf_counter() - start
+    landmarks = worker_tracker.process(frame).landmarks
+    if landmarks is None:
+        return 0, b"", time.perf_counter() - start
+    return len(landmarks), landmarks.astype("<f4").tobytes(), time.perf_counter() - start
+
+# ---[ Scheduling ]--- #
+class ClientStats:
+    __slots__ = ("accepted", "rejected", "completed", "failed", "last_seen")
+    COUNTERS: tuple[str, ...] = ("accepted", "rejected", "completed", "failed")
+
+    def __init__(self) -> None:
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_seen = time.monotonic()
+
+class Job:
+    __slots__ = ("client", "stats", "data", "received", "future")
+
+    def __init__(self, client: str, stats: ClientStats, data: bytes) -> None:
+        self.client = client
+        self.stats = stats  # Kept here, the client may be forgotten while the job runs
+        self.data = data
+        self.received = time.perf_counter()
+        self.future: Future = Future()
+
+class FairScheduler:
+    """
+    Per-client queues served round robin onto a worker pool.
+
+    Args:
+        submit (Callable): Starts a job, submit(data) -> Future.
+        max_in_flight (int): Jobs handed to the pool at the same time.
+        max_pending (int): Frames a client may have waiting; more are rejected.
+        window (int): Latencies kept for the percentiles.
+        idle_after (float): Seconds without frames after which a client's stats are forgotten.
+    """
+    def __init__(self, submit: Callable[[bytes], Future], max_in_flight: int,
+                 max_pending: int = 2, window: int = 10000, idle_after: float = 300.0) -> None:
+        self.submit = submit
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_pending = max(1, max_pending)
+        self.idle_after = idle_after
+        self.clients: dict[str, ClientStats] = {}
+        self._pruned: float = time.monotonic()
+        self.latencies: deque[float] = deque(maxlen=window)
+
+        self._pending: dict[str, deque[Job]] = {}
+        self._ready: deque[str] = deque()  # Clients with waiting jobs, in serving order
+        self._in_flight: int = 0
+        self._closed: bool = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="track-scheduler", daemon=True)
+        self._thread.start()
+
+    def put(self, client: str, data: bytes) -> Union[Future, None]:
+        """
+        Queues a frame. Returns a Future of the _track_frame() result,
+        or None when the client's queue is full (or the scheduler closed).
+        """
+        with self._condition:
+            stats = self.clients.get(client)
+            if stats is None:
+                self._prune()
+                stats = self.clients[client] = ClientStats()
+            stats.last_seen = time.monotonic()
+            queue = self._pending.get(client)
+            if self._closed or (queue is not None and len(queue) >= self.max_pending):
+                stats.rejected += 1
+                return None
+            if queue is None:
+                queue = self._pending[client] = deque()
+                self._ready.append(client)
+            job = Job(client, stats, data)
+            queue.append(job)
+            stats.accepted += 1
+            self._condition.notify()
+        return job.future
+
+    def _prune(self) -> None:
+        """
+        Forgets clients that sent nothing for idle_after seconds (every
+        X-Client-Id ever seen would otherwise be kept). Called with the
+        condition held, at most every few seconds.
+        """
+        now = time.monotonic()
+        if now - self._pruned < min(10.0, self.idle_after):
+            return
+        self._pruned = now
+        idle = [name for name, stats in self.clients.items()
+                if now - stats.last_seen > self.idle_after and name not in self._pending]
+        for name in idle:
+            del self.clients[name]
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and (not self._ready or self._in_flight >= self.max_in_flight):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                client = self._ready.popleft()
+                queue = self._pending[client]
+                job = queue.popleft()
+                if queue:
+                    self._ready.append(client)  # Back of the line
+                else:
+                    del self._pending[client]
+                self._in_flight += 1
+            try:
+                self.submit(job.data).add_done_callback(lambda future, job=job: self._done(job, future)) # type: ignore
+            except Exception as e:  # Pool broken or shut down
+                self._done(job, None, e)
+
+    def _done(self, job: Job, future: Union[Future, None], error: Union[BaseException, None] = None) -> None:
+        if future is not None:
+            error = future.exception()
+        with self._condition:
+            self._in_flight -= 1
+            stats = job.stats
+            if error is None:
+                stats.completed += 1
+                self.latencies.append(time.perf_counter() - job.received)
+            else:
+                stats.failed += 1
+            self._condition.notify()
+        if error is None:
+            job.future.set_result(future.result()) # type: ignore
+        else:
+            job.future.set_exception(error)
+
+    def close(self) -> None:
+        """
+        Stops dispatching and fails the frames still waiting.
+        """
+        with self._condition:
+            self._closed = True
+            waiting = [job for queue in self._pending.values() for job in queue]
+            self._pending.clear()
+            self._ready.clear()
+            self._condition.notify_all()
+        for job in waiting:
+            job.future.set_exception(RuntimeError("The service is stopping"))
+        self._thread.join(2.0)
+
+    def stats(self) -> dict[str, Any]:
+        import numpy as np
+
+        with self._condition:
+            latencies = list(self.latencies)
+            clients = {client: {name: getattr(stats, name) for name in ClientStats.COUNTERS}
+                       for client, stats in self.clients.items()}
+            waiting = sum(len(queue) for queue in self._pending.values())
+            in_flight = self._in_flight
+        percentiles = np.percentile(latencies, (50, 95, 99)) * 1000.0 if latencies else (0.0, 0.0, 0.0)
+        return {
+            "in_flight": in_flight,
+            "waiting": waiting,
+            "latency_ms": {f"p{p}": round(float(v), 3) for p, v in zip((50, 95, 99), percentiles)},
+            "clients": clients
+        }
+
+# ---[ HTTP ]--- #
+class TrackRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, clients send many frames
+    server: "TrackServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # One line per frame would flood the terminal
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "application/octet-stream",
+               headers: Union[dict[str, str], None] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_json(self, status: int, value: Any, headers: Union[dict[str, str], None] = None) -> None:
+        self._reply(status, json.dumps(value).encode("utf-8"), "application/json", headers)
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path == "/stats":
+            self._reply_json(200, self.server.service.stats())
+        else:
+            self._reply_json(404, {"error": "Not found"})
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True  # The body cannot be skipped without its length
+            self._reply_json(400, {"error": "Invalid Content-Length"})
+            return
+        if url.path != "/track":
+            self.close_connection = True
+            self._reply_json(404, {"error": "Not found"})
+            return
+        if length <= 0 or length > self.server.service.max_frame:
+            self.close_connection = True  # The body was not read
+            self._reply_json(413 if length > 0 else 411, {"error": "Missing or too large frame"})
+            return
+        data = self.rfile.read(length)
+        client = (self.headers.get("X-Client-Id") or parse_qs(url.query).get("client", [""])[0]
+                  or self.client_address[0])
+
+        future = self.server.service.scheduler.put(client, data)
+        if future is None:
+            self._reply_json(429, {"error": "Too many frames waiting"}, {"Retry-After": "0"})
+            return
+        try:
+            count, landmarks, inference = future.result(self.server.service.timeout)
+        except TimeoutError:
+            self._reply_json(504, {"error": "Tracking timed out"})
+            return
+        except ValueError as e:
+            self._reply_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._reply_json(500, {"error": str(e)})
+            return
+
+        headers = {"X-Landmarks": f"{count},3", "X-Inference-Ms": f"{inference * 1000.0:.3f}"}
+        if "application/json" in (self.headers.get("Accept") or ""):
+            import numpy as np
+            array = np.frombuffer(landmarks, dtype="<f4").reshape(count, 3)
+            self._reply_json(200, {"landmarks": array.tolist()}, headers)
+        else:
+            self._reply(200, landmarks, headers=headers)
+
+class TrackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: "TrackService") -> None:
+        self.service = service
+        super().__init__(address, TrackRequestHandler)
+
+# ---[ Service ]--- #
+class TrackService:
+    """
+    Worker pool, scheduler and HTTP server together.
+
+    Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on (0 = any free port).
+        workers (int): Worker processes (0 = one per core).
+        max_pending (int): Frames a client may have waiting before it gets 429s.
+        max_frame_kb (int): Largest accepted frame.
+        timeout (float): Seconds a request waits for its result.
+        decode_only (bool): Only decode frames, to measure the service itself.
+    """
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = 0,
+                 max_pending: int = 2, max_frame_kb: int = 2048, timeout: float = 5.0,
+                 decode_only: bool = False) -> None:
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.max_frame = max_frame_kb * 1024
+        self.timeout = timeout
+        # spawn: the workers must not inherit the server's threads and sockets
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(decode_only,))
+        # Two jobs per worker: one running, one already sent
+        self.scheduler = FairScheduler(lambda data: self.pool.submit(_track_frame, data),
+                                       max_in_flight=self.workers * 2, max_pending=max_pending)
+        self.server = TrackServer((host, port), self)
+        self.started = time.time()
+        self._serving: bool = False
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address[:2] # type: ignore
+
+    def start_workers(self) -> None:
+        """
+        Starts every worker process and waits until they built FaceMesh.
+        """
+        pids = {future.result() for future in [self.pool.submit(_ping) for _ in range(self.workers)]}
+        f.dbg(f"Tracking workers ready: {len(pids)} process(es)")
+
+    def serve_forever(self) -> None:
+        self._serving = True
+        try:
+            self.server.serve_forever(poll_interval=0.5)
+        finally:
+            self._serving = False
+
+    def stop(self) -> None:
+        if self._serving:  # From another thread, shutdown() waits for serve_forever() to return
+            self.server.shutdown()
+        self.server.server_close()
+        self.scheduler.close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        stats = self.scheduler.stats()
+        stats.update(workers=self.workers, uptime=round(time.time() - self.started, 1))
+        return stats
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = 0,
+          max_pending: int = 2, max_frame_kb: int = 2048, timeout: float = 5.0,
+          decode_only: bool = False) -> int:
+    """
+    Runs the service until interrupted (Ctrl+C).
+    """
+    service = TrackService(host, port, workers, max_pending, max_frame_kb, timeout, decode_only)
+    try:
+        service.start_workers()
+        host, port = service.address
+        print(f"Face tracking service on http://{host}:{port}/track with {service.workers} worker(s)")
+        service.serve_forever()
+    except BrokenProcessPool:
+        print("The face tracking workers could not start (see the errors above)")
+        return 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+    return 0
+
+# ---[ Load test ]--- #
+def encode_frames(spec: str, count: int, quality: int = 80) -> list[bytes]:
+    """
+    Reads up to count frames of a facetrack source and JPEG encodes them.
+    """
+    import cv2
+    from ai_teacher.backend.facetrack import SyntheticSource, open_source
+
+    source = open_source(spec)
+    if isinstance(source, SyntheticSource):
+        source.count = count
+    frames: list[bytes] = []
+    try:
+        for frame in source:
+            ok, buffer = cv2.imencode(".jpg", frame, (cv2.IMWRITE_JPEG_QUALITY, quality))
+            if ok:
+                frames.append(buffer.tobytes())
+            if len(frames) >= count:
+                break
+    finally:
+        source.close()
+    if not frames:
+        raise ValueError(f"No frames could be read from {spec}")
+    return frames
+
+class LoadClient(threading.Thread):
+    """
+    One simulated client: sends its frames in a loop over one
+    keep-alive connection, at fps (0 = next frame as soon as the
+    previous answer arrived), until stop is set.
+    """
+    def __init__(self, name: str, host: str, port: int, frames: list[bytes], fps: float,
+                 stop: threading.Event) -> None:
+        super().__init__(name=name, daemon=True)
+        self.host, self.port = host, port
+        self.frames = frames
+        self.fps = fps
+        self.stop = stop
+        self.latencies: list[float] = []
+        self.rejected = 0
+        self.errors = 0
+        self.faces = 0
+
+    def run(self) -> None:
+        import http.client
+
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30.0)
+        headers = {"X-Client-Id": self.name, "Content-Type": "image/jpeg"}
+        interval = 1.0 / self.fps if self.fps > 0 else 0.0
+        next_time = time.perf_counter()
+        i = 0
+        while not self.stop.is_set():
+            if interval:
+                delay = next_time - time.perf_counter()
+                if delay > 0 and self.stop.wait(delay):
+                    break
+                # A late client does not send a burst to catch up
+                next_time = max(next_time + interval, time.perf_counter())
+            start = time.perf_counter()
+            try:
+                connection.request("POST", "/track", self.frames[i % len(self.frames)], headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                continue
+            if response.status == 200:
+                self.latencies.append(time.perf_counter() - start)
+                self.faces += response.getheader("X-Landmarks", "0,3") != "0,3"
+            elif response.status == 429:
+                self.rejected += 1
+            else:
+                self.errors += 1
+            i += 1
+        connection.close()
+
+def loadtest(host: str, port: int, sources: list[str], clients: int = 10, duration: float = 10.0,
+             fps: float = 15.0, frames: int = 100, quality: int = 80) -> dict[str, Any]:
+    """
+    Runs clients simulated clients (spread over the sources) against a
+    running service for duration seconds. Returns the summary.
+    """
+    import numpy as np
+
+    encoded = [encode_frames(spec, frames, quality) for spec in sources]
+    stop = threading.Event()
+    threads = [LoadClient(f"client-{i}", host, port, encoded[i % len(encoded)], fps, stop)
+               for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        stop.wait(duration)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(35.0)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.asarray([value for thread in threads for value in thread.latencies]) * 1000.0
+    completed = [len(thread.latencies) for thread in threads]
+    percentiles = np.percentile(latencies, (50, 95, 99)) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        "clients": clients,
+        "sources": sources,
+        "target_fps": fps,
+        "elapsed": round(elapsed, 2),
+        "completed": int(sum(completed)),
+        "rejected": sum(thread.rejected for thread in threads),
+        "errors": sum(thread.errors for thread in threads),
+        "faces": sum(thread.faces for thread in threads),
+        "fps": round(sum(completed) / elapsed, 2) if elapsed > 0 else 0.0,
+        "client_fps": {"min": round(min(completed) / elapsed, 2), "max": round(max(completed) / elapsed, 2)},
+        "latency_ms": {f"p{p}": round(float(v), 3) for p, v in zip((50, 95, 99), percentiles)}
+    }
+
+def format_loadtest(summary: dict[str, Any]) -> str:
+    """
+    Human-readable version of the loadtest() summary.
+    """
+    latency = summary["latency_ms"]
+    return "\n".join([
+        f"Clients:   {summary['clients']} at {summary['target_fps'] or 'max'} fps, {summary['elapsed']} s",
+        f"Frames:    {summary['completed']} tracked ({summary['faces']} with a face), "
+        f"{summary['rejected']} rejected (429), {summary['errors']} errors",
+        f"Aggregate: {summary['fps']} fps "
+        f"(per client {summary['client_fps']['min']} - {summary['client_fps']['max']} fps)",
+        f"Latency:   p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms",
+    ])
+
+# ---[ Command line ]--- #
+def main(argv: Union[list[str], None] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face tracking service for thin clients, and its load test.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the service")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=0, help="worker processes (0 = one per core)")
+    serve_parser.add_argument("--max-pending", type=int, default=2, help="frames a client may have waiting")
+    serve_parser.add_argument("--decode-only", action="store_true", help="skip FaceMesh, measure the service itself")
+
+    test_parser = commands.add_parser("loadtest", help="simulate clients against a running service")
+    test_parser.add_argument("sources", nargs="+", help="video files, image directories or synthetic[:WxH]")
+    test_parser.add_argument("--host", default=DEFAULT_HOST)
+    test_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    test_parser.add_argument("--clients", type=int, default=10)
+    test_parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    test_parser.add_argument("--fps", type=float, default=15.0, help="frames per second per client (0 = as fast as possible)")
+    test_parser.add_argument("--frames", type=int, default=100, help="frames read from each source")
+    test_parser.add_argument("--quality", type=int, default=80, help="JPEG quality")
+    test_parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        return serve(args.host, args.port, args.workers, args.max_pending, decode_only=args.decode_only)
+
+    summary = loadtest(args.host, args.port, args.sources, args.clients, args.duration,
+                       args.fps, args.frames, args.quality)
+    print(json.dumps(summary, indent=2) if args.json else format_loadtest(summary))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
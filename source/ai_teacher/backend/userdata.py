@@ -0,0 +1,322 @@
+#
+# Per-user data store
+# Copyright (C) 2025 Remeny
+#
+# data/<user>/userdata.db is a SQLite database (WAL mode) holding what
+# grows over time: calibration samples, sessions and head events, plus
+# the ini sections listed in STORE_SECTIONS as key/value rows.
+#
+# Those sections keep working through shared.user_config and
+# update_user_config(): their values are loaded into shared.user_config
+# at login, and updates are written here instead of to settings.ini
+# (batched by config_transaction() like ini writes). Existing
+# settings.ini files are migrated on the first login.
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+from ai_teacher.resources import shared
+
+from configparser import ConfigParser
+from typing import Any, Iterable, Union
+
+import os
+import sqlite3
+import threading
+import time
+
+# ---[ Variables ]--- #
+DATABASE_FILENAME: str = "userdata.db"
+SCHEMA_VERSION: int = 1
+
+# Ini sections that live in the store instead of settings.ini
+STORE_SECTIONS: tuple[str, ...] = ("Facemarks",)
+
+# Order of the points of a calibration sample, same as gaze.POINT_KEYS
+SAMPLE_POINTS: tuple[str, ...] = ("nose", "left", "right")
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS kv (
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (section, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS calibration_samples (
+    id INTEGER PRIMARY KEY,
+    position TEXT NOT NULL,
+    captured REAL NOT NULL,
+    point_count INTEGER NOT NULL,
+    points BLOB NOT NULL  -- point_count x 3 float32, little endian
+);
+CREATE INDEX IF NOT EXISTS calibration_position ON calibration_samples (position, captured);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    session_type TEXT NOT NULL,
+    build INTEGER NOT NULL DEFAULT 0,
+    started REAL NOT NULL,
+    ended REAL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER REFERENCES sessions (id),
+    type TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    value REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session_id, timestamp);
+"""
+
+# Statements are constants with parameters, so sqlite3 compiles each one once and reuses it
+SQL_SET_VALUE = "INSERT INTO kv (section, key, value) VALUES (?, ?, ?) ON CONFLICT (section, key) DO UPDATE SET value = excluded.value"
+SQL_GET_VALUE = "SELECT value FROM kv WHERE section = ? AND key = ?"
+SQL_GET_SECTION = "SELECT key, value FROM kv WHERE section = ? ORDER BY key"
+SQL_ADD_SAMPLE = "INSERT INTO calibration_samples (position, captured, point_count, points) VALUES (?, ?, ?, ?)"
+SQL_ADD_SAMPLE_ONCE = """
+INSERT INTO calibration_samples (position, captured, point_count, points)
+SELECT ?1, ?2, ?3, ?4 WHERE NOT EXISTS (SELECT 1 FROM calibration_samples WHERE position = ?1 AND captured = ?2)
+"""
+SQL_LATEST_SAMPLES = """
+SELECT position, points FROM calibration_samples AS sample
+WHERE id = (SELECT id FROM calibration_samples WHERE position = sample.position ORDER BY captured DESC, id DESC LIMIT 1)
+ORDER BY id
+"""
+SQL_START_SESSION = "INSERT INTO sessions (session_type, build, started) VALUES (?, ?, ?)"
+SQL_END_SESSION = "UPDATE sessions SET ended = ? WHERE id = ?"
+SQL_ADD_EVENT = "INSERT INTO events (session_id, type, timestamp, value) VALUES (?, ?, ?, ?)"
+
+# ---[ Classes ]--- #
+class UserStore:
+    """
+    One user's SQLite database. Safe to use from several threads.
+
+    Args:
+        path (str): Database file (created if missing).
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=10.0, check_same_thread=False, cached_statements=64)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute("PRAGMA foreign_keys = ON")
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self._recorder: Union[threading.Thread, None] = None
+        self._subscription: Any = None
+
+    def close(self) -> None:
+        self.stop_recording()
+        with self._lock:
+            self._db.close()
+
+    # ---[ Key/value (ini sections) ]--- #
+    def get_value(self, section: str, key: str, fallback: Union[str, None] = None) -> Union[str, None]:
+        with self._lock:
+            row = self._db.execute(SQL_GET_VALUE, (section, key)).fetchone()
+        return fallback if row is None else row[0]
+
+    def get_section(self, section: str) -> dict[str, str]:
+        with self._lock:
+            return dict(self._db.execute(SQL_GET_SECTION, (section,)).fetchall())
+
+    def write_config(self, updates: dict[str, dict[str, str]]) -> None:
+        """
+        Writes {section: {key: value}} in one transaction
+        (the writer flush_config() uses for this store).
+        """
+        rows = [(section, key, str(value)) for section, values in updates.items() for key, value in values.items()]
+        with self._lock, self._db:
+            self._db.executemany(SQL_SET_VALUE, rows)
+
+    def import_config(self, updates: dict[str, dict[str, str]], samples: Iterable[tuple[str, Any]],
+                      captured: float) -> int:
+        """
+        Writes sections and their calibration samples in one transaction
+        (settings.ini migration). Samples already stored for the same
+        position and time are skipped, so an interrupted migration can
+        simply run again. Returns the number of samples written.
+        """
+        rows = [(section, key, str(value)) for section, values in updates.items() for key, value in values.items()]
+        sample_rows = self._sample_rows(samples, captured)
+        with self._lock, self._db:
+            self._db.executemany(SQL_SET_VALUE, rows)
+            before = self._db.total_changes
+            self._db.executemany(SQL_ADD_SAMPLE_ONCE, sample_rows)
+            return self._db.total_changes - before
+
+    # ---[ Calibration ]--- #
+    def add_calibration_samples(self, samples: Iterable[tuple[str, Any]], captured: Union[float, None] = None) -> int:
+        """
+        Bulk inserts (position, (n, 3) points) calibration samples.
+        Returns the number of samples written.
+        """
+        rows = self._sample_rows(samples, time.time() if captured is None else captured)
+        with self._lock, self._db:
+            self._db.executemany(SQL_ADD_SAMPLE, rows)
+        return len(rows)
+
+    @staticmethod
+    def _sample_rows(samples: Iterable[tuple[str, Any]], captured: float) -> list[tuple[str, float, int, bytes]]:
+        import numpy as np  # Only needed once calibration data is touched
+
+        rows = []
+        for position, points in samples:
+            array = np.ascontiguousarray(points, dtype="<f4").reshape(-1, 3)
+            rows.append((position, captured, len(array), array.tobytes()))
+        return rows
+
+    def add_calibration_sample(self, position: str, points: Any, captured: Union[float, None] = None) -> None:
+        self.add_calibration_samples(((position, points),), captured)
+
+    def latest_calibration(self) -> tuple[Any, list[str]]:
+        """
+        Newest sample of every head position: ((n, 3, 3) float32 points, positions).
+        """
+        import numpy as np
+
+        with self._lock:
+            rows = self._db.execute(SQL_LATEST_SAMPLES).fetchall()
+        rows = [(position, blob) for position, blob in rows if len(blob) == 3 * 3 * 4]
+        points = np.frombuffer(b"".join(blob for _, blob in rows), dtype="<f4").reshape(-1, 3, 3)
+        return points.astype(np.float32), [position for position, _ in rows]
+
+    # ---[ Sessions and events ]--- #
+    def start_session(self, session_type: str, build: int = 0) -> int:
+        with self._lock, self._db:
+            return int(self._db.execute(SQL_START_SESSION, (session_type, build, time.time())).lastrowid) # type: ignore
+
+    def end_session(self, session_id: int) -> None:
+        with self._lock, self._db:
+            self._db.execute(SQL_END_SESSION, (time.time(), session_id))
+
+    def add_events(self, session_id: Union[int, None], events: Iterable[Any]) -> int:
+        """
+        Bulk inserts head events (anything with type, timestamp and value).
+        """
+        rows = [(session_id, str(getattr(event.type, "value", event.type)), event.timestamp, event.value)
+                for event in events]
+        if rows:
+            with self._lock, self._db:
+                self._db.executemany(SQL_ADD_EVENT, rows)
+        return len(rows)
+
+    def record_events(self, session_id: int, interval: float = 1.0) -> None:
+        """
+        Stores head events from events.bus on a background thread,
+        one bulk insert per interval, until stop_recording().
+        """
+        from ai_teacher.backend import events
+
+        if self._recorder is not None:
+            return
+        subscription = self._subscription = events.bus.subscribe(maxsize=4096)
+
+        def record() -> None:
+            while True:
+                event = subscription.get(timeout=interval)
+                closed = subscription.queue.closed and event is None
+                # After closing, whatever is still queued is the last batch
+                batch = ([event] if event is not None else []) + subscription.drain()
+                try:
+                    self.add_events(session_id, batch)
+                except sqlite3.Error as e:
+                    f.dbg(f"Could not store {len(batch)} head event(s): {e}")
+                if closed:
+                    break
+
+        self._recorder = threading.Thread(target=record, name="event-recorder", daemon=True)
+        self._recorder.start()
+
+    def stop_recording(self) -> None:
+        if self._recorder is None:
+            return
+        self._subscription.close()
+        self._recorder.join(5.0)
+        self._recorder = None
+        self._subscription = None
+
+# ---[ Migration ]--- #
+def migrate_config(store: UserStore, config: ConfigParser, ini_file: str) -> bool:
+    """
+    Moves STORE_SECTIONS from a settings.ini into the store (values as
+    key/value rows, Facemarks also as calibration samples) and removes
+    them from the file. The sections stay in the in-memory config.
+    Returns whether anything was migrated.
+    """
+    sections = [section for section in STORE_SECTIONS if config.has_section(section)]
+    if not sections:
+        return False
+
+    samples: list[tuple[str, list[list[float]]]] = []
+    if "Facemarks" in sections:
+        # Keys are <position>_<point>_<axis>
+        positions: dict[str, dict[str, dict[str, float]]] = {}
+        for key, value in config["Facemarks"].items():
+            parts = key.rsplit("_", 2)
+            if len(parts) != 3 or parts[1] not in SAMPLE_POINTS or parts[2] not in ("x", "y", "z"):
+                continue
+            try:
+                positions.setdefault(parts[0], {}).setdefault(parts[1], {})[parts[2]] = float(value)
+            except ValueError:
+                continue
+        samples = [
+            (position, [[points[name][axis] for axis in "xyz"] for name in SAMPLE_POINTS])
+            for position, points in positions.items()
+            if all(len(points.get(name, {})) == 3 for name in SAMPLE_POINTS)
+        ]
+
+    # The file's time, so a migration interrupted before the file is rewritten
+    # finds its samples already stored when it runs again
+    try:
+        captured = os.path.getmtime(ini_file)
+    except OSError:
+        captured = time.time()
+    added = store.import_config({section: dict(config[section]) for section in sections}, samples, captured)
+    if samples:
+        f.dbg(f"Migrated {added} calibration sample(s) to {store.path} ({len(samples) - added} already there)")
+
+    f.write_ini(ini_file, {}, remove_sections=sections)
+    f.dbg(f"Moved sections {sections} from {ini_file} to {store.path}")
+    return True
+
+# ---[ Functions ]--- #
+def open_store(user_dir: str) -> UserStore:
+    """
+    Opens (or creates) a user's store, migrates that user's settings.ini
+    if needed, loads STORE_SECTIONS into shared.user_config and routes
+    their updates to the store. Sets shared.user_store.
+    """
+    if shared.user_store is not None:
+        close_store()
+    store = UserStore(os.path.join(user_dir, DATABASE_FILENAME))
+    migrate_config(store, shared.user_config, shared.user_config_file)
+
+    for section in STORE_SECTIONS:
+        values = store.get_section(section)
+        if values:
+            if not shared.user_config.has_section(section):
+                shared.user_config.add_section(section)
+            shared.user_config[section].update(values)
+
+    f.config_writers[store.path] = store.write_config
+    shared.user_store = store
+    return store
+
+def close_store() -> None:
+    """
+    Writes pending updates, ends the session and closes shared.user_store.
+    """
+    store = shared.user_store
+    if store is None:
+        return
+    f.flush_config()
+    if shared.session_id is not None:
+        store.stop_recording()
+        store.end_session(shared.session_id)
+        shared.session_id = None
+    store.close()
+    f.config_writers.pop(store.path, None)
+    shared.user_store = None
@@ -0,0 +1,215 @@
+#
+# User registry
+# Copyright (C) 2025 Remeny
+#
+# Keeps data/.index/users.json, an index of every user directory with its
+# display name (pretty_name from settings.ini) and some metadata, so the
+# login window does not have to open every user's settings file.
+#
+# On load the index is checked against the file system: the data
+# directory is only listed again when its modification time changed
+# (users added or removed), and a settings.ini is only parsed again when
+# its own modification time changed. Everything else is a stat() call.
+# The index lives in its own subdirectory so that saving it does not
+# change the data directory's modification time.
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+from ai_teacher.resources import shared
+from ai_teacher.resources.search import PrefixIndex
+
+from configparser import ConfigParser, Error as ConfigError
+from typing import Any, Union
+
+import json
+import os
+import threading
+import time
+
+# ---[ Variables ]--- #
+INDEX_DIRECTORY: str = ".index"
+INDEX_FILENAME: str = "users.json"
+INDEX_VERSION: int = 1
+
+# ---[ Functions ]--- #
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def read_pretty_name(settings_file: str, directory: str) -> str:
+    """
+    Reads [Account] pretty_name from a user's settings.ini with its own parser.
+    """
+    fallback = f"NOOBUSER_<{directory}>"
+    config = ConfigParser()
+    try:
+        config.read(settings_file, encoding="utf-8")
+    except ConfigError as e:
+        f.dbg(f"Could not read {settings_file}: {e}")
+        return fallback
+    return config.get("Account", "pretty_name", fallback=fallback)
+
+# ---[ Classes ]--- #
+class UserRegistry:
+    """
+    Display name <-> user directory index, persisted as JSON.
+
+    Args:
+        data_directory (str): Directory that holds one directory per user.
+    """
+    def __init__(self, data_directory: str) -> None:
+        self.data_directory = data_directory
+        self.index_file = os.path.join(data_directory, INDEX_DIRECTORY, INDEX_FILENAME)
+        # {directory: {"name", "settings_mtime", "created", "last_login"}}
+        self.users: dict[str, dict[str, Any]] = {}
+        self._by_name: dict[str, str] = {}
+        self._folded_directories: set[str] = set()
+        self._names = PrefixIndex()
+        self._data_mtime: int = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    # ---[ Loading and saving ]--- #
+    def load(self) -> "UserRegistry":
+        """
+        Loads the index and brings it up to date with the data directory.
+        """
+        with self._lock:
+            changed = False
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as file:
+                    index = json.load(file)
+                if index.get("version") != INDEX_VERSION:
+                    raise ValueError(f"Unknown version {index.get('version')}")
+                self.users = index["users"]
+                self._data_mtime = index["data_mtime"]
+            except FileNotFoundError:
+                self.users, self._data_mtime, changed = {}, 0, True
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                f.dbg(f"User index {self.index_file} is unusable, rebuilding it: {e}")
+                self.users, self._data_mtime, changed = {}, 0, True
+
+            data_mtime = _mtime(self.data_directory)
+            if data_mtime != self._data_mtime:
+                self._rescan()
+                self._data_mtime = data_mtime
+                changed = True
+            changed |= self._validate()
+            self._rebuild()
+            if changed:
+                self.save()
+        f.dbg(f"User registry: {len(self.users)} users")
+        return self
+
+    def _rescan(self) -> None:
+        """
+        Adds new user directories and forgets removed ones.
+        """
+        directories = {d for d in f.list_dirs(self.data_directory) if not d.startswith(".")}
+        removed = [directory for directory in self.users if directory not in directories]
+        for directory in removed:
+            del self.users[directory]
+        added = directories.difference(self.users)
+        for directory in added:
+            self.users[directory] = {"name": "", "settings_mtime": -1, "created": time.time(), "last_login": 0.0}
+        f.dbg(f"User directories rescanned: {len(added)} new, {len(removed)} removed")
+
+    def _validate(self) -> bool:
+        """
+        Reads the display name again for users whose settings.ini changed.
+        """
+        changed = False
+        for directory, entry in self.users.items():
+            settings_file = os.path.join(self.data_directory, directory, "settings.ini")
+            mtime = _mtime(settings_file)
+            if mtime != entry.get("settings_mtime"):
+                entry["name"] = read_pretty_name(settings_file, directory) if mtime else f"NOOBUSER_<{directory}>"
+                entry["settings_mtime"] = mtime
+                changed = True
+        return changed
+
+    def _rebuild(self) -> None:
+        self._by_name = {}
+        for directory in sorted(self.users):
+            name = self.users[directory]["name"]
+            if name in self._by_name:
+                name = f"{name} <{directory}>"  # Two users with the same name
+            self._by_name[name] = directory
+        self._names = PrefixIndex((name, directory) for name, directory in self._by_name.items())
+        self._folded_directories = {directory.lower() for directory in self.users}
+
+    def save(self) -> None:
+        """
+        Writes the index atomically (temporary file + rename).
+        """
+        with self._lock:
+            temp_file = f"{self.index_file}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+                with open(temp_file, "w", encoding="utf-8") as file:
+                    json.dump({"version": INDEX_VERSION, "data_mtime": self._data_mtime, "users": self.users}, file)
+                os.replace(temp_file, self.index_file)
+            except OSError as e:
+                f.dbg(f"Could not save user index {self.index_file}: {e}")
+
+    # ---[ Lookup ]--- #
+    def names(self) -> list[str]:
+        """
+        All display names, sorted (ignoring case).
+        """
+        return self._names.keys()
+
+    def lookup(self, name: str) -> Union[str, None]:
+        """
+        Directory of a display name, or None.
+        """
+        return self._by_name.get(name)
+
+    def search(self, prefix: str, limit: int = 0) -> list[str]:
+        """
+        Display names starting with prefix (ignoring case).
+        """
+        return self._names.keys(prefix, limit)
+
+    def has_directory(self, directory: str) -> bool:
+        """
+        Whether a user directory exists (ignoring case).
+        """
+        return directory.lower() in self._folded_directories
+
+    def info(self, name: str) -> Union[dict[str, Any], None]:
+        directory = self._by_name.get(name)
+        return None if directory is None else dict(self.users[directory], directory=directory)
+
+    # ---[ Updating ]--- #
+    def add(self, name: str, directory: str) -> None:
+        """
+        Adds or updates a user and records the login time.
+        """
+        with self._lock:
+            entry = self.users.setdefault(directory, {"created": time.time()})
+            entry["name"] = name
+            entry["settings_mtime"] = _mtime(os.path.join(self.data_directory, directory, "settings.ini"))
+            entry["last_login"] = time.time()
+            self._rebuild()
+            self.save()
+
+# Registry of the data directory, see get_registry()
+registry: Union[UserRegistry, None] = None
+
+def get_registry() -> UserRegistry:
+    """
+    Returns the (loaded) user registry of <app_dir>/data.
+    """
+    global registry
+    if registry is None:
+        registry = UserRegistry(os.path.join(shared.app_dir, "data")).load()
+    return registry
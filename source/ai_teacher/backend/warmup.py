@@ -0,0 +1,159 @@
+#
+# Background warm-up of the camera trainer
+# Copyright (C) 2025 Remeny
+#
+# Loading OpenCV and MediaPipe, listing cameras, opening one and
+# building the FaceMesh graph takes seconds. start() does all of that on
+# a background thread while the user is busy with the login and notice
+# windows, and the camera trainer takes the ready objects with take()
+# and take_capture() instead of creating its own. With out_of_process,
+# the tracking process is started instead (take_process()).
+#
+# Switched off with warmup = false in the [Camera] section.
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+from ai_teacher.resources import shared
+from ai_teacher.resources import startup
+
+from typing import Any, Union
+
+import threading
+import time
+
+# ---[ Variables ]--- #
+thread: Union[threading.Thread, None] = None
+done: threading.Event = threading.Event()
+# "cameras": list_cameras() result, "tracker": FaceTracker, "capture": (index, cv2.VideoCapture),
+# "process": (index, TrackerProcess) when tracking runs out of process
+results: dict[str, Any] = {}
+results_lock: threading.Lock = threading.Lock()
+
+# ---[ Functions ]--- #
+def start() -> None:
+    """
+    Starts warming up in the background (once).
+    """
+    global thread
+    if thread is not None:
+        return
+    if not shared.settings.camera.warmup:
+        done.set()
+        return
+    thread = threading.Thread(target=_run, name="warm-up", daemon=True)
+    thread.start()
+
+def _step(name: str, start_time: float) -> float:
+    now = time.perf_counter()
+    f.dbg(f"Warm-up: {name} took {(now - start_time) * 1000:.0f} ms")
+    return now
+
+def _run() -> None:
+    try:
+        step_time = time.perf_counter()
+        import cv2
+        from ai_teacher.backend import camera as camera_backend
+        from ai_teacher.backend.facetrack import FaceTracker
+        step_time = _step("importing OpenCV", step_time)
+
+        cameras = camera_backend.list_cameras()
+        with results_lock:
+            results["cameras"] = cameras
+        step_time = _step("listing cameras", step_time)
+
+        # Open the camera that was used last time, or the first one
+        indices = [index for index, _ in cameras]
+        index = shared.settings.camera.last_camera
+        if index not in indices and indices:
+            index = indices[0]
+        if shared.settings.camera.out_of_process:
+            # The child process opens the camera and builds FaceMesh itself
+            from ai_teacher.backend.trackprocess import TrackerProcess, options_from_settings
+            if index in indices:
+                process = TrackerProcess(index, options_from_settings(shared.settings.camera)).start()
+                with results_lock:
+                    results["process"] = (index, process)
+                step_time = _step(f"starting the tracking process for camera {index}", step_time)
+        elif index in indices:
+            capture = cv2.VideoCapture(index)
+            if capture.isOpened():
+                with results_lock:
+                    results["capture"] = (index, capture)
+            else:
+                capture.release()
+            step_time = _step(f"opening camera {index}", step_time)
+
+        if not shared.settings.camera.out_of_process:
+            tracker = FaceTracker.from_config(shared.config)
+            tracker.warm_up()
+            with results_lock:
+                results["tracker"] = tracker
+            step_time = _step("building FaceMesh", step_time)
+
+        # The rest of the camera window (preview, gaze, events...)
+        import ai_teacher.gui.camera
+        _step("importing the camera window", step_time)
+    except Exception as e:
+        f.dbg(f"Warm-up failed: {e}")
+    finally:
+        f.dbg(f"Warm-up finished {startup.mark('warm-up') * 1000:.0f} ms after launch")
+        done.set()
+
+def wait(timeout: Union[float, None] = None) -> bool:
+    """
+    Waits for the warm-up to finish. Returns False on timeout.
+    """
+    return done.wait(timeout)
+
+def take(name: str, timeout: Union[float, None] = None) -> Any:
+    """
+    Hands over a warmed up object ("cameras" or "tracker"), or None if
+    there is none. Each object is handed over only once.
+    """
+    if thread is None or not wait(timeout):
+        return None
+    with results_lock:
+        return results.pop(name, None)
+
+def take_capture(index: int, timeout: Union[float, None] = None) -> Any:
+    """
+    Hands over the opened cv2.VideoCapture if it is the given camera,
+    otherwise releases it and returns None.
+    """
+    warmed = take("capture", timeout)
+    if warmed is None:
+        return None
+    warmed_index, capture = warmed
+    if warmed_index == index:
+        return capture
+    capture.release()
+    return None
+
+def take_process(index: int, timeout: Union[float, None] = None) -> Any:
+    """
+    Hands over the started TrackerProcess if it tracks the given camera,
+    otherwise stops it and returns None.
+    """
+    warmed = take("process", timeout)
+    if warmed is None:
+        return None
+    warmed_index, process = warmed
+    if warmed_index == index:
+        return process
+    process.stop()
+    return None
+
+def release() -> None:
+    """
+    Releases whatever was warmed up but never taken.
+    """
+    with results_lock:
+        warmed = dict(results)
+        results.clear()
+    if "capture" in warmed:
+        warmed["capture"][1].release()
+    if "tracker" in warmed:
+        warmed["tracker"].close()
+    if "process" in warmed:
+        warmed["process"][1].stop()
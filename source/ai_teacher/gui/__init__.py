@@ -1,2 +1,16 @@
-from . import camera
-from . import gui
\ No newline at end of file
+#
+# GUI package. gui is loaded right away since every window needs it, the
+# other windows (and the camera window's OpenCV/MediaPipe dependencies)
+# only when they are first used, see __getattr__().
+#
+import importlib
+
+from . import gui
+
+# Submodules imported on first attribute access
+LAZY_MODULES: tuple[str, ...] = ("camera", "chat", "login", "notices", "preview")
+
+def __getattr__(name: str):
+    if name in LAZY_MODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,24 +6,51 @@
 # ---[ Libraries ]--- #
 from ai_teacher.resources import functions as f
 from ai_teacher.resources import shared
-from ai_teacher.resources.sounds import sounds
+from ai_teacher.resources import settings
+from ai_teacher.resources import sounds
+from ai_teacher.resources.pipeline import DropQueue, QueueClosed, start_stage
+from ai_teacher.resources.profiler import FrameProfiler
 from ai_teacher.backend import camera as camera_backend
+from ai_teacher.backend import warmup
+from ai_teacher.backend import gaze
+from ai_teacher.backend import events
+from ai_teacher.backend.facetrack import FaceTracker
+from ai_teacher.backend.trackprocess import TrackerProcess, options_from_settings
+from ai_teacher.backend.landmarks import LandmarkHistory
 from ai_teacher.gui import gui
 
-from PIL import Image, ImageTk # type: ignore
+from ai_teacher.gui.preview import PreviewRenderer
+
 from typing import Union
 
 import customtkinter as ctk # type: ignore
 import cv2
-import mediapipe as mp # type: ignore
+import os
 import threading
+import time
 
 # ---[ Variables ]--- #
 cap = None
 frame_loop_id = None
-face_mesh = None
+tracker: FaceTracker | None = None
+# Child process doing capture and FaceMesh instead of the threads ([Camera] out_of_process)
+tracker_process: TrackerProcess | None = None
 capture_countdown_id: str | None = None
 
+# Pipeline state (capture thread -> inference thread -> Tk thread)
+stop_event: threading.Event | None = None
+pipeline_threads: list[threading.Thread] = []
+pipeline_queues: list[DropQueue] = []
+# Preview renderer of the camera label (kept across camera switches)
+renderer: PreviewRenderer | None = None
+
+# Landmarks of every tracked frame, written by the inference thread
+landmark_history: LandmarkHistory | None = None
+# Per-stage timings ([Debug] enable_profiler), shared by all pipeline stages
+profiler: FrameProfiler = FrameProfiler()
+# Head movement events for the debug output (events themselves go to events.bus)
+event_subscription: events.Subscription | None = None
+
 # Store latest detected face points
 latest_face_points = {
     "nose": None,
@@ -43,6 +70,9 @@ def camera_trainer(win: gui.app) -> None:
         index = dict((name, idx) for idx, name in cameras).get(cam_name)
         if index is not None:
             open_face_track(image_label, index, debug_label=win.action_bar_frame.text)
+            # Warm-up opens this camera next time
+            if shared.settings.camera.last_camera != index:
+                f.update_config('Camera', 'last_camera', str(index))
             # Update instruction label
             nonlocal instruction_updated
             if not instruction_updated:
@@ -59,7 +89,7 @@ def camera_trainer(win: gui.app) -> None:
     win.buttons["Next"].configure(state="disabled")
     
     # Populate the camera combobox
-    cameras = camera_backend.list_cameras()
+    cameras = warmup.take("cameras") or camera_backend.list_cameras()
     if not cameras:
         f.quit(1, "No cameras are available. Check if you have permissions, or connect a camera if you don't have one.")
         
@@ -69,6 +99,28 @@ def camera_trainer(win: gui.app) -> None:
     combobox_cam_selector.combobox.configure(command = on_combobox_selected) # type: ignore
     combobox_cam_selector.grid(padx=50, pady=20, sticky="w") # type: ignore
     
+    # Keep the combobox in sync with hot-plugged cameras.
+    # The watcher runs on its own thread, so hand results over to Tk through a queue.
+    rescanned_cameras = DropQueue(1)
+    stop_camera_watch = camera_backend.watch_cameras(
+        rescanned_cameras.put,
+        shared.settings.camera.rescan_interval
+    )
+    
+    def poll_camera_list() -> None:
+        nonlocal cameras
+        new_cameras = rescanned_cameras.get_latest()
+        if new_cameras is not None and new_cameras != cameras:
+            cameras = new_cameras
+            combobox_cam_selector.combobox.configure(values=[name for (_, name) in cameras]) # type: ignore
+            f.dbg(f"Camera list updated: {cameras}")
+        combobox_cam_selector.after(500, poll_camera_list)
+    
+    poll_camera_list()
+    
+    # Apply [Camera] edits to the running pipeline
+    settings.subscribe("camera", on_camera_settings_changed)
+    
     # Instruction label (the one that displays on top of camera preview frame)
     instruction_label = ctk.CTkLabel(
         master=win.main,
@@ -94,6 +146,7 @@ def camera_trainer(win: gui.app) -> None:
         if capture_countdown_id is not None:
             capture_button.after_cancel(capture_countdown_id)
             capture_countdown_id = None
+            set_precise_tracking(False)
             capture_button.configure(text="Capture")
             image_label.configure(text="")
             f.dbg("Cancelled existing capture opteration.")
@@ -109,6 +162,9 @@ def camera_trainer(win: gui.app) -> None:
             gui.warn("Invalid number input.")
             return
 
+        # Full-frame, every-frame tracking while capturing calibration points
+        set_precise_tracking(True)
+
         # Start countdown
         def countdown(n: int):
             global capture_countdown_id
@@ -116,15 +172,16 @@ def camera_trainer(win: gui.app) -> None:
                 capture_button.configure(text="Capture")
                 image_label.configure(text="")
                 capture_countdown_id = None
+                set_precise_tracking(False)
                 
                 if None in latest_face_points.values():
                     gui.warn("Face points not found.")
                     return
 
                 next_instruction: str = camera_backend.capture_face_points(
-                    [left_x, left_y, left_z],
-                    [right_x, right_y, right_z],
-                    [nose_x, nose_y, nose_z]
+                    list(latest_face_points["left_iris"]),
+                    list(latest_face_points["right_iris"]),
+                    list(latest_face_points["nose"])
                 )
                 
                 # Update instruction label
@@ -134,11 +191,12 @@ def camera_trainer(win: gui.app) -> None:
                     capture_button.configure(state="disabled")
                     win.buttons['Next'].configure(state="normal")
                     f.dbg("Camera section seems to be finished.")
+                    gaze.get_predictor().retrain()
                 else:
                     instruction_label.configure(text=next_instruction)
             else:
                 f.dbg(f"Seconds remaining before capture: {n}")
-                sounds["tick1"].play()
+                sounds.play("tick1")
                 image_label.configure(text=str(n))
                 capture_button.configure(text=str(n))
                 capture_countdown_id = capture_button.after(1000, countdown, n - 1)
@@ -161,75 +219,294 @@ def camera_trainer(win: gui.app) -> None:
     instruction_label.configure(text="Please select a camera from above.\nAfter selecting, instructions will appear here. For capture button, scroll down.")
     
     win.main.mainloop()
+    stop_camera_watch.set()
+    settings.unsubscribe("camera", on_camera_settings_changed)
+    close_face_track(image_label)
+    warmup.release()
 
 def open_face_track(image_label: "ctk.CTkLabel",
                     camera_index: int,
                     debug_label: Union["ctk.CTkLabel", None] = None) -> None:
-    global cap, frame_loop_id, face_mesh
-    global nose_x, nose_y, nose_z, left_x, left_y, left_z, right_x, right_y, right_z
+    """
+    Starts the face tracking pipeline for the given camera.
 
-    if frame_loop_id:
-        try: image_label.after_cancel(frame_loop_id)
-        except: pass
-        frame_loop_id = None
+    The camera is read on a capture thread and FaceMesh runs on an
+    inference thread; both hand their newest item forward through
+    drop-oldest queues. With out_of_process, both run in a child process
+    instead and a receiver thread takes their results. The Tk thread
+    only picks up the latest finished frame and shows it.
+    """
+    global cap, frame_loop_id, tracker, tracker_process, stop_event, renderer, landmark_history, event_subscription, profiler
+
+    close_face_track(image_label)
 
-    if cap and cap.isOpened(): cap.release()
     f.dbg(f"Opening face tracking for camera: {camera_index}")
-    cap = cv2.VideoCapture(camera_index)
+    # Use the camera and FaceMesh (or tracking process) prepared during login when possible
+    if shared.settings.camera.out_of_process:
+        tracker_process = (warmup.take_process(camera_index)
+                           or TrackerProcess(camera_index, options_from_settings(shared.settings.camera)).start())
+    else:
+        cap = warmup.take_capture(camera_index) or cv2.VideoCapture(camera_index)
+        tracker = warmup.take("tracker") or FaceTracker.from_config(shared.config)
+    if renderer is None or renderer.label is not image_label:
+        renderer = PreviewRenderer(image_label, max_fps=shared.settings.camera.preview_fps)
+    preview = renderer
+    if landmark_history is None:
+        landmark_history = LandmarkHistory(shared.settings.camera.history_size)
+    landmark_history.clear()
+    detector = events.HeadEventDetector.from_config(shared.config)
+    profiler = FrameProfiler.from_config(
+        shared.config,
+        os.path.join(shared.app_dir, shared.settings.debug.log_directory)
+    )
+    if shared.debug:
+        event_subscription = events.bus.subscribe()
+    subscription = event_subscription
 
-    if face_mesh: face_mesh.close()
-    face_mesh = mp.solutions.face_mesh.FaceMesh(False, 1, refine_landmarks=True)
+    stop_event = threading.Event()
+    # Results carry a pooled preview buffer, give it back if a result is dropped
+    result_queue = DropQueue(1, on_drop=lambda item: preview.release(item[0]))
+    pipeline_queues.append(result_queue)
+    if tracker_process is not None:
+        pipeline_threads.append(start_stage("camera-receive", _receive_loop, tracker_process, preview, landmark_history, gaze.get_predictor(), detector, result_queue, stop_event))
+    else:
+        frame_queue = DropQueue(1)
+        pipeline_queues.append(frame_queue)
+        pipeline_threads.append(start_stage("camera-capture", _capture_loop, cap, frame_queue, stop_event))
+        pipeline_threads.append(start_stage("camera-inference", _inference_loop, tracker, preview, landmark_history, gaze.get_predictor(), detector, frame_queue, result_queue, stop_event))
 
-    def show_frame():
+    def show_frame() -> None:
         global frame_loop_id
-        global nose_x, nose_y, nose_z, left_x, left_y, left_z, right_x, right_y, right_z
 
-        if not cap or not cap.isOpened(): return
-        ret, frame = cap.read()
-        if not ret:
-            frame_loop_id = image_label.after(10, show_frame)
-            return
+        if subscription is not None:
+            for event in subscription.drain():
+                f.dbg(f"Head event: {event}")
 
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = face_mesh.process(img_rgb)
+        result = result_queue.get_latest()
+        if result is not None:
+            buffer, points, gaze_prediction = result
 
-        if results.multi_face_landmarks:
-            h, w = img_rgb.shape[:2]
-            lms = results.multi_face_landmarks[0].landmark
-            nose, left, right = lms[1], lms[468], lms[473]
+            if points is not None:
+                latest_face_points["nose"] = points[0]
+                latest_face_points["left_iris"] = points[1]
+                latest_face_points["right_iris"] = points[2]
 
-            nose_x, nose_y, nose_z = round(nose.x, 5), round(nose.y, 5), round(nose.z, 5)
-            left_x, left_y, left_z = round(left.x, 5), round(left.y, 5), round(left.z, 5)
-            right_x, right_y, right_z = round(right.x, 5), round(right.y, 5), round(right.z, 5)
+                if shared.debug and debug_label is not None:
+                    debug_text: str = " ".join(
+                        f"{label}(x={x}, y={y}, z={z})"
+                        for label, (x, y, z) in zip(("NOSE", "LEFTEYE", "RIGHTEYE"), points)
+                    )
+                    if gaze_prediction is not None:
+                        debug_text += f" GAZE({gaze_prediction[0]}, {gaze_prediction[1]:.2f})"
+                    debug_label.configure(text=debug_text)
+            else:
+                # Clear previous values
+                latest_face_points["nose"] = None
+                latest_face_points["left_iris"] = None
+                latest_face_points["right_iris"] = None
 
-            # Update face points dictionary
-            latest_face_points["nose"] = (nose_x, nose_y, nose_z)
-            latest_face_points["left_iris"] = (left_x, left_y, left_z)
-            latest_face_points["right_iris"] = (right_x, right_y, right_z)
+            if buffer is not None:
+                with profiler.stage("display"):
+                    preview.show(buffer)
 
-            for pt, color in zip([nose, left, right], [(0,255,0), (255,0,0), (0,0,255)]):
-                x, y = int(pt.x * w), int(pt.y * h)
-                cv2.circle(img_rgb, (x, y), 3, color, -1)
+        frame_loop_id = image_label.after(10, show_frame)
 
-            if shared.debug:
-                debug_text: str = (f"NOSE(x={nose_x}, y={nose_y}, z={nose_z}) ",
-                                   f"LEFTEYE(x={left_x}, y={left_y}, z={left_z}) ",
-                                   f"RIGHTEYE(x={right_x}, y={right_y}, z={right_z}) ")
-                
-                debug_label.configure(text=debug_text)
-        else:
-            # Clear previous values
-            latest_face_points["nose"] = None
-            latest_face_points["left_iris"] = None
-            latest_face_points["right_iris"] = None
-
-        if image_label.winfo_width() > 0:
-            img = Image.fromarray(img_rgb)
-            img.thumbnail((image_label.winfo_width(), image_label.winfo_height()), Image.LANCZOS)
-            img_tk = ImageTk.PhotoImage(img)
-            image_label.configure(image=img_tk)
-            image_label.image = img_tk
+    show_frame()
 
-        frame_loop_id = image_label.after(10, show_frame)
+def set_precise_tracking(precise: bool) -> None:
+    """
+    Turns off face region cropping and adaptive inference rate
+    (for calibration captures), or back on.
+    """
+    if tracker is not None:
+        tracker.precise = precise
+    if tracker_process is not None:
+        tracker_process.set_precise(precise)
+
+def on_camera_settings_changed(old: settings.CameraSettings, new: settings.CameraSettings) -> None:
+    """
+    Updates the tracker and preview of a running pipeline. Changes that
+    need new objects (history size, probing) apply to the next camera.
+    """
+    if tracker is not None:
+        tracker.roi_tracking = new.roi_tracking
+        tracker.roi_padding = new.roi_padding
+        tracker.roi_size = new.roi_size
+        tracker.adaptive_rate = new.adaptive_rate
+        tracker.motion_threshold = new.motion_threshold
+        tracker.max_skip_frames = new.max_skip_frames
+    if tracker_process is not None:
+        tracker_process.configure(options_from_settings(new))
+    if renderer is not None:
+        renderer.interval = 1.0 / new.preview_fps
+    f.dbg(f"Camera settings applied: {new}")
+
+def close_face_track(image_label: Union["ctk.CTkLabel", None] = None) -> None:
+    """
+    Stops the face tracking pipeline (if running) and waits
+    for its threads to let go of the camera.
+    """
+    global cap, frame_loop_id, tracker, tracker_process, stop_event, event_subscription
+
+    if frame_loop_id and image_label is not None:
+        try: image_label.after_cancel(frame_loop_id)
+        except Exception: pass
+    frame_loop_id = None
+
+    if stop_event is not None:
+        stop_event.set()
+    for queue in pipeline_queues:
+        queue.close()
+    capture_running = False
+    for thread in pipeline_threads:
+        thread.join(timeout=2.0)
+        if thread.is_alive():
+            f.dbg(f"Pipeline thread '{thread.name}' did not stop in time")
+            capture_running = capture_running or thread.name == "camera-capture"
+    pipeline_queues.clear()
+    pipeline_threads.clear()
+    stop_event = None
+    if event_subscription is not None:
+        event_subscription.close()
+        event_subscription = None
+
+    # The capture stage releases the camera when it ends; a capture stuck
+    # in read() still owns it and releases it once the read returns
+    if cap is not None and not capture_running and cap.isOpened(): cap.release()
+    cap = None
+    if tracker is not None:
+        try: tracker.close()
+        except Exception: pass
+    tracker = None
+    if tracker_process is not None:
+        tracker_process.stop()
+    tracker_process = None
+
+# ---[ Pipeline stages ]--- #
+def _capture_loop(camera: "cv2.VideoCapture", frame_queue: DropQueue, stop: threading.Event) -> None:
+    """
+    Capture stage: reads frames as fast as the camera delivers them.
+    """
+    try:
+        while not stop.is_set():
+            if not camera.isOpened():
+                break
+            start = time.perf_counter()
+            ret, frame = camera.read()
+            if not ret:
+                stop.wait(0.01)
+                continue
+            profiler.record("capture", time.perf_counter() - start)
+            frame_queue.put((frame, time.monotonic()))
+    finally:
+        frame_queue.close()
+        # Only this thread reads from the camera, so only it may release it
+        camera.release()
+        f.dbg("Capture thread stopped.")
+
+def _inference_loop(face_tracker: FaceTracker,
+                    preview: PreviewRenderer,
+                    history: LandmarkHistory,
+                    gaze_predictor: gaze.GazePredictor,
+                    detector: events.HeadEventDetector,
+                    frame_queue: DropQueue,
+                    result_queue: DropQueue,
+                    stop: threading.Event) -> None:
+    """
+    Inference stage: runs FaceMesh on the newest frame, draws the
+    tracked points, records the landmarks, predicts the gaze direction,
+    publishes head movement events and renders the preview buffer.
+    """
+    while not stop.is_set():
+        try:
+            item = frame_queue.get(timeout=0.1)
+        except QueueClosed:
+            break
+        if item is None:
+            continue
+        frame, timestamp = item
+
+        result = face_tracker.process(frame)
+        img_rgb, points = result.rgb, result.points
+        if profiler.enabled:
+            for stage, seconds in result.timings.items():
+                profiler.record(stage, seconds)
+
+        with profiler.stage("landmarks"):
+            if result.inferred and result.landmarks is not None and len(result.landmarks) == history.landmarks:
+                history.push(result.landmarks, timestamp)
+            events.bus.publish(detector.update(points, timestamp))
+            # Returns None right away while the model is still loading
+            gaze_prediction = gaze_predictor.predict(points)
+
+        with profiler.stage("draw"):
+            if points is not None:
+                h, w = img_rgb.shape[:2]
+                for pt, color in zip(points, [(0,255,0), (255,0,0), (0,0,255)]):
+                    x, y = int(pt[0] * w), int(pt[1] * h)
+                    cv2.circle(img_rgb, (x, y), 3, color, -1)
+            profiler.draw_overlay(img_rgb)
+
+        with profiler.stage("render"):
+            buffer = preview.render(img_rgb)
+
+        result_queue.put((buffer, points, gaze_prediction))
+        profiler.end_frame()
+    result_queue.close()
+    f.dbg("Inference thread stopped.")
+
+def _receive_loop(process: TrackerProcess,
+                  preview: PreviewRenderer,
+                  history: LandmarkHistory,
+                  gaze_predictor: gaze.GazePredictor,
+                  detector: events.HeadEventDetector,
+                  result_queue: DropQueue,
+                  stop: threading.Event) -> None:
+    """
+    Receiver stage of out-of-process tracking: records the landmarks and
+    head events of every frame the child tracked, predicts the gaze
+    direction and renders the preview of the newest one straight from
+    the shared memory ring.
+    """
+    while not stop.is_set():
+        ready = process.wait_ready(0.1)
+        if ready:
+            break
+        if ready is False:
+            f.dbg(f"Tracking process failed: {process.error}")
+            stop.set()
+    if stop.is_set():
+        result_queue.close()
+        return
+    process.stream()
+
+    while not stop.is_set():
+        messages = [message for message in process.receive(0.1) if message[0] == "frame"]
+        if process.error:
+            f.dbg(f"Tracking process failed: {process.error}")
+            break
+        for i, (_, slot, timestamp, points, landmarks, timings) in enumerate(messages):
+            if profiler.enabled:
+                for stage, seconds in timings.items():
+                    profiler.record(stage, seconds)
+            with profiler.stage("landmarks"):
+                if landmarks is not None and len(landmarks) == history.landmarks:
+                    history.push(landmarks, timestamp)
+                events.bus.publish(detector.update(points, timestamp))
+            if i < len(messages) - 1:
+                process.release(slot)  # Only the newest frame is shown
+                continue
 
-    threading.Thread(target=show_frame, daemon=True).start()
+            with profiler.stage("landmarks"):
+                gaze_prediction = gaze_predictor.predict(points)
+            frame = process.frame(slot)
+            buffer = None
+            if frame is not None:
+                profiler.draw_overlay(frame)
+                with profiler.stage("render"):
+                    buffer = preview.render(frame)
+                process.release(slot)
+            result_queue.put((buffer, points, gaze_prediction))
+            profiler.end_frame()
+    result_queue.close()
+    f.dbg("Receiver thread stopped.")
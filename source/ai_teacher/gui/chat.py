@@ -0,0 +1,373 @@
+#
+# Chat transcript
+# Copyright (C) 2025 Remeny
+#
+# The conversation of the text chat, in one Text widget instead of one
+# widget per message.
+#
+# Streamed tokens can come from any thread (the language model client
+# runs on its own event loop, see llm.py): they are only queued, and
+# while an answer streams the Tk thread takes everything queued once per
+# frame (FRAME_MS) and inserts it with one call per message. When no
+# answer streams nothing is polled.
+#
+# Only a window of the messages (window_size, a few hundred) is in the
+# widget. Scrolling to the top or bottom of it moves the window through
+# the rest, so a session with 10,000 messages scrolls and streams like
+# one with 50. The scrollbar shows the position within the window.
+#
+# Every message in the widget has two marks: m<n> before its heading and
+# e<n> at the end of its text. Both have right gravity, so text inserted
+# at e<n> (tokens) stays in front of it, and messages inserted in front
+# of m<n> (older messages scrolled in) push it along.
+#
+
+# ---[ Libraries ]--- #
+from ai_teacher.resources import functions as f
+
+from collections import deque
+from typing import Any, Iterable, Union
+
+import threading
+import time
+import tkinter as tk
+import customtkinter as ctk # type: ignore
+
+# ---[ Variables ]--- #
+FRAME_MS: int = 16  # Token batches are drawn at most this often (~60 per second)
+SEPARATOR: str = "\n\n"
+# Keys that only move the cursor or the selection
+NAVIGATION_KEYS: frozenset[str] = frozenset((
+    "Up", "Down", "Left", "Right", "Prior", "Next", "Home", "End",
+    "Shift_L", "Shift_R", "Control_L", "Control_R",
+))
+
+# Heading of each role, and its colors (light theme, dark theme)
+ROLE_NAMES: dict[str, str] = {"user": "You", "teacher": "Teacher", "system": "Note"}
+ROLE_COLORS: dict[str, tuple[str, str]] = {"user": ("#1f6aa5", "#5fa8e8"), "teacher": ("#2e7d32", "#7bc47f"),
+                                          "system": ("#6b6b6b", "#9a9a9a")}
+TEXT_COLORS: tuple[str, str] = ("#111111", "#e6e6e6")
+BACKGROUND_COLORS: tuple[str, str] = ("#ffffff", "#212121")
+
+# ---[ Messages ]--- #
+class ChatMessage:
+    """
+    One message of the transcript. Streamed text is kept in parts and
+    only joined when read.
+    """
+    __slots__ = ("role", "_parts", "streaming", "created")
+
+    def __init__(self, role: str, text: str = "", streaming: bool = False) -> None:
+        self.role = role
+        self._parts: list[str] = [text] if text else []
+        self.streaming = streaming
+        self.created = time.time()
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def add(self, text: str) -> None:
+        self._parts.append(text)
+
+# ---[ Widget ]--- #
+class ChatTranscript(ctk.CTkFrame):
+    """
+    Scrollable, streaming chat transcript.
+
+    On the Tk thread: add_message(), begin_stream(), set_messages(), clear().
+    From any thread: append_tokens(), end_stream().
+
+    Args:
+        master: Parent widget (e.g. shared.main_app.main).
+        window_size (int): Messages kept in the widget at most.
+        page_size (int): Messages moved in when scrolling past the window.
+        width (int), height (int): Size in pixels.
+    """
+    def __init__(self, master: Any, window_size: int = 300, page_size: int = 50,
+                 width: int = 600, height: int = 400, **kwargs: Any) -> None:
+        kwargs.setdefault("fg_color", BACKGROUND_COLORS)
+        super().__init__(master=master, width=width, height=height, **kwargs)
+        self.grid_propagate(False)
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+        self.page_size = max(1, page_size)
+        self.window_size = max(window_size, 2 * self.page_size)
+
+        self.messages: list[ChatMessage] = []
+        self._first: int = 0  # Messages [_first, _last) are in the widget
+        self._last: int = 0
+
+        # (message index, text) and (message index, None) for the end of a stream
+        self._pending: "deque[tuple[int, Union[str, None]]]" = deque()
+        self._pending_lock = threading.Lock()
+        self._streams: int = 0
+        self._tick_id: Union[str, None] = None
+        self._paging: bool = False
+
+        self.text = tk.Text(self, wrap="word", borderwidth=0, highlightthickness=0, padx=12, pady=8,
+                            cursor="arrow", undo=False, font=ctk.CTkFont(size=14))
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.text.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.text.configure(yscrollcommand=self._on_yscroll)
+        # Read-only without state=disabled, which would need switching on every insert
+        self.text.bind("<Key>", self._on_key)
+        for sequence in ("<<Paste>>", "<<Cut>>", "<<Clear>>", "<<PasteSelection>>", "<<Undo>>", "<<Redo>>"):
+            self.text.bind(sequence, lambda event: "break")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.text.bind(sequence, self._on_wheel, add="+")
+
+        self.text.tag_configure("heading", font=ctk.CTkFont(size=13, weight="bold"), spacing1=4)
+        for role in ROLE_COLORS:
+            self.text.tag_configure(f"heading-{role}")
+        self._apply_colors()
+
+    # ---[ Theme ]--- #
+    def _apply_colors(self) -> None:
+        dark = 1 if ctk.get_appearance_mode() == "Dark" else 0
+        self.text.configure(background=BACKGROUND_COLORS[dark], foreground=TEXT_COLORS[dark],
+                            insertbackground=TEXT_COLORS[dark], selectbackground=ROLE_COLORS["user"][dark])
+        for role, colors in ROLE_COLORS.items():
+            self.text.tag_configure(f"heading-{role}", foreground=colors[dark])
+
+    def _set_appearance_mode(self, mode_string: str) -> None:
+        super()._set_appearance_mode(mode_string)
+        self._apply_colors()
+
+    # ---[ Rendering ]--- #
+    def _render(self, index: int, position: str) -> None:
+        """
+        Inserts message number index at "end" or "1.0" and sets its marks.
+        """
+        message = self.messages[index]
+        # Every message has a heading, so m<n> and e<n> are never at the same place
+        heading = f"{ROLE_NAMES.get(message.role, message.role)}\n"
+        tags = ("heading", f"heading-{message.role}")
+        if position == "end":
+            start = self.text.index("end-1c")
+            self.text.insert("end-1c", heading, tags, message.text, (), SEPARATOR, ())
+            self.text.mark_set(f"m{index}", start)
+            self.text.mark_set(f"e{index}", f"end-1c -{len(SEPARATOR)}c")
+        else:
+            self.text.insert("1.0", heading, tags, message.text, (), SEPARATOR, ())
+            self.text.mark_set(f"e{index}", f"m{index + 1} -{len(SEPARATOR)}c")
+            self.text.mark_set(f"m{index}", "1.0")
+        for mark in (f"m{index}", f"e{index}"):
+            self.text.mark_gravity(mark, "right")
+
+    def _drop(self, start: int, end: int) -> None:
+        """
+        Removes messages [start, end) from the widget; they must be at
+        one end of the window.
+        """
+        if start >= end:
+            return
+        from_index = "1.0" if start == self._first else f"m{start}"
+        to_index = f"m{end}" if end < self._last else "end-1c"
+        self.text.delete(from_index, to_index)
+        for index in range(start, end):
+            self.text.mark_unset(f"m{index}", f"e{index}")
+        if start == self._first:
+            self._first = end
+        else:
+            self._last = start
+
+    def _keep_view(self) -> None:
+        self.text.mark_set("view", "@0,0")
+        self.text.mark_gravity("view", "right")
+
+    def _restore_view(self) -> None:
+        self.text.yview("view")
+        self.text.mark_unset("view")
+
+    def _following(self) -> bool:
+        """
+        Whether the end of the transcript is in view (new text scrolls along).
+        """
+        return self._last == len(self.messages) and self.text.yview()[1] >= 0.999
+
+    # ---[ Messages (Tk thread) ]--- #
+    def add_message(self, role: str, text: str = "", streaming: bool = False) -> int:
+        """
+        Adds a message at the end. Returns its index.
+
+        Args:
+            role (str): "user", "teacher" or "system".
+            text (str): Text so far.
+            streaming (bool): More text will come with append_tokens() until end_stream().
+        """
+        following = self._following()
+        index = len(self.messages)
+        self.messages.append(ChatMessage(role, text, streaming))
+        # Scrolled up with a full window: only the model changes, _page_down() renders it later
+        if self._last == index and (following or self._last - self._first < self.window_size):
+            self._render(index, "end")
+            self._last += 1
+            if following and self._last - self._first > self.window_size:
+                self._keep_view()
+                self._drop(self._first, self._last - self.window_size + self.page_size)
+                self._restore_view()
+        if following:
+            self.text.see("end")
+        if streaming:
+            self._streams += 1
+            self._schedule()
+        return index
+
+    def begin_stream(self, role: str = "teacher") -> int:
+        """
+        Adds an empty message that tokens are streamed into.
+        """
+        return self.add_message(role, streaming=True)
+
+    def set_messages(self, messages: Iterable[tuple[str, str]]) -> None:
+        """
+        Replaces the transcript with (role, text) messages, showing the end.
+        """
+        self.clear()
+        self.messages = [ChatMessage(role, text) for role, text in messages]
+        self._show_end()
+        f.dbg(f"Chat transcript: {len(self.messages)} messages, {self._last - self._first} shown")
+
+    def clear(self) -> None:
+        with self._pending_lock:
+            self._pending.clear()
+        self._clear_widget()
+        self.messages = []
+        self._streams = 0
+
+    def jump_to_end(self) -> None:
+        """
+        Shows the newest messages. Streams keep going: their queued
+        tokens are drawn into the new window.
+        """
+        if self._last != len(self.messages):
+            self._show_end()
+        self.text.see("end")
+
+    def _clear_widget(self) -> None:
+        self.text.delete("1.0", "end")
+        for mark in self.text.mark_names():
+            if mark not in ("insert", "current"):
+                self.text.mark_unset(mark)
+        self._first = self._last = 0
+
+    def _show_end(self) -> None:
+        """
+        Renders the window at the end of the messages from scratch.
+        """
+        self._clear_widget()
+        self._first = self._last = max(0, len(self.messages) - self.window_size + self.page_size)
+        for index in range(self._first, len(self.messages)):
+            self._render(index, "end")
+            self._last += 1
+        self.text.see("end")
+
+    # ---[ Streaming (any thread) ]--- #
+    def append_tokens(self, index: int, text: str) -> None:
+        """
+        Queues text for the end of message number index. Thread-safe.
+        """
+        if text:
+            with self._pending_lock:
+                self._pending.append((index, text))
+
+    def end_stream(self, index: int) -> None:
+        """
+        Marks the end of a streamed message. Thread-safe.
+        """
+        with self._pending_lock:
+            self._pending.append((index, None))
+
+    def _schedule(self) -> None:
+        if self._tick_id is None:
+            self._tick_id = self.after(FRAME_MS, self._tick)
+
+    def _tick(self) -> None:
+        """
+        Draws the tokens queued since the last frame.
+        """
+        self._tick_id = None
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+        if pending:
+            following = self._following()
+            batches: dict[int, list[str]] = {}
+            for index, text in pending:
+                if not 0 <= index < len(self.messages):
+                    continue
+                message = self.messages[index]
+                if text is None:
+                    if message.streaming:
+                        message.streaming = False
+                        self._streams -= 1
+                    continue
+                message.add(text)
+                batches.setdefault(index, []).append(text)
+            for index, parts in batches.items():
+                if self._first <= index < self._last:
+                    self.text.insert(f"e{index}", "".join(parts))
+            if following:
+                self.text.see("end")
+        if self._streams > 0 or self._pending:
+            self._schedule()
+
+    # ---[ Scrolling through the window ]--- #
+    def _on_yscroll(self, first: str, last: str) -> None:
+        self.scrollbar.set(first, last)
+        if self._paging:
+            return
+        if float(first) <= 0.0 and self._first > 0:
+            self._paging = True
+            self.after_idle(self._page_up)
+        elif float(last) >= 1.0 and self._last < len(self.messages):
+            self._paging = True
+            self.after_idle(self._page_down)
+
+    def _page_up(self) -> None:
+        """
+        Moves older messages into the top of the window.
+        """
+        self._keep_view()
+        start = max(0, self._first - self.page_size)
+        for index in range(self._first - 1, start - 1, -1):
+            self._first = index  # Before _render(), "1.0" is now this message
+            self._render(index, "1.0")
+        if self._last - self._first > self.window_size:
+            self._drop(self._first + self.window_size, self._last)
+        self._restore_view()
+        self._paging = False
+
+    def _page_down(self) -> None:
+        """
+        Moves newer messages into the bottom of the window.
+        """
+        end = min(len(self.messages), self._last + self.page_size)
+        for index in range(self._last, end):
+            self._render(index, "end")
+            self._last += 1
+        if self._last - self._first > self.window_size:
+            self._keep_view()
+            self._drop(self._first, self._last - self.window_size)
+            self._restore_view()
+        self._paging = False
+
+    # ---[ Events ]--- #
+    def _on_key(self, event: "tk.Event[Any]") -> Union[str, None]:
+        # Moving around, selecting, copying (Ctrl+C) and select all (Ctrl+A) are fine;
+        # anything else (typing, Ctrl+V/X/D/K/H/O/T...) would move text around the marks
+        if event.keysym in NAVIGATION_KEYS:
+            return None
+        if event.state & 0x4 and event.keysym.lower() in ("c", "a", "slash", "insert"):
+            return None
+        return "break"
+
+    def _on_wheel(self, event: "tk.Event[Any]") -> Union[str, None]:
+        # Linux sends Button-4/5 and no <MouseWheel>
+        if event.num in (4, 5):
+            self.text.yview_scroll(-3 if event.num == 4 else 3, "units")
+            return "break"
+        return None
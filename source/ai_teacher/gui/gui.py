@@ -6,9 +6,12 @@
 # ---[ Libraries ]--- #
 from ai_teacher.resources import functions as f
 from ai_teacher.resources import shared
+from ai_teacher.resources import settings
+from ai_teacher.resources.search import PrefixIndex
 
 from tkinter import messagebox
 from typing import Callable
+from typing import TYPE_CHECKING
 from typing import Union
 
 import tkinter as tk
@@ -16,6 +19,9 @@ import customtkinter as ctk # type: ignore
 import os
 import platform
 
+if TYPE_CHECKING:
+    from ai_teacher.gui.chat import ChatTranscript
+
 # ---[ Initialization ]--- #
 
 def init(title: str = "Remeny AI Teacher MAIN", width: int = 0, height: int = 0) -> None:
@@ -27,6 +33,8 @@ def init(title: str = "Remeny AI Teacher MAIN", width: int = 0, height: int = 0)
     shared.root_app.title(title)
     shared.root_app.geometry(f"{width}x{height}")
     shared.root_app.withdraw()  # Hide the root window
+    # Once for the whole app, not per window (windows come and go)
+    settings.subscribe("main", on_user_settings_changed, user=True)
     f.dbg("GUI application initialized.")
 
 # ---[ Primary functions ]--- #
@@ -82,6 +90,17 @@ def quit() -> None:
 def not_implemented() -> None:
     messagebox.showinfo("Not Implemented Yet", "This feature is not implemented yet.") # type: ignore
 
+def apply_theme(theme: str) -> None:
+    """
+    Sets the appearance mode from a [Main] theme value.
+    """
+    ctk.set_appearance_mode("system" if theme in ("auto", "system") else theme)
+
+def on_user_settings_changed(old: settings.UserMainSettings, new: settings.UserMainSettings) -> None:
+    if old.theme != new.theme:
+        f.dbg(f"Theme changed to {new.theme}")
+        apply_theme(new.theme)
+
 def clear_gui(win: Union[ctk.CTk, ctk.CTkToplevel, ctk.CTkFrame, ctk.CTkScrollableFrame]) -> None:
     """
     Clears all stuff inside a window/frame
@@ -99,48 +118,14 @@ def common_next() -> None:
     clear_gui(shared.main_app.main)
     shared.main_app.main.quit()
     
-def create_list_radio_buttons(
-    radio_frame: ctk.CTkFrame,
-    selected_var: tk.StringVar,
-    names: list[str],
-    on_select: callable = None  # Callback function when user selects
-) -> None:
-    clear_gui(radio_frame)
-
-    for name in names:
-        radio = ctk.CTkRadioButton(
-            master=radio_frame,
-            text=name,
-            variable=selected_var,
-            value=name,
-            text_color="#000000",
-            font=("Arial", 14),
-            bg_color="transparent",
-            hover_color="#555555",
-            radiobutton_height=20,
-            radiobutton_width=20,
-            border_color="#000000",
-            corner_radius=500,
-            command=lambda: on_select() if on_select else None
-        )
-        radio.pack(anchor="w", pady=5, padx=10)
-    
 # ---[ Window classes ]--- #
 class app:
     """
     Application class for Remeny AI Teacher GUI.
     """
     def __init__(self, title: str = "Remeny AI Teacher", width: int = 800, height: int = 600):
-        # Theme settings
-        theme: str = shared.user_config.get('Main', 'theme', fallback="system").lower()
-        if theme in ("auto", "system"):
-            ctk.set_appearance_mode("system")
-        elif theme in ("light", "dark"):
-            ctk.set_appearance_mode(theme)
-        else:
-            f.dbg("Invalid theme= setting in configuration.ini, defaulting to system theme")
-            warn("Invalid theme= setting in configuration.ini")
-            ctk.set_appearance_mode("system")
+        # Theme settings (validated when the user settings were loaded)
+        apply_theme(shared.user_settings.main.theme)
         
         # basic stuff
         self.root = ctk.CTkToplevel(shared.root_app)
@@ -200,6 +185,24 @@ class app:
         
         self.action_bar_frame = ActionBar(self.root, buttons)
         self.buttons = self.action_bar_frame.button_refs
+
+    def chat_transcript(self, height: int = 420) -> "ChatTranscript":
+        """
+        Adds/Re-adds a chat transcript below the banner.
+
+        Args:
+            height (int): Height of the transcript in pixels.
+        """
+        from ai_teacher.gui.chat import ChatTranscript
+        try:
+            self.transcript.destroy()
+        except Exception:
+            pass
+
+        self.main.grid_columnconfigure(0, weight=1)
+        self.transcript = ChatTranscript(self.main, height=height)
+        self.transcript.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")  # type: ignore
+        return self.transcript
     
 class Banner:
     def __init__(self, win: Union["ctk.CTkFrame", "ctk.CTkScrollableFrame"], heading: str, text: str, height: int = 65):
@@ -339,3 +342,182 @@ class CTkNumberEntry(ctk.CTkFrame):
 
     def decrement(self):
         self.set(self.get() - self.step)
+
+class CTkSearchableList(ctk.CTkFrame):
+    """
+    Scrollable list of radio buttons with a type-to-filter search box.
+
+    Only the rows that fit in the widget exist; scrolling and filtering
+    just change their text, so 5,000 entries cost about as much as 10.
+    Filtering matches entries starting with the typed text (ignoring
+    case) through a PrefixIndex.
+
+    Args:
+        master: Parent widget.
+        values (list[str]): Entries of the list.
+        variable (tk.StringVar): Receives the selected entry.
+        on_select (Callable[[], None] | None): Called when an entry is selected.
+        sort (bool): Show entries sorted (ignoring case) instead of in the given order.
+        search (bool): Show the search box.
+        width (int), height (int): Size of the whole widget in pixels.
+        row_height (int): Height of one row in pixels.
+    """
+    def __init__(
+        self,
+        master: Union[ctk.CTk, ctk.CTkToplevel, ctk.CTkFrame, tk.Toplevel],
+        values: list[str],
+        variable: tk.StringVar,
+        on_select: Union[Callable[[], None], None] = None,
+        sort: bool = True,
+        search: bool = True,
+        width: int = 300,
+        height: int = 200,
+        row_height: int = 30,
+        *args, **kwargs # type: ignore
+    ):
+        kwargs.setdefault("fg_color", "#FFFFFF")
+        super().__init__(master=master, width=width, height=height, *args, **kwargs) # type: ignore
+        self.grid_propagate(False)
+        self.columnconfigure(0, weight=1)
+        self.variable = variable
+        self.on_select = on_select
+        self.sort = sort
+        self.row_height = row_height
+
+        self._first: int = 0      # Index of the top row in the matches
+        self._count: int = 0      # Number of matches
+        self._matches: list[str] = []  # Matches in given order (sort=False only)
+        self._prefix: str = ""
+        self._index: PrefixIndex = PrefixIndex()
+
+        list_height = height
+        self.search_entry: Union[ctk.CTkEntry, None] = None
+        if search:
+            # No textvariable: CTkEntry never shows the placeholder with one
+            self.search_entry = ctk.CTkEntry(self, placeholder_text="Search...", height=28)
+            self.search_entry.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=(5, 2)) # type: ignore
+            self.search_entry.bind("<Return>", self._on_return)
+            self.search_entry.bind("<KeyRelease>", self._on_search_key)
+            list_height -= 35
+
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent", height=list_height)
+        self.rows_frame.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar, height=list_height)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        # The only radio buttons this widget ever creates
+        self.rows: list[ctk.CTkRadioButton] = []
+        for _ in range(max(1, list_height // row_height)):
+            row = ctk.CTkRadioButton(
+                master=self.rows_frame,
+                text="",
+                variable=variable,
+                value="",
+                text_color="#000000",
+                font=("Arial", 14),
+                bg_color="transparent",
+                hover_color="#555555",
+                radiobutton_height=20,
+                radiobutton_width=20,
+                border_color="#000000",
+                corner_radius=500,
+                command=self._on_row_selected
+            )
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                row.bind(sequence, self._on_wheel, add="+")
+            self.rows.append(row)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.rows_frame.bind(sequence, self._on_wheel, add="+")
+
+        self.set_values(values)
+
+    # ---[ Data ]--- #
+    def set_values(self, values: list[str]) -> None:
+        """
+        Replaces the entries, keeping the current filter.
+        """
+        self._index = PrefixIndex((value, position) for position, value in enumerate(values))
+        self.filter(self._prefix)
+
+    def filter(self, prefix: str) -> None:
+        """
+        Shows only the entries starting with prefix (ignoring case).
+        """
+        self._prefix = prefix
+        self._first = 0
+        if self.sort:
+            self._count = self._index.count(prefix)
+        else:
+            # Back to the given order, only for the matches
+            self._matches = [value for value, _ in sorted(self._index.search(prefix), key=lambda item: item[1])]
+            self._count = len(self._matches)
+        self._refresh()
+
+    def _visible(self) -> list[str]:
+        if self.sort:
+            return [value for value, _ in self._index.search(self._prefix, limit=len(self.rows), offset=self._first)]
+        return self._matches[self._first:self._first + len(self.rows)]
+
+    def get(self) -> str:
+        return self.variable.get()
+
+    # ---[ Drawing ]--- #
+    def _refresh(self) -> None:
+        selected = self.variable.get()
+        visible = self._visible()
+        for i, row in enumerate(self.rows):
+            if i < len(visible):
+                row.configure(text=visible[i], value=visible[i])
+                if visible[i] == selected:
+                    row.select(from_variable_callback=True)
+                else:
+                    row.deselect(from_variable_callback=True)
+                row.grid(row=i, column=0, sticky="w", padx=10, pady=(self.row_height - 20) // 2)
+            else:
+                row.grid_remove()
+        if self._count > 0:
+            self.scrollbar.set(self._first / self._count,
+                               min(1.0, (self._first + len(self.rows)) / self._count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, first: int) -> None:
+        """
+        Scrolls so that match number 'first' is the top row.
+        """
+        first = max(0, min(first, self._count - len(self.rows)))
+        if first != self._first:
+            self._first = first
+            self._refresh()
+
+    # ---[ Events ]--- #
+    def _on_scrollbar(self, action: str, amount: str, unit: str = "") -> None:
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * self._count))
+        elif action == "scroll":
+            step = len(self.rows) if unit == "pages" else 1
+            self.scroll_to(self._first + int(amount) * step)
+
+    def _on_wheel(self, event: tk.Event) -> None:
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self._first - 1)
+        else:
+            self.scroll_to(self._first + 1)
+
+    def _on_row_selected(self) -> None:
+        if self.on_select:
+            self.on_select()
+
+    def _on_search_key(self, event: tk.Event) -> None:
+        # get() is "" while the placeholder shows; arrows, Shift etc. change nothing
+        prefix = self.search_entry.get() if self.search_entry is not None else ""
+        if prefix != self._prefix:
+            self.filter(prefix)
+
+    def _on_return(self, event: tk.Event) -> None:
+        # Enter in the search box selects the first match
+        visible = self._visible()
+        if visible:
+            self.variable.set(visible[0])
+            self._refresh()
+            self._on_row_selected()
@@ -1,20 +1,21 @@
 #
 # This file shows login prompt
-# Issue: User list can go beyond window size if too much users are present
 #
 
 # ---[ Libraries ]--- #
 from ai_teacher.resources import shared
 from ai_teacher.resources import functions as f
 from ai_teacher.gui import gui
+from ai_teacher.backend import users
 
 import tkinter as tk
 import customtkinter as ctk # type: ignore
 import os
 
 # ---[ Global variables ]--- #
+# Filled by login_prompt() from the user registry, plus users created in this session
 user_names: list[str] = []
-user_directories: list[str] = f.list_dirs(os.path.join(shared.app_dir, "data"))
+user_directories: list[str] = []
 
 # ---[ Login windows ]--- #
 def create_user(enable_back_button: bool = False) -> bool | None:
@@ -50,7 +51,8 @@ def create_user(enable_back_button: bool = False) -> bool | None:
             gui.warn("Username must be at most 20 characters long.")
         elif not all(c.isalnum() or c.isspace() for c in new_user_name):
             gui.warn("Username can only contain alphanumeric and space characters.")
-        elif new_user_name.replace(" ", "_").lower() in [name.lower() for name in user_directories]:
+        elif (users.get_registry().has_directory(new_user_name.replace(" ", "_"))
+              or new_user_name.replace(" ", "_").lower() in [name.lower() for name in user_directories]):
             gui.warn(f"User directory '{new_user_name.replace(' ', '_').lower()}' already exists. Please choose a different username.")
         else:
             f.dbg(f"Appending new user: {new_user_name}")
@@ -170,12 +172,10 @@ def create_user(enable_back_button: bool = False) -> bool | None:
     f.dbg(f"User creation window Return Val: {return_value}")
     return return_value
 
-def refresh_user_list(radio_frame: ctk.CTkFrame, selected_user_var: tk.StringVar) -> None:
+def refresh_user_list(user_list: gui.CTkSearchableList) -> None:
     global user_names, user_directories
-    f.dbg("Refreshing user list")
-    f.dbg(f"User names: {user_names}")
-    f.dbg(f"User directories: {user_directories}")
-    gui.create_list_radio_buttons(radio_frame, selected_user_var, user_names)
+    f.dbg(f"Refreshing user list ({len(user_names)} users)")
+    user_list.set_values(user_names)
     
 def display_login_prompt() -> str:
     """
@@ -194,7 +194,7 @@ def display_login_prompt() -> str:
         
         if create_user(enable_back_button=True):
             f.dbg("User created successfully, refreshing user list")
-            refresh_user_list(radio_frame, selected_user_var)
+            refresh_user_list(user_list)
         
         login_window.deiconify()
         f.dbg("Login window shown")
@@ -281,13 +281,12 @@ def display_login_prompt() -> str:
         )
     Label_id2.place(x=20, y=10) # type: ignore
 
-    # Frame to hold radio buttons
-    radio_frame = ctk.CTkFrame(master=login_window, fg_color="#FFFFFF", width=300, height=200)
-    radio_frame.place(x=20, y=60) # type: ignore
-
-    # List users
+    # List users (only the visible rows are created, type to filter)
     selected_user_var = tk.StringVar()
-    refresh_user_list(radio_frame, selected_user_var)
+    user_list = gui.CTkSearchableList(login_window, user_names, selected_user_var, width=340, height=210)
+    user_list.place(x=20, y=60) # type: ignore
+    if user_list.search_entry is not None:
+        user_list.search_entry.focus_set()
     
     # run the main loop
     login_window.mainloop()
@@ -304,28 +303,14 @@ def login_prompt() -> tuple[str, str]:
     Returns the username.
     """
     global user_names, user_directories
-    from configparser import ConfigParser
-    # Gather user directories and names
+    # Gather user directories and names from the registry (no settings files are parsed)
+    registry = users.get_registry()
+    user_names = registry.names()
+    user_directories = [str(registry.lookup(name)) for name in user_names]
     
-    if not user_directories:
+    if not user_names:
         # No users found, create a new user
         create_user()
-    else:
-        # Users are already present, populate user names
-        current_config = ConfigParser()
-        
-        for directory in user_directories:
-            settings_file = os.path.join(shared.app_dir, "data", directory, "settings.ini")
-            
-            if os.path.isfile(settings_file):
-                f.dbg(f"Reading settings from {settings_file}")
-                current_config.read(settings_file)
-                user_name = current_config.get("Account", "pretty_name", fallback=f"NOOBUSER_<{directory}>")
-            else:
-                f.dbg(f"Settings file not found for {directory}.")
-                user_name = f"NOOBUSER_<{directory}>"
-            
-            user_names.append(user_name)
 
     # Display a login window
     selected_user_name: str = ""
@@ -335,15 +320,16 @@ def login_prompt() -> tuple[str, str]:
         f.quit(1, "Apparently selected_user_name is empty, how can I log in?")
     
     # Match the selected user name with our index
-    index: int = 0
     f.dbg(f"Selected user name: {selected_user_name}")
-    f.dbg(f"User names: {user_names}")
-    try:
-        index = user_names.index(selected_user_name)
-    except ValueError:
-        f.quit(1, f"User '{selected_user_name}' not found in user list!")
+    directory = registry.lookup(selected_user_name)
+    if directory is None:
+        # Created in this session, not registered until the first login
+        try:
+            directory = user_directories[user_names.index(selected_user_name)]
+        except ValueError:
+            f.quit(1, f"User '{selected_user_name}' not found in user list!")
 
-    return selected_user_name, user_directories[index]
+    return selected_user_name, str(directory)
 
 def ask_session(win: gui.app) -> str:
     """
@@ -387,16 +373,14 @@ def ask_session(win: gui.app) -> str:
     win.action_bar(buttons=(("Cancel", gui.quit), ("Next", on_next)))
     win.buttons["Next"].configure(state="disabled")
 
-    # Frame to hold radio buttons
-    radio_frame = ctk.CTkFrame(master=win.main, fg_color="#FFFFFF", width=300, height=200)
-    radio_frame.grid(padx=60, pady=60)
-    
     def on_session_button_select():
         win.buttons['Next'].configure(state="normal")
         return
 
-    # List users
-    gui.create_list_radio_buttons(radio_frame, selected_option, display_names, on_select=on_session_button_select)
+    # List session types (in the order of session_types)
+    session_list = gui.CTkSearchableList(win.main, display_names, selected_option,
+                                         on_select=on_session_button_select, sort=False, width=400, height=230)
+    session_list.grid(padx=60, pady=60)
 
     #run the main loop
     win.main.mainloop()
@@ -21,12 +21,13 @@ def show_notices_gui(disclaimer_text: str,
         Action for the 'Next' button, which closes the window.
         """
         # Save the acceptance state
-        f.update_user_config('Main',
-                             'disclaimer_accepted',
-                             str(disclaimer_checkbox.get()).lower())
-        f.update_user_config('Main',
-                             'license_accepted',
-                             str(license_checkbox.get()).lower())
+        with f.config_transaction():
+            f.update_user_config('Main',
+                                 'disclaimer_accepted',
+                                 str(disclaimer_checkbox.get()).lower())
+            f.update_user_config('Main',
+                                 'license_accepted',
+                                 str(license_checkbox.get()).lower())
         
         win.root.quit()
         win.root.destroy()
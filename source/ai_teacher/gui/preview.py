@@ -0,0 +1,127 @@
+#
+# Camera preview renderer
+# Copyright (C) 2025 Remeny
+#
+# Renders frames into a label without creating new images every frame:
+# the target size is cached (updated on <Configure>), frames are resized
+# into a small pool of preallocated buffers on the worker thread and the
+# Tk thread pastes them into one persistent PhotoImage.
+#
+
+# ---[ Libraries ]--- #
+from PIL import Image, ImageTk # type: ignore
+from typing import Any, Union
+
+import queue
+import time
+import tkinter as tk
+
+import cv2
+import numpy as np
+
+# ---[ Classes ]--- #
+class PreviewRenderer:
+    """
+    Allocation-free preview for a label.
+
+    render() is called from the worker thread and returns a filled
+    buffer (or None when the frame should be skipped), show() is called
+    on the Tk thread with that buffer. Buffers that never reach show()
+    must be handed back with release().
+
+    Args:
+        label: Label that displays the preview.
+        container: Widget whose size is the preview area (default: label's master).
+        max_fps (float): Preview rate cap, independent of the inference rate. 0 = no cap.
+        pool_size (int): Number of preallocated frame buffers.
+    """
+    def __init__(self, label: Any, container: Any = None, max_fps: float = 30.0, pool_size: int = 3) -> None:
+        self.label = label
+        self.container = container if container is not None else label.master
+        self.interval: float = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.pool_size = max(1, pool_size)
+
+        self.target: tuple[int, int] = (self.container.winfo_width(), self.container.winfo_height())
+        self._pool_shape: Union[tuple[int, int, int], None] = None
+        self._free: "queue.SimpleQueue[np.ndarray]" = queue.SimpleQueue()
+        self._last_render: float = 0.0
+
+        self.photo: Union[ImageTk.PhotoImage, None] = None
+        self._image: Union[Image.Image, None] = None
+
+        # Plain tkinter bind, CTk widgets override bind() with their own signature
+        tk.Misc.bind(self.container, "<Configure>", self._on_configure, "+")
+
+    def _on_configure(self, event: "tk.Event[Any]") -> None:
+        self.target = (event.width, event.height)
+
+    def _fit(self, width: int, height: int) -> tuple[int, int]:
+        """
+        Largest size that fits the target while keeping the aspect ratio.
+        Never upscales (same as PIL's thumbnail()).
+        """
+        target_w, target_h = self.target
+        scale = min(target_w / width, target_h / height, 1.0)
+        return max(0, int(width * scale)), max(0, int(height * scale))
+
+    def _allocate(self, shape: tuple[int, int, int]) -> None:
+        self._pool_shape = shape
+        free: "queue.SimpleQueue[np.ndarray]" = queue.SimpleQueue()
+        for _ in range(self.pool_size):
+            free.put(np.empty(shape, dtype=np.uint8))
+        self._free = free
+
+    # ---[ Worker thread ]--- #
+    def render(self, frame: np.ndarray) -> Union[np.ndarray, None]:
+        """
+        Resizes an RGB frame into a pooled buffer.
+        Returns None if the frame is skipped (rate cap, no free buffer,
+        or the preview area is not visible yet).
+        """
+        now = time.perf_counter()
+        if now - self._last_render < self.interval:
+            return None
+
+        height, width = frame.shape[:2]
+        out_w, out_h = self._fit(width, height)
+        if out_w < 2 or out_h < 2:
+            return None
+
+        shape = (out_h, out_w, 3)
+        if shape != self._pool_shape:
+            self._allocate(shape)
+        try:
+            buffer = self._free.get_nowait()
+        except queue.Empty:
+            return None  # Tk thread is behind, skip this one
+
+        if (out_w, out_h) == (width, height):
+            np.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, (out_w, out_h), dst=buffer, interpolation=cv2.INTER_LINEAR)
+        self._last_render = now
+        return buffer
+
+    def release(self, buffer: Any) -> None:
+        """
+        Gives a buffer back to the pool. Buffers of an old size are dropped.
+        """
+        if isinstance(buffer, np.ndarray) and buffer.shape == self._pool_shape:
+            self._free.put(buffer)
+
+    # ---[ Tk thread ]--- #
+    def show(self, buffer: np.ndarray) -> None:
+        """
+        Copies a rendered buffer into the label's PhotoImage.
+        """
+        height, width = buffer.shape[:2]
+        if self.photo is None or self._image is None or self._image.size != (width, height):
+            # Only happens on the first frame and when the preview area is resized
+            self._image = Image.new("RGB", (width, height))
+            self.photo = ImageTk.PhotoImage(self._image)
+            self.label.configure(image=self.photo)
+            self.label.image = self.photo
+
+        self._image.frombytes(buffer)
+        self.photo.paste(self._image)
+        self.release(buffer)
@@ -5,6 +5,8 @@
 
 # ---[ Libraries ]--- #
 from ai_teacher.resources import shared
+from ai_teacher.resources import logger
+from ai_teacher.resources import settings
 from ai_teacher.gui import gui
 
 import os
@@ -12,41 +14,64 @@ import sys
 import configparser
 import time
 import platform
+import threading
 
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Callable, Iterator
 
 # ---[ Variables ]--- #
-logfile_name: str
 logfile_directory: str
 
+# Cached timestamp text, see timestamp()
+timestamp_second: int = 0
+timestamp_text: str = ""
+
+# Ini updates waiting to be written: {ini file: {section: {key: value}}}
+pending_config_updates: dict[str, dict[str, dict[str, str]]] = {}
+config_batch_depth: int = 0
+config_flush_timer: threading.Timer | None = None
+config_lock: threading.RLock = threading.RLock()
+# Writers for update targets that are not ini files (e.g. the user store): {path: writer(updates)}
+config_writers: dict[str, Callable[[dict[str, dict[str, str]]], None]] = {}
+# Settings snapshots to rebuild when the outermost config_transaction() ends ("config", "user")
+pending_snapshots: set[str] = set()
+
 # ---[ Primary Functions ]--- #
+def timestamp() -> str:
+    """
+    Current time as 'YYYY-MM-DD HH:MM:SS', formatted at most once per second.
+    """
+    global timestamp_second, timestamp_text
+    now = int(time.time())
+    if now != timestamp_second:
+        timestamp_second = now
+        timestamp_text = datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+    return timestamp_text
+
 def log(text: str) -> str:
     """
     This function logs text to a file and returns
-    a formatted string with added time
+    a formatted string with added time.
+    Writing happens on the log writer thread (see resources/logger.py).
     """
-    import re
+    writer = logger.writer  # Once: the settings watcher may stop the logger meanwhile
+    if shared.log and writer is not None:
+        writer.write(text)
     # Add time information
-    text = f"\033[34m{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\033[0m {text}"
-    # Add log without color codes if enabled
-    if shared.config.getboolean('Debug', 'enable_logging', fallback=False):
-        global logfile_name, logfile_directory
-        clean_text = re.sub(r'\x1B\[[0-9;]*m', '', text)
-        os.makedirs(logfile_directory, exist_ok=True)
-        with open(logfile_name, "a", encoding="utf-8") as f:
-            f.write(f"{clean_text}\n")
-    
-    return text
+    return f"\033[34m{timestamp()}\033[0m {text}"
     
 def dbg(*args) -> None:
     """
     This function outputs text given to it to terminal,
     if debugging is enabled.
+    Arguments are only formatted when debugging is enabled; callables
+    are called first, so expensive values can be passed as a lambda.
     """
     if not shared.debug:
         return
     
-    text = " ".join(str(arg) for arg in args)
+    text = " ".join(str(arg() if callable(arg) else arg) for arg in args)
     formatted_text: str = f"\033[31m[Debug]\033[32m {text} \033[0m"
     print(log(formatted_text))
     
@@ -54,7 +79,7 @@ def quit(return_code: int, text: str = "", dialog: bool = True) -> None:
     """
     This function quits the program with a given return code.
     """
-    if shared.config.getboolean('GUI', 'quick_exit', fallback=True) and shared.root_app:
+    if shared.settings.gui.quick_exit and shared.root_app:
         from tkinter import TclError
         try:
             shared.root_app.quit()  # Stop mainloop
@@ -71,8 +96,35 @@ def quit(return_code: int, text: str = "", dialog: bool = True) -> None:
     dbg(f"Quitting with return code {return_code}")
     print("Exiting...")
 
+    try:
+        flush_config()
+    except Exception as e:
+        print(f"Could not save pending configuration changes: {e}")
+
+    if shared.user_store is not None:
+        from ai_teacher.backend.userdata import close_store
+        try:
+            close_store()
+        except Exception as e:
+            print(f"Could not close the user data store: {e}")
+
+    answercache = sys.modules.get("ai_teacher.backend.answercache")
+    if answercache is not None:  # Only if the chat used it
+        try:
+            answercache.close()
+        except Exception as e:
+            print(f"Could not close the answer cache: {e}")
+
+    speech = sys.modules.get("ai_teacher.backend.speech")
+    if speech is not None:  # Stop talking before the mixer goes away
+        try:
+            speech.close()
+        except Exception as e:
+            print(f"Could not stop speech: {e}")
+
     dbg(f"Session {shared.build_number} lasted from {shared.init_time_formatted} to {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     dbg("Program exited after running for {:.1f} seconds".format(time.time() - shared.init_time))
+    logger.stop()  # Write out buffered log lines
     sys.exit(return_code)
 
 # ---[ Secondary Functions ]--- #
@@ -80,7 +132,7 @@ def clear_screen():
     """
     This function clears the terminal
     """
-    if not shared.config.getboolean('Debug', 'clear_terminal_on_startup', fallback=True):
+    if not shared.settings.debug.clear_terminal_on_startup:
         return
     
     dbg("Clearing screen...")
@@ -104,18 +156,124 @@ def load_config(ini_file: str) -> configparser.ConfigParser:
     config.read(ini_file)
     return config
 
-def update_ini(ini_file: str, section: str, key: str, value: str) -> None:
+def write_ini(ini_file: str, updates: dict[str, dict[str, str]],
+              remove_sections: tuple[str, ...] | list[str] = ()) -> None:
+    """
+    Applies many section/key updates to an ini file with one parse and
+    one atomic write (temporary file + rename), so a crash can never
+    leave a half-written file behind. Sections in remove_sections are
+    deleted.
+    """
     from configupdater import ConfigUpdater
     
     updater: ConfigUpdater = ConfigUpdater()
-    dbg(f"Updating ini file '{ini_file}' with value '{value}' for section '{section}' and key '{key}'")
     updater.read(ini_file) # type: ignore
 
-    if not updater.has_section(section): # type: ignore
-        updater.add_section(str(section))
+    for section in remove_sections:
+        if updater.has_section(section): # type: ignore
+            updater.remove_section(section) # type: ignore
+
+    for section, values in updates.items():
+        if not updater.has_section(section): # type: ignore
+            updater.add_section(str(section))
+        for key, value in values.items():
+            updater[section][key] = value
+
+    temp_file = f"{ini_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as file:
+        file.write(str(updater))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, ini_file)
+
+def flush_config() -> None:
+    """
+    Writes all pending (batched or debounced) ini updates to disk.
+    """
+    global config_flush_timer
+    with config_lock:
+        if config_flush_timer is not None:
+            config_flush_timer.cancel()
+            config_flush_timer = None
+        
+        for ini_file, updates in list(pending_config_updates.items()):
+            dbg(f"Writing {sum(len(v) for v in updates.values())} value(s) to '{ini_file}'")
+            writer = config_writers.get(ini_file)
+            if writer is not None:
+                writer(updates)
+            else:
+                write_ini(ini_file, updates)
+            del pending_config_updates[ini_file]
+
+def schedule_config_flush(delay: float) -> None:
+    """
+    Flushes pending ini updates after 'delay' seconds on a background
+    thread. Calling it again before then restarts the delay, so bursts
+    of updates end up in one write.
+    """
+    global config_flush_timer
+    with config_lock:
+        if config_flush_timer is not None:
+            config_flush_timer.cancel()
+        config_flush_timer = threading.Timer(delay, flush_config)
+        config_flush_timer.daemon = True
+        config_flush_timer.start()
+
+@contextmanager
+def config_transaction(debounce: float = 0.0) -> Iterator[None]:
+    """
+    Batches update_ini/update_config/update_user_config calls made inside
+    the block: each touched file is parsed and written once when the
+    outermost block ends (even if it raises, so disk matches memory).
+    With debounce > 0 the write happens in the background that many
+    seconds later instead. shared.settings and shared.user_settings
+    are rebuilt once at the end as well, not after every update.
+
+    Example:
+        with f.config_transaction():
+            f.update_user_config('Main', 'a', '1')
+            f.update_user_config('Main', 'b', '2')
+    """
+    global config_batch_depth
+    with config_lock:
+        config_batch_depth += 1
+    try:
+        yield
+    finally:
+        with config_lock:
+            config_batch_depth -= 1
+            outermost = config_batch_depth == 0
+        if outermost and pending_config_updates:
+            if debounce > 0:
+                schedule_config_flush(debounce)
+            else:
+                flush_config()
+        if outermost:
+            refresh_snapshots()
+
+def refresh_snapshots(*kinds: str) -> None:
+    """
+    Rebuilds the settings snapshots of the changed configs ("config",
+    "user"). Inside a config_transaction() they are only marked, and
+    rebuilt once when the outermost block ends.
+    """
+    with config_lock:
+        pending_snapshots.update(kinds)
+        if config_batch_depth > 0:
+            return
+        kinds = tuple(pending_snapshots)
+        pending_snapshots.clear()
+    if "config" in kinds:
+        settings.apply(settings.load(shared.config, strict=False))
+    if "user" in kinds:
+        settings.apply_user(settings.load_user(shared.user_config))
 
-    updater[section][key] = value
-    updater.update_file()
+def update_ini(ini_file: str, section: str, key: str, value: str) -> None:
+    dbg(f"Updating ini file '{ini_file}' with value '{value}' for section '{section}' and key '{key}'")
+    with config_lock:
+        pending_config_updates.setdefault(ini_file, {}).setdefault(str(section), {})[key] = str(value)
+        if config_batch_depth == 0:
+            flush_config()
     
 def update_config(section: str, key: str, value: str) -> None:
     """
@@ -130,6 +288,7 @@ def update_config(section: str, key: str, value: str) -> None:
         shared.config.add_section(str(section))
     
     shared.config[section][key] = str(value)
+    refresh_snapshots("config")
     return
     
 def update_user_config(section: str, key: str, value: str) -> None:
@@ -137,24 +296,27 @@ def update_user_config(section: str, key: str, value: str) -> None:
     This function updates the user's configuration ini file
     stored in shared.user_config_file as well as the user 
     configuration loaded in shared.user_config
+    Sections kept in the user store (userdata.STORE_SECTIONS)
+    are written to the store instead of the ini file.
     """
-    update_ini(shared.user_config_file, section, key, value)
+    from ai_teacher.backend.userdata import STORE_SECTIONS
+    if section in STORE_SECTIONS and shared.user_store is not None:
+        update_ini(shared.user_store.path, section, key, value)
+    else:
+        update_ini(shared.user_config_file, section, key, value)
     
     # Update in-memory config
     if not shared.user_config.has_section(section):
         shared.user_config.add_section(str(section))
     
     shared.user_config[section][key] = str(value)
+    refresh_snapshots("user")
     return
 
 def display_version() -> None:
-    shared.build_number = str(int(shared.config.get('Version', 'build', fallback='0')) + 1)
-    shared.version = (
-        f"{shared.config.get('Version', 'major', fallback='0')}."
-        f"{shared.config.get('Version', 'minor', fallback='0')}."
-        f"{shared.config.get('Version', 'carry', fallback='0')}."
-        f"{shared.build_number}"
-    )
+    version = shared.settings.version
+    shared.build_number = str(version.build + 1)
+    shared.version = f"{version.major}.{version.minor}.{version.carry}.{shared.build_number}"
     print("\nRemeny AI Teacher")
     print(f"Version {shared.version}\n")
     # Update build number
@@ -204,25 +366,51 @@ def list_dirs(path: str) -> list[str]:
         dbg(f"Error listing directories in {path}: {e}")
         return []
 
+def start_logging(debug: settings.DebugSettings) -> None:
+    """
+    Starts the log writer if logging is enabled in [Debug].
+    """
+    global logfile_directory
+    logfile_directory = os.path.join(shared.app_dir, debug.log_directory)
+    if debug.enable_logging:
+        logger.start(
+            logfile_directory,
+            max_bytes=debug.log_max_size_kb * 1024,
+            max_age=debug.log_rotate_hours * 3600,
+            backup_count=debug.log_backup_count
+        )
+
+def on_debug_settings_changed(old: settings.DebugSettings, new: settings.DebugSettings) -> None:
+    """
+    Restarts the log writer when the [Debug] logging settings change.
+    """
+    logging_keys = ("enable_logging", "log_directory", "log_max_size_kb", "log_rotate_hours", "log_backup_count")
+    if any(getattr(old, key) != getattr(new, key) for key in logging_keys):
+        logger.stop()
+        start_logging(new)
+
 # ---[ Init function ]--- #
-def init() -> None:
+def init_settings() -> None:
     """
-    Initialize our program
+    Loads configuration.ini and starts logging. Enough for the
+    modes without windows (python main.py --serve).
     """
-    global logfile_name, logfile_directory
     # Variable initialization
     shared.init_time = time.time()
     shared.init_time_formatted = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     shared.app_dir = os.path.dirname(os.path.abspath(str(getattr(sys.modules['__main__'], '__file__', ''))))
     shared.config_file = os.path.join(shared.app_dir, "settings", "configuration.ini")
     shared.config = load_config(shared.config_file)
-    shared.debug = shared.config.getboolean('Debug', 'enable_debug', fallback=False)
-    shared.log = shared.config.getboolean('Debug', 'enable_logging', fallback=False)
+    settings.apply(settings.load(shared.config))  # Also sets shared.debug and shared.log
     
-    if shared.log:
-        logfile_directory = os.path.join(shared.app_dir, shared.config.get('Debug', 'log_directory', fallback='logfiles'))
-        logfile_name = datetime.now().strftime("%Y-%m-%d_%H-%M-%S.log")
-        logfile_name = os.path.join(logfile_directory, logfile_name)
+    start_logging(shared.settings.debug)
+    settings.subscribe("debug", on_debug_settings_changed)
+
+def init() -> None:
+    """
+    Initialize our program
+    """
+    init_settings()
     
     # Libraries (put here so shared variables are accessible)
     from ai_teacher.resources.sounds import init as sound_init
@@ -230,10 +418,11 @@ def init() -> None:
     clear_screen()
     display_version()
 
-    sound_init()
+    sound_init()  # Starts the mixer in the background
     
     create_folders()
     gui.init()
+    settings.watch()  # Apply edits to configuration.ini while running
 
     dbg("Initialization complete.")
     return
@@ -29,7 +29,7 @@ def show_license(license_text: str) -> None:
     """
     Shows the license to the user via commandline.
     """
-    if not shared.user_config.getboolean('Main', 'license_accepted', fallback=False):
+    if not shared.user_settings.main.license_accepted:
         print ("\n ---------------------- ")
         print(license_text)
         
@@ -43,7 +43,7 @@ def show_notices(disclaimer_file: str, license_name: str) -> None:
     """
     Shows the notices to the user, either via GUI or console.
     """
-    use_gui: bool = shared.config.getboolean('GUI', 'notices', fallback=True)
+    use_gui: bool = shared.settings.gui.notices
     
     # Prepare variables
     if not os.path.isfile(disclaimer_file):
@@ -57,8 +57,8 @@ def show_notices(disclaimer_file: str, license_name: str) -> None:
         "You can find the full license text in 'LICENSE.txt'.\n"
     )
     
-    disclaimer_accepted: bool = shared.user_config.getboolean('Main', 'disclaimer_accepted', fallback=False)
-    license_accepted: bool = shared.user_config.getboolean('Main', 'license_accepted', fallback=False)
+    disclaimer_accepted: bool = shared.user_settings.main.disclaimer_accepted
+    license_accepted: bool = shared.user_settings.main.license_accepted
     
     # Check if we should use GUI
     if use_gui and (not disclaimer_accepted or not license_accepted):
@@ -0,0 +1,112 @@
+#
+# Small building blocks for threaded frame pipelines
+# Copyright (C) 2025 Remeny
+#
+# Stages (capture, inference, preview) talk to each other through
+# DropQueue objects. A DropQueue is bounded and throws away the oldest
+# item when full, so a slow consumer only ever sees fresh data instead
+# of a growing backlog.
+#
+
+# ---[ Libraries ]--- #
+from collections import deque
+from typing import Any, Callable
+
+import threading
+
+# ---[ Classes ]--- #
+class QueueClosed(Exception):
+    """
+    Raised by DropQueue.get() once the queue is closed and empty.
+    """
+
+class DropQueue:
+    """
+    Bounded, thread-safe, drop-oldest queue.
+
+    Args:
+        maxsize (int): Maximum number of queued items (at least 1).
+        on_drop (Callable[[Any], None] | None): Called with every item that
+            gets thrown away, e.g. to give a pooled buffer back.
+    """
+    def __init__(self, maxsize: int = 1, on_drop: Callable[[Any], None] | None = None) -> None:
+        self._items: deque[Any] = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self._closed = False
+        self._on_drop = on_drop
+        self.dropped: int = 0
+        self.total: int = 0
+
+    def put(self, item: Any) -> bool:
+        """
+        Adds an item, dropping the oldest one if the queue is full.
+        Returns False if an item had to be dropped.
+        """
+        dropped = None
+        with self._cond:
+            if self._closed:
+                return False
+            full = len(self._items) == self._items.maxlen
+            if full:
+                self.dropped += 1
+                dropped = self._items.popleft()
+            self._items.append(item)
+            self.total += 1
+            self._cond.notify()
+        if full and self._on_drop is not None:
+            self._on_drop(dropped)
+        return not full
+
+    def get(self, timeout: float | None = None) -> Any:
+        """
+        Waits for the oldest item and returns it.
+        Returns None on timeout, raises QueueClosed when closed and drained.
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            if self._closed:
+                raise QueueClosed()
+            return None
+
+    def get_latest(self) -> Any:
+        """
+        Non-blocking: returns the newest item (discarding older ones)
+        or None if nothing is queued.
+        """
+        with self._cond:
+            if not self._items:
+                return None
+            item = self._items.pop()
+            stale = list(self._items)
+            self.dropped += len(stale)
+            self._items.clear()
+        if self._on_drop is not None:
+            for old in stale:
+                self._on_drop(old)
+        return item
+
+    def close(self) -> None:
+        """
+        Wakes up all waiters; further put() calls are ignored.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+def start_stage(name: str, target: Callable[..., None], *args: Any) -> threading.Thread:
+    """
+    Starts a daemon thread running one pipeline stage.
+    """
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
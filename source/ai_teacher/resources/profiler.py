@@ -0,0 +1,218 @@
+#
+# Frame loop profiler
+# Copyright (C) 2025 Remeny
+#
+# Measures how long each stage of the camera loop takes (capture,
+# colour conversion, FaceMesh, post-processing, drawing, preview...)
+# with monotonic timers, keeps a rolling window per stage and reports
+# p50/p95/p99. The numbers can be drawn on the preview and are
+# periodically appended as JSON lines to a file in the log directory.
+#
+# Switched on with enable_profiler in the [Debug] section. When it is
+# off, stage() returns a shared do-nothing context manager and record()
+# returns right away.
+#
+
+# ---[ Libraries ]--- #
+from configparser import ConfigParser
+from datetime import datetime
+from typing import Any, Union
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# ---[ Classes ]--- #
+class _NullStage:
+    """
+    Context manager that does nothing (profiler disabled).
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        return None
+
+NULL_STAGE = _NullStage()
+
+class _Stage:
+    """
+    Times one 'with' block and records it under a stage name.
+    """
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "FrameProfiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "_Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+class _Window:
+    """
+    Fixed-size ring of samples for one stage.
+    """
+    __slots__ = ("samples", "index", "count")
+
+    def __init__(self, size: int) -> None:
+        self.samples = np.zeros(size, dtype=np.float64)
+        self.index = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % len(self.samples)
+        if self.count < len(self.samples):
+            self.count += 1
+
+    def values(self) -> np.ndarray:
+        return self.samples[:self.count]
+
+class FrameProfiler:
+    """
+    Per-stage frame timing.
+
+    Args:
+        enabled (bool): Record anything at all.
+        window (int): Samples kept per stage for the percentiles.
+        overlay (bool): Draw the numbers on preview frames (see draw_overlay()).
+        export_directory (str | None): Directory for the JSONL export (None = no export).
+        export_interval (float): Seconds between exported lines.
+    """
+    def __init__(self, enabled: bool = False, window: int = 300, overlay: bool = False,
+                 export_directory: Union[str, None] = None, export_interval: float = 5.0) -> None:
+        self.enabled = enabled
+        self.window = window
+        self.overlay = enabled and overlay
+        self.export_directory = export_directory if enabled else None
+        self.export_interval = export_interval
+        self.export_file: str = ""
+
+        self.frames: int = 0
+        self._windows: dict[str, _Window] = {}
+        self._started = time.monotonic()
+        self._last_export = self._started
+        self._frames_at_export: int = 0
+        self._overlay_lines: list[str] = []
+        self._overlay_time: float = 0.0
+        self._lock = threading.Lock()
+
+        if self.export_directory:
+            os.makedirs(self.export_directory, exist_ok=True)
+            name = datetime.now().strftime("profile_%Y-%m-%d_%H-%M-%S.jsonl")
+            self.export_file = os.path.join(self.export_directory, name)
+
+    @classmethod
+    def from_config(cls, config: ConfigParser, log_directory: str) -> "FrameProfiler":
+        """
+        Creates a profiler from the [Debug] section of configuration.ini.
+        """
+        return cls(
+            enabled=config.getboolean('Debug', 'enable_profiler', fallback=False),
+            overlay=config.getboolean('Debug', 'profiler_overlay', fallback=True),
+            export_directory=log_directory,
+            export_interval=config.getfloat('Debug', 'profiler_export_interval', fallback=5.0)
+        )
+
+    # ---[ Recording ]--- #
+    def stage(self, name: str) -> Union[_Stage, _NullStage]:
+        """
+        'with profiler.stage("draw"): ...' times the block.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Records a duration measured elsewhere.
+        """
+        if not self.enabled:
+            return
+        window = self._windows.get(name)
+        if window is None:
+            with self._lock:
+                window = self._windows.setdefault(name, _Window(self.window))
+        window.add(seconds)
+
+    def end_frame(self) -> None:
+        """
+        Counts a frame and exports a line when the interval has passed.
+        """
+        if not self.enabled:
+            return
+        self.frames += 1
+        if self.export_file and time.monotonic() - self._last_export >= self.export_interval:
+            self.export()
+
+    # ---[ Reporting ]--- #
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        {stage: {"p50": ms, "p95": ms, "p99": ms, "n": samples}}
+        """
+        with self._lock:
+            windows = list(self._windows.items())
+        stats: dict[str, dict[str, float]] = {}
+        for name, window in windows:
+            values = window.values()
+            if not len(values):
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99)) * 1000.0
+            stats[name] = {"p50": round(float(p50), 3), "p95": round(float(p95), 3),
+                           "p99": round(float(p99), 3), "n": int(len(values))}
+        return stats
+
+    def export(self) -> None:
+        """
+        Appends the current stats as one JSON line to the export file.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_export
+        fps = (self.frames - self._frames_at_export) / elapsed if elapsed > 0 else 0.0
+        self._last_export = now
+        self._frames_at_export = self.frames
+        line = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "uptime": round(now - self._started, 3),
+            "frames": self.frames,
+            "fps": round(fps, 2),
+            "stages_ms": self.stats()
+        }
+        try:
+            with open(self.export_file, "a", encoding="utf-8") as file:
+                file.write(json.dumps(line) + "\n")
+        except OSError:
+            self.export_file = ""  # Stop trying
+
+    def draw_overlay(self, image: np.ndarray) -> None:
+        """
+        Draws "stage p50/p95/p99" lines onto an RGB image (in place).
+        The text is refreshed twice a second.
+        """
+        if not self.overlay:
+            return
+        import cv2
+
+        now = time.monotonic()
+        if now - self._overlay_time >= 0.5:
+            self._overlay_time = now
+            self._overlay_lines = [
+                f"{name:<10}{s['p50']:6.1f}{s['p95']:6.1f}{s['p99']:6.1f} ms"
+                for name, s in self.stats().items()
+            ]
+        scale = max(0.4, image.shape[0] / 1000.0)
+        step = int(22 * scale) + 2
+        for i, text in enumerate(self._overlay_lines):
+            position = (8, step * (i + 1))
+            cv2.putText(image, text, position, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(image, text, position, cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 0), 1, cv2.LINE_AA)
@@ -0,0 +1,71 @@
+#
+# Prefix search
+# Copyright (C) 2025 Remeny
+#
+# PrefixIndex keeps (key, value) pairs sorted by their case-folded key,
+# so every key starting with a prefix is one contiguous slice found with
+# two binary searches: O(log n + matches), no matter how many keys there
+# are. Used for the user list and other type-to-filter lists.
+#
+
+# ---[ Libraries ]--- #
+from bisect import bisect_left, insort
+from typing import Any, Iterable, Iterator, Union
+
+# ---[ Classes ]--- #
+class PrefixIndex:
+    """
+    Sorted, case-insensitive prefix index.
+
+    Args:
+        items (Iterable[tuple[str, Any]] | None): Initial (key, value) pairs.
+    """
+    def __init__(self, items: Union[Iterable[tuple[str, Any]], None] = None) -> None:
+        self._entries: list[tuple[str, str, Any]] = []  # (folded key, key, value)
+        if items is not None:
+            self._entries = sorted(((key.casefold(), key, value) for key, value in items),
+                                   key=lambda entry: (entry[0], entry[1]))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[tuple[str, Any]]:
+        for _, key, value in self._entries:
+            yield key, value
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        folded = prefix.casefold()
+        start = bisect_left(self._entries, (folded,))
+        # Every key starting with the prefix sorts before prefix + the highest code point
+        end = bisect_left(self._entries, (folded + "\U0010ffff",), lo=start)
+        return start, end
+
+    def add(self, key: str, value: Any = None) -> None:
+        self.remove(key)
+        insort(self._entries, (key.casefold(), key, value), key=lambda entry: (entry[0], entry[1]))
+
+    def remove(self, key: str) -> bool:
+        start, end = self._range(key)
+        for i in range(start, end):
+            if self._entries[i][1] == key:
+                del self._entries[i]
+                return True
+        return False
+
+    def count(self, prefix: str = "") -> int:
+        start, end = self._range(prefix)
+        return end - start
+
+    def search(self, prefix: str = "", limit: int = 0, offset: int = 0) -> list[tuple[str, Any]]:
+        """
+        (key, value) pairs whose key starts with prefix (ignoring case),
+        in key order. limit/offset select a window of the matches (0 = all).
+        """
+        start, end = self._range(prefix)
+        start = min(end, start + max(0, offset))
+        if limit > 0:
+            end = min(end, start + limit)
+        return [(key, value) for _, key, value in self._entries[start:end]]
+
+    def keys(self, prefix: str = "", limit: int = 0) -> list[str]:
+        return [key for key, _ in self.search(prefix, limit)]
@@ -0,0 +1,595 @@
+#
+# Typed settings snapshots
+# Copyright (C) 2025 Remeny
+#
+# configuration.ini and the user's settings.ini are parsed and validated
+# once into read-only objects (one per section, with __slots__), so hot
+# paths read shared.settings.debug.enable_debug instead of asking
+# ConfigParser to find and convert a string every time.
+#
+# A reload builds a complete new snapshot and swaps it in with a single
+# assignment, so readers always see either the old or the new settings.
+# Subsystems subscribe() to a section and are called with the old and
+# new section objects when it changes.
+#
+# Benchmark against ConfigParser lookups:
+#
+#   python -m ai_teacher.resources.settings
+#
+
+# ---[ Libraries ]--- #
+from configparser import ConfigParser
+from typing import Any, Callable, Union
+
+import configparser
+import os
+import threading
+import time
+
+# ---[ Exceptions ]--- #
+class SettingsError(ValueError):
+    """
+    One or more settings have invalid values.
+    """
+
+# ---[ Fields ]--- #
+BOOLEAN_STATES: dict[str, bool] = ConfigParser.BOOLEAN_STATES # type: ignore
+
+class Field:
+    """
+    One typed key of a section.
+
+    Args:
+        name (str): Key name in the ini file (and attribute name).
+        kind (type): bool, int, float or str.
+        default: Value used when the key is missing.
+        minimum, maximum: Allowed range for numbers (None = unlimited).
+        choices (tuple | None): Allowed values for strings (compared lowercased).
+    """
+    __slots__ = ("name", "kind", "default", "minimum", "maximum", "choices")
+
+    def __init__(self, name: str, kind: type, default: Any,
+                 minimum: Union[float, None] = None, maximum: Union[float, None] = None,
+                 choices: Union[tuple[str, ...], None] = None) -> None:
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = choices
+
+    def parse(self, raw: str) -> Any:
+        """
+        Converts and checks a raw ini value, raises ValueError if invalid.
+        """
+        raw = raw.strip()
+        if self.kind is bool:
+            if raw.lower() not in BOOLEAN_STATES:
+                raise ValueError(f"expected true/false, got '{raw}'")
+            return BOOLEAN_STATES[raw.lower()]
+        if self.kind is str:
+            if self.choices is not None:
+                raw = raw.lower()
+                if raw not in self.choices:
+                    raise ValueError(f"expected one of {', '.join(self.choices)}, got '{raw}'")
+            return raw
+        value = self.kind(raw)
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"must be at least {self.minimum}, got {value}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"must be at most {self.maximum}, got {value}")
+        return value
+
+# ---[ Sections ]--- #
+class Section:
+    """
+    Read-only values of one ini section. Subclasses set SECTION and
+    FIELDS, and __slots__ to the field names.
+    """
+    SECTION: str = ""
+    FIELDS: tuple[Field, ...] = ()
+    __slots__ = ()
+
+    def __init__(self, **values: Any) -> None:
+        for field in self.FIELDS:
+            object.__setattr__(self, field.name, values.get(field.name, field.default))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Settings are read-only, use functions.update_config() to change '{name}'")
+
+    def __eq__(self, other: object) -> bool:
+        return type(other) is type(self) and self.as_dict() == other.as_dict() # type: ignore
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.as_dict().items()))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())})"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {field.name: getattr(self, field.name) for field in self.FIELDS}
+
+    @classmethod
+    def from_config(cls, config: ConfigParser, problems: list[str]) -> "Section":
+        """
+        Parses the section. Invalid values are replaced by their
+        default and described in problems.
+        """
+        values: dict[str, Any] = {}
+        for field in cls.FIELDS:
+            raw = config.get(cls.SECTION, field.name, fallback=None, raw=True)
+            if raw is None:
+                continue
+            try:
+                values[field.name] = field.parse(raw)
+            except ValueError as e:
+                problems.append(f"[{cls.SECTION}] {field.name}: {e}")
+        return cls(**values)
+
+class DebugSettings(Section):
+    SECTION = "Debug"
+    FIELDS = (
+        Field("clear_terminal_on_startup", bool, True),
+        Field("enable_debug", bool, False),
+        Field("enable_logging", bool, False),
+        Field("log_directory", str, "logfiles"),
+        Field("log_max_size_kb", int, 1024, minimum=0),
+        Field("log_rotate_hours", float, 24.0, minimum=0),
+        Field("log_backup_count", int, 10, minimum=0),
+        Field("enable_profiler", bool, False),
+        Field("profiler_overlay", bool, True),
+        Field("profiler_export_interval", float, 5.0, minimum=0.1),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    clear_terminal_on_startup: bool
+    enable_debug: bool
+    enable_logging: bool
+    log_directory: str
+    log_max_size_kb: int
+    log_rotate_hours: float
+    log_backup_count: int
+    enable_profiler: bool
+    profiler_overlay: bool
+    profiler_export_interval: float
+
+class GUISettings(Section):
+    SECTION = "GUI"
+    FIELDS = (
+        Field("quick_exit", bool, True),
+        Field("notices", bool, True),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    quick_exit: bool
+    notices: bool
+
+class SoundSettings(Section):
+    SECTION = "Sound"
+    FIELDS = (
+        Field("enable", bool, True),
+        Field("frequency", int, 44100, minimum=8000, maximum=192000),
+        Field("buffer", int, 256, minimum=32, maximum=65536),
+        Field("channels", int, 8, minimum=2, maximum=64),
+        Field("preload_max_kb", int, 256, minimum=0),
+        Field("cache_size_kb", int, 8192, minimum=0),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    enable: bool
+    frequency: int
+    buffer: int
+    channels: int
+    preload_max_kb: int
+    cache_size_kb: int
+
+class SpeechSettings(Section):
+    SECTION = "Speech"
+    FIELDS = (
+        Field("enable", bool, True),
+        Field("engine", str, "auto", choices=("auto", "espeak", "stub", "off")),
+        Field("voice", str, "en"),
+        Field("rate", int, 170, minimum=80, maximum=450),
+        Field("volume", float, 0.9, minimum=0.0, maximum=1.0),
+        Field("workers", int, 2, minimum=1, maximum=8),
+        Field("prefetch", int, 3, minimum=1, maximum=16),
+        Field("max_sentence_chars", int, 200, minimum=20),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    enable: bool
+    engine: str
+    voice: str
+    rate: int
+    volume: float
+    workers: int
+    prefetch: int
+    max_sentence_chars: int
+
+class CameraSettings(Section):
+    SECTION = "Camera"
+    FIELDS = (
+        Field("warmup", bool, True),
+        Field("last_camera", int, -1, minimum=-1),
+        Field("probe_timeout", float, 2.0, minimum=0.1),
+        Field("rescan_interval", float, 2.0, minimum=0.1),
+        Field("preview_fps", float, 30.0, minimum=1.0),
+        Field("out_of_process", bool, False),
+        Field("roi_tracking", bool, False),
+        Field("roi_padding", float, 0.3, minimum=0.0, maximum=2.0),
+        Field("roi_size", int, 320, minimum=32),
+        Field("adaptive_rate", bool, False),
+        Field("motion_threshold", float, 0.004, minimum=0.0),
+        Field("max_skip_frames", int, 3, minimum=0),
+        Field("history_size", int, 256, minimum=1),
+        Field("event_enter_threshold", float, 0.25, minimum=0.0),
+        Field("event_exit_threshold", float, 0.15, minimum=0.0),
+        Field("event_hold_time", float, 0.15, minimum=0.0),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    warmup: bool
+    last_camera: int
+    probe_timeout: float
+    rescan_interval: float
+    preview_fps: float
+    out_of_process: bool
+    roi_tracking: bool
+    roi_padding: float
+    roi_size: int
+    adaptive_rate: bool
+    motion_threshold: float
+    max_skip_frames: int
+    history_size: int
+    event_enter_threshold: float
+    event_exit_threshold: float
+    event_hold_time: float
+
+    @classmethod
+    def from_config(cls, config: ConfigParser, problems: list[str]) -> "Section":
+        section: CameraSettings = super().from_config(config, problems) # type: ignore
+        if section.event_exit_threshold > section.event_enter_threshold:
+            problems.append("[Camera] event_exit_threshold must not be larger than event_enter_threshold")
+        return section
+
+class ServerSettings(Section):
+    SECTION = "Server"
+    FIELDS = (
+        Field("host", str, "127.0.0.1"),
+        Field("port", int, 8765, minimum=0, maximum=65535),
+        Field("workers", int, 0, minimum=0),
+        Field("max_pending", int, 2, minimum=1),
+        Field("max_frame_kb", int, 2048, minimum=1),
+        Field("timeout", float, 5.0, minimum=0.1),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    host: str
+    port: int
+    workers: int
+    max_pending: int
+    max_frame_kb: int
+    timeout: float
+
+class LessonSettings(Section):
+    SECTION = "Lessons"
+    FIELDS = (
+        Field("directory", str, "text/lessons"),
+        Field("max_chunk_chars", int, 1200, minimum=100),
+        Field("min_chunk_chars", int, 200, minimum=0),
+        Field("top_k", int, 4, minimum=1, maximum=50),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    directory: str
+    max_chunk_chars: int
+    min_chunk_chars: int
+    top_k: int
+
+    @classmethod
+    def from_config(cls, config: ConfigParser, problems: list[str]) -> "Section":
+        section: LessonSettings = super().from_config(config, problems) # type: ignore
+        if section.min_chunk_chars > section.max_chunk_chars:
+            problems.append("[Lessons] min_chunk_chars must not be larger than max_chunk_chars")
+        return section
+
+class TeacherSettings(Section):
+    SECTION = "Teacher"
+    FIELDS = (
+        Field("name", str, "Remeny"),
+        Field("persona", str, "A patient teacher who explains step by step and checks understanding."),
+        Field("language", str, "English"),
+        Field("temperature", float, 0.3, minimum=0.0, maximum=2.0),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    name: str
+    persona: str
+    language: str
+    temperature: float
+
+class LLMSettings(Section):
+    SECTION = "LLM"
+    FIELDS = (
+        Field("url", str, "http://127.0.0.1:8080/v1"),
+        Field("model", str, ""),
+        Field("pool_size", int, 4, minimum=1, maximum=64),
+        Field("connect_timeout", float, 5.0, minimum=0.1),
+        Field("first_token_timeout", float, 60.0, minimum=0.1),
+        Field("token_timeout", float, 15.0, minimum=0.1),
+        Field("queue_timeout", float, 30.0, minimum=0.1),
+        Field("max_tokens", int, 512, minimum=1),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    url: str
+    model: str
+    pool_size: int
+    connect_timeout: float
+    first_token_timeout: float
+    token_timeout: float
+    queue_timeout: float
+    max_tokens: int
+
+class CacheSettings(Section):
+    SECTION = "Cache"
+    FIELDS = (
+        Field("enable", bool, True),
+        Field("memory_entries", int, 256, minimum=0),
+        Field("max_size_mb", int, 64, minimum=1),
+        Field("ttl_hours", float, 168.0, minimum=0.0),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    enable: bool
+    memory_entries: int
+    max_size_mb: int
+    ttl_hours: float
+
+class VersionSettings(Section):
+    SECTION = "Version"
+    FIELDS = (
+        Field("major", int, 0, minimum=0),
+        Field("minor", int, 0, minimum=0),
+        Field("carry", int, 0, minimum=0),
+        Field("build", int, 0, minimum=0),
+        Field("codename", str, ""),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    major: int
+    minor: int
+    carry: int
+    build: int
+    codename: str
+
+class UserMainSettings(Section):
+    SECTION = "Main"
+    FIELDS = (
+        Field("disclaimer_accepted", bool, False),
+        Field("license_accepted", bool, False),
+        Field("theme", str, "system", choices=("auto", "system", "light", "dark")),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    disclaimer_accepted: bool
+    license_accepted: bool
+    theme: str
+
+class AccountSettings(Section):
+    SECTION = "Account"
+    FIELDS = (
+        Field("pretty_name", str, ""),
+    )
+    __slots__ = tuple(field.name for field in FIELDS)
+    pretty_name: str
+
+# ---[ Snapshots ]--- #
+class Snapshot:
+    """
+    All sections of one ini file. Subclasses map attribute names to
+    section classes in SECTIONS.
+    """
+    SECTIONS: dict[str, type[Section]] = {}
+    __slots__ = ("problems",)
+
+    def __init__(self, config: Union[ConfigParser, None] = None) -> None:
+        config = config if config is not None else ConfigParser()
+        problems: list[str] = []
+        for name, section in self.SECTIONS.items():
+            object.__setattr__(self, name, section.from_config(config, problems))
+        object.__setattr__(self, "problems", tuple(problems))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Settings are read-only")
+
+    def changed_sections(self, other: "Snapshot") -> list[str]:
+        """
+        Names of the sections whose values differ from other.
+        """
+        return [name for name in self.SECTIONS if getattr(self, name) != getattr(other, name)]
+
+class Settings(Snapshot):
+    """
+    configuration.ini
+    """
+    SECTIONS = {"debug": DebugSettings, "gui": GUISettings, "sound": SoundSettings,
+                "speech": SpeechSettings, "camera": CameraSettings, "server": ServerSettings,
+                "lessons": LessonSettings, "teacher": TeacherSettings, "llm": LLMSettings,
+                "cache": CacheSettings, "version": VersionSettings}
+    __slots__ = tuple(SECTIONS)
+    debug: DebugSettings
+    gui: GUISettings
+    sound: SoundSettings
+    speech: SpeechSettings
+    camera: CameraSettings
+    server: ServerSettings
+    lessons: LessonSettings
+    teacher: TeacherSettings
+    llm: LLMSettings
+    cache: CacheSettings
+    version: VersionSettings
+
+class UserSettings(Snapshot):
+    """
+    The user's settings.ini
+    """
+    SECTIONS = {"main": UserMainSettings, "account": AccountSettings}
+    __slots__ = tuple(SECTIONS)
+    main: UserMainSettings
+    account: AccountSettings
+
+# ---[ Loading and change notification ]--- #
+# {(snapshot class name, section attribute): [callback(old section, new section)]}
+subscribers: dict[tuple[str, str], list[Callable[[Any, Any], None]]] = {}
+subscribers_lock: threading.Lock = threading.Lock()
+watch_stop: Union[threading.Event, None] = None
+
+def load(config: ConfigParser, strict: bool = True) -> Settings:
+    """
+    Builds a settings snapshot. With strict, invalid values raise
+    SettingsError (listing all of them) instead of using defaults.
+    """
+    settings = Settings(config)
+    if strict and settings.problems:
+        raise SettingsError("Invalid settings in configuration.ini:\n" + "\n".join(settings.problems))
+    return settings
+
+def load_user(config: ConfigParser) -> UserSettings:
+    """
+    Builds a user settings snapshot. Invalid values use their defaults.
+    """
+    return UserSettings(config)
+
+def subscribe(section: str, callback: Callable[[Any, Any], None], user: bool = False) -> None:
+    """
+    Calls callback(old, new) whenever a section ("camera", "debug"...,
+    or with user=True "main", "account") changes. Callbacks run on the
+    thread that reloaded the settings.
+    """
+    key = (UserSettings.__name__ if user else Settings.__name__, section)
+    with subscribers_lock:
+        subscribers.setdefault(key, []).append(callback)
+
+def unsubscribe(section: str, callback: Callable[[Any, Any], None], user: bool = False) -> None:
+    key = (UserSettings.__name__ if user else Settings.__name__, section)
+    with subscribers_lock:
+        if callback in subscribers.get(key, []):
+            subscribers[key].remove(callback)
+
+def _notify(old: Snapshot, new: Snapshot) -> None:
+    from ai_teacher.resources import functions as f
+    for name in new.changed_sections(old):
+        with subscribers_lock:
+            callbacks = list(subscribers.get((type(new).__name__, name), ()))
+        f.dbg(f"Settings section '{name}' changed, notifying {len(callbacks)} subscriber(s)")
+        for callback in callbacks:
+            try:
+                callback(getattr(old, name), getattr(new, name))
+            except Exception as e:
+                f.dbg(f"Settings callback {callback} failed: {e}")
+
+def apply(settings: Settings) -> None:
+    """
+    Swaps in a new snapshot and notifies subscribers of changed sections.
+    """
+    from ai_teacher.resources import shared
+    old = shared.settings
+    shared.settings = settings
+    shared.debug = settings.debug.enable_debug
+    shared.log = settings.debug.enable_logging
+    _notify(old, settings)
+
+def apply_user(user_settings: UserSettings) -> None:
+    from ai_teacher.resources import shared
+    old = shared.user_settings
+    shared.user_settings = user_settings
+    _notify(old, user_settings)
+
+def refresh() -> None:
+    """
+    Rebuilds both snapshots from the in-memory configs (after update_config()).
+    """
+    from ai_teacher.resources import shared
+    apply(load(shared.config, strict=False))
+    apply_user(load_user(shared.user_config))
+
+def reload() -> bool:
+    """
+    Reads configuration.ini from disk again. A file that is missing,
+    empty, unparsable or has invalid values (e.g. half saved by an
+    editor) is rejected and the current settings stay. Returns whether
+    it was applied. Runs on the watcher thread, so it never quits the app.
+    """
+    from ai_teacher.resources import functions as f
+    from ai_teacher.resources import shared
+    config = ConfigParser()
+    try:
+        with open(shared.config_file, encoding="utf-8") as file:
+            config.read_file(file)
+        if not config.sections():
+            f.dbg("Not reloading settings: configuration.ini is empty")
+            return False
+        settings = load(config)
+    except (OSError, configparser.Error, ValueError) as e:
+        f.dbg(f"Not reloading settings: {e}")
+        return False
+    shared.config = config
+    apply(settings)
+    return True
+
+def watch(interval: float = 2.0) -> threading.Event:
+    """
+    Reloads configuration.ini whenever its modification time changes
+    (checked every interval seconds on a background thread). Set the
+    returned event to stop watching.
+    """
+    from ai_teacher.resources import shared
+    global watch_stop
+    if watch_stop is not None:
+        return watch_stop
+    stop = watch_stop = threading.Event()
+
+    def mtime() -> int:
+        try:
+            return os.stat(shared.config_file).st_mtime_ns
+        except OSError:
+            return 0
+
+    def run() -> None:
+        last = mtime()
+        while not stop.wait(interval):
+            current = mtime()
+            if current != last:
+                last = current
+                reload()
+
+    threading.Thread(target=run, name="settings-watch", daemon=True).start()
+    return stop
+
+# ---[ Benchmark ]--- #
+def main() -> int:
+    config = ConfigParser()
+    config.read_string("[Debug]\nenable_debug = false\n[Camera]\npreview_fps = 30\n")
+    settings = load(config)
+    reads = 1_000_000
+
+    def report(name: str, seconds: float) -> None:
+        print(f"{name:<40}{reads / seconds:>14,.0f} reads/s{seconds / reads * 1e9:>10.1f} ns/read")
+
+    start_time = time.perf_counter()
+    for _ in range(reads):
+        config.getboolean('Debug', 'enable_debug', fallback=False)
+    report("ConfigParser.getboolean()", time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    for _ in range(reads):
+        config.getfloat('Camera', 'preview_fps', fallback=30.0)
+    report("ConfigParser.getfloat()", time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    for _ in range(reads):
+        settings.debug.enable_debug
+    report("settings.debug.enable_debug", time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    for _ in range(reads):
+        settings.camera.preview_fps
+    report("settings.camera.preview_fps", time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    for _ in range(1000):
+        load(config)
+    print(f"{'Building a snapshot':<40}{(time.perf_counter() - start_time) / 1000 * 1e6:>14.1f} us")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -13,10 +13,19 @@ from ai_teacher.gui.gui import app
 from configparser import ConfigParser
 from datetime import datetime
 from customtkinter import CTk # type: ignore
+from ai_teacher.resources.settings import Settings, UserSettings
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ai_teacher.backend.userdata import UserStore
 
 # ---[ Shared variables ]--- #
 config: ConfigParser  = ConfigParser()
 user_config: ConfigParser = ConfigParser()
+# Typed, validated snapshots of config and user_config (see resources/settings.py).
+# Replaced as a whole on reload, never modified.
+settings: Settings = Settings()
+user_settings: UserSettings = UserSettings()
 
 init_time_formatted: datetime | None = None
 
@@ -35,6 +44,9 @@ config_file: str = ""
 user_config_file: str = ""
 user_name: str = ""
 user_dir: str = ""
+# Per-user SQLite store (backend.userdata), opened at login
+user_store: "UserStore | None" = None
+session_id: int | None = None
 
 app_dir: str = ""
 version: str = "<UNKNOWN>"
\ No newline at end of file
@@ -1,46 +1,294 @@
 #
-# This file contains sound file variables
-# Use .play() to play
+# Sound manager
+# Copyright (C) 2025 Remeny
+#
+# The sounds are listed in settings/sounds.txt, one per line:
+#
+#   <file name> [ui] [preload]
+#
+# 'ui' sounds (clicks, countdown ticks) play on a reserved mixer channel,
+# so they are never delayed by other sounds and a new tick cuts the
+# previous one off. A second reserved channel is kept for the teacher's
+# voice (see backend/speech.py). Small files and 'preload' sounds are loaded when
+# the mixer starts, bigger clips on first use, and only the most
+# recently used ones are kept (cache_size_kb in [Sound]).
+#
+# init() starts the mixer on a background thread. Until it is ready, or
+# when there is no audio device (or no pygame) at all, play() simply
+# returns False, so nothing else has to care.
+#
+# Example use: sounds.play("tick1")
 #
 
 # ---[ Libraries ]--- #
-import pygame
+from collections import OrderedDict
+from typing import Any, Union
+
 import os
+import queue
+import threading
 
-# ---[ Sound setup ]--- #
-# Filenames for sound (without path)
-# Define new sound filenames here
-#
-# Todo: make this into a separate txt file
-sound_filenames: list[str] = [
-    "tick1.wav",
-    "tick2.wav"
-]
+# ---[ Variables ]--- #
+SOUND_EXTENSIONS: tuple[str, ...] = (".wav", ".ogg")
+
+# ---[ Manifest ]--- #
+class SoundEntry:
+    """
+    One line of the sound manifest.
+    """
+    __slots__ = ("name", "path", "ui", "preload", "size")
+
+    def __init__(self, name: str, path: str, ui: bool = False, preload: bool = False, size: int = 0) -> None:
+        self.name = name
+        self.path = path
+        self.ui = ui
+        self.preload = preload
+        self.size = size
+
+def read_manifest(manifest_file: str, sound_directory: str) -> dict[str, SoundEntry]:
+    """
+    Reads the sound manifest. Returns {name without extension: entry}.
+    Empty lines and lines starting with '#' or ';' are ignored.
+    """
+    entries: dict[str, SoundEntry] = {}
+    with open(manifest_file, "r", encoding="utf-8") as file:
+        for line in file:
+            words = line.split()
+            if not words or words[0][0] in "#;":
+                continue
+            filename, flags = words[0], {word.lower() for word in words[1:]}
+            name, extension = os.path.splitext(filename)
+            if extension.lower() not in SOUND_EXTENSIONS:
+                continue
+            path = os.path.join(sound_directory, filename)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = -1  # Reported when the mixer starts
+            entries[name] = SoundEntry(name, path, ui="ui" in flags, preload="preload" in flags, size=size)
+    return entries
+
+# ---[ Manager ]--- #
+class SoundManager:
+    """
+    Loads and plays the sounds of the manifest.
+
+    Args:
+        sound_directory (str): Directory of the sound files.
+        manifest_file (str): Manifest file (see the top of this file).
+        frequency (int): Mixer sample rate.
+        buffer (int): Mixer buffer size in samples. Small = low latency.
+        channels (int): Number of mixer channels (two are reserved, for ui sounds and speech).
+        preload_max_bytes (int): Files up to this size are loaded when the mixer starts.
+        cache_bytes (int): Size of the other sounds kept loaded.
+    """
+    def __init__(self, sound_directory: str, manifest_file: str, frequency: int = 44100,
+                 buffer: int = 256, channels: int = 8, preload_max_bytes: int = 256 * 1024,
+                 cache_bytes: int = 8 * 1024 * 1024) -> None:
+        self.sound_directory = sound_directory
+        self.manifest_file = manifest_file
+        self.frequency = frequency
+        self.buffer = buffer
+        self.channels = max(3, channels)
+        self.preload_max_bytes = preload_max_bytes
+        self.cache_bytes = cache_bytes
+
+        self.entries: dict[str, SoundEntry] = {}
+        self.available: bool = False  # Mixer running
+        self.ready = threading.Event()  # Set when starting finished (successfully or not)
+
+        self._pygame: Any = None
+        self._ui_channel: Any = None
+        self._speech_channel: Any = None
+        self._preloaded: dict[str, Any] = {}
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._cache_size: int = 0
+        self._lock = threading.Lock()
+        self._requests: "queue.SimpleQueue[Union[str, None]]" = queue.SimpleQueue()
+        self._thread: Union[threading.Thread, None] = None
+
+    # ---[ Starting and stopping ]--- #
+    def start(self) -> None:
+        """
+        Starts the mixer and preloads sounds on a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sounds", daemon=True)
+            self._thread.start()
 
-# Dictionary to store loaded pygame Sound objects
-# Example use: sounds["tick1"].play()
-sounds: dict[str, pygame.mixer.Sound] = {}
+    def wait(self, timeout: Union[float, None] = None) -> bool:
+        """
+        Waits until starting has finished. Returns whether audio is available.
+        """
+        self.ready.wait(timeout)
+        return self.available
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join(2.0)
+            self._thread = None
+        if self.available:
+            self.available = False
+            self._pygame.mixer.quit()
+
+    def _open_mixer(self) -> bool:
+        from ai_teacher.resources import functions as f
+        try:
+            self.entries = read_manifest(self.manifest_file, self.sound_directory)
+        except OSError as e:
+            f.dbg(f"Sound manifest could not be read, sounds are off: {e}")
+            return False
+        try:
+            os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', "1")
+            import pygame
+        except ImportError:
+            f.dbg("pygame is not installed, sounds are off")
+            return False
+        try:
+            pygame.mixer.pre_init(self.frequency, -16, 2, self.buffer)
+            pygame.mixer.init()
+        except pygame.error as e:
+            f.dbg(f"No audio device, sounds are off: {e}")
+            return False
+
+        self._pygame = pygame
+        pygame.mixer.set_num_channels(self.channels)
+        pygame.mixer.set_reserved(2)
+        self._ui_channel = pygame.mixer.Channel(0)
+        self._speech_channel = pygame.mixer.Channel(1)
+        f.dbg(f"Mixer started: {pygame.mixer.get_init()}, buffer {self.buffer} samples")
+        return True
+
+    def _run(self) -> None:
+        from ai_teacher.resources import functions as f
+        try:
+            self.available = self._open_mixer()
+            if self.available:
+                for entry in self.entries.values():
+                    if entry.size < 0:
+                        f.dbg(f"Missing sound file: {entry.path}")
+                    elif entry.preload or entry.size <= self.preload_max_bytes:
+                        sound = self._load(entry)
+                        if sound is not None:
+                            self._preloaded[entry.name] = sound
+                f.dbg(f"Sounds preloaded: {list(self._preloaded)}")
+        finally:
+            self.ready.set()
+
+        # Then load sounds asked for with prefetch()
+        while True:
+            name = self._requests.get()
+            if name is None:
+                return
+            self.get(name)
+
+    @property
+    def speech_channel(self) -> Any:
+        """
+        The channel reserved for speech, None without audio.
+        """
+        return self._speech_channel if self.available else None
+
+    # ---[ Loading ]--- #
+    def _load(self, entry: SoundEntry) -> Any:
+        try:
+            return self._pygame.mixer.Sound(entry.path)
+        except (self._pygame.error, FileNotFoundError) as e:
+            from ai_teacher.resources import functions as f
+            f.dbg(f"Could not load sound {entry.path}: {e}")
+            return None
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the pygame Sound of a manifest entry, loading it if
+        needed, or None (unknown name, missing file, no audio).
+        """
+        if not self.available:
+            return None
+        sound = self._preloaded.get(name)
+        if sound is not None:
+            return sound
+        with self._lock:
+            sound = self._cache.get(name)
+            if sound is not None:
+                self._cache.move_to_end(name)
+                return sound
+        entry = self.entries.get(name)
+        if entry is None or entry.size < 0:
+            return None
+
+        sound = self._load(entry)
+        if sound is None:
+            return None
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = sound
+                self._cache_size += entry.size
+            # Drop the least recently used clips, but keep the one just loaded
+            while self._cache_size > self.cache_bytes and len(self._cache) > 1:
+                old_name, _ = self._cache.popitem(last=False)
+                self._cache_size -= self.entries[old_name].size
+        return sound
+
+    def prefetch(self, *names: str) -> None:
+        """
+        Loads sounds on the sound thread, so a later play() does not wait.
+        """
+        for name in names:
+            self._requests.put(name)
+
+    # ---[ Playing ]--- #
+    def play(self, name: str) -> bool:
+        """
+        Plays a sound. 'ui' sounds go to the reserved channel and replace
+        whatever it was playing. Returns False if nothing was played.
+        """
+        if not self.available:
+            return False
+        sound = self.get(name)
+        if sound is None:
+            return False
+        if self.entries[name].ui:
+            self._ui_channel.play(sound)
+        else:
+            sound.play()
+        return True
+
+# Manager of the application, set up by init()
+manager: Union[SoundManager, None] = None
 
 # ---[ Init function for sound ]--- #
-def init() -> None:
+def init() -> SoundManager:
+    """
+    Starts the sound manager in the background using the [Sound] section
+    of configuration.ini. Returns right away.
+    """
     from ai_teacher.resources import shared
-    # This variable contains directory path
-    sound_directory: str = os.path.join(shared.app_dir, "media", "sounds")
-    try:
-        pygame.mixer.init()
-    except pygame.error as e:
-        raise RuntimeError(f"Failed to initialize sound system: {e}")
-
-    if not os.path.isdir(sound_directory):
-        raise FileNotFoundError(f"Sound directory not found: {sound_directory}")
-    
-    for name in sound_filenames:
-        if os.path.splitext(name)[1].lower() != ".wav":
-            continue  # Skip non-wav files
-
-        full_path = os.path.join(sound_directory, name)
-        if not os.path.isfile(full_path):
-            raise FileNotFoundError(f"Missing sound file: {full_path}")
-        
-        sound_name = os.path.splitext(name)[0]  # Remove extension
-        sounds[sound_name] = pygame.mixer.Sound(full_path)
\ No newline at end of file
+    global manager
+    if manager is None:
+        sound = shared.settings.sound
+        manager = SoundManager(
+            os.path.join(shared.app_dir, "media", "sounds"),
+            os.path.join(shared.app_dir, "settings", "sounds.txt"),
+            frequency=sound.frequency,
+            buffer=sound.buffer,
+            channels=sound.channels,
+            preload_max_bytes=sound.preload_max_kb * 1024,
+            cache_bytes=sound.cache_size_kb * 1024
+        )
+        if sound.enable:
+            manager.start()
+        else:
+            manager.ready.set()
+    return manager
+
+def play(name: str) -> bool:
+    """
+    Plays a sound of the manifest if audio is available.
+    """
+    return manager is not None and manager.play(name)
+
+def prefetch(*names: str) -> None:
+    if manager is not None:
+        manager.prefetch(*names)
@@ -0,0 +1,109 @@
+#
+# Startup timing
+# Copyright (C) 2025 Remeny
+#
+# mark() records how long after launch the program reached a point
+# (imports done, init done...), report() formats those milestones for
+# the debug output.
+#
+# The command line report runs 'python -X importtime' on main.py, lists
+# the slowest imports and fails when a heavy module (OpenCV, MediaPipe,
+# pygame...) is imported before the login window or when the total is
+# over budget, so startup regressions are caught:
+#
+#   python -m ai_teacher.resources.startup [--top 15] [--budget-ms 1000]
+#
+
+# ---[ Libraries ]--- #
+import os
+import subprocess
+import sys
+import time
+
+# ---[ Variables ]--- #
+# Counted from the first import of this module (main.py imports it first)
+start_time: float = time.perf_counter()
+milestones: list[tuple[str, float]] = []
+
+# Modules that must only be loaded when the subsystem that needs them runs
+# (PIL is not in the list, customtkinter itself needs it)
+HEAVY_MODULES: tuple[str, ...] = ("cv2", "mediapipe", "numpy", "pygame", "sklearn")
+
+# ---[ Milestones ]--- #
+def mark(name: str) -> float:
+    """
+    Records a milestone and returns seconds since launch.
+    """
+    elapsed = time.perf_counter() - start_time
+    milestones.append((name, elapsed))
+    return elapsed
+
+def report() -> str:
+    """
+    'name: 123.4 ms (+12.3 ms)' per milestone, in order.
+    """
+    lines: list[str] = []
+    previous = 0.0
+    for name, elapsed in milestones:
+        lines.append(f"{name}: {elapsed * 1000:.1f} ms (+{(elapsed - previous) * 1000:.1f} ms)")
+        previous = elapsed
+    return "\n".join(lines)
+
+# ---[ Import time report ]--- #
+def import_times(statement: str = "import main", cwd: str = "") -> list[tuple[str, int, int, int]]:
+    """
+    Runs a statement in a fresh interpreter with -X importtime.
+    Returns (module, self us, cumulative us, depth) per import, in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd or None, capture_output=True, text=True,
+        env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{result.stderr[-2000:]}")
+
+    imports: list[tuple[str, int, int, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not own.strip().isdigit():
+            continue  # Header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(own), int(cumulative), depth))
+    return imports
+
+def main() -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report how long main.py takes to import.")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="Fail if importing main.py takes longer (0 = no limit)")
+    parser.add_argument("--allow", action="append", default=[], help="Heavy module that may be imported at startup")
+    args = parser.parse_args()
+
+    app_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    imports = import_times("import main", app_dir)
+    total_ms = sum(own for _, own, _, _ in imports) / 1000
+
+    print(f"{'cumulative':>12}{'self':>10}  module")
+    for name, own, cumulative, _ in sorted(imports, key=lambda i: i[2], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>10.1f}ms{own / 1000:>8.1f}ms  {name}")
+    print(f"{len(imports)} modules, {total_ms:.1f} ms in total")
+
+    failed = False
+    heavy = sorted({
+        name.split(".")[0] for name, _, _, _ in imports
+        if name.split(".")[0] in HEAVY_MODULES and name.split(".")[0] not in args.allow
+    })
+    if heavy:
+        print(f"Heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"Import time {total_ms:.1f} ms is over the budget of {args.budget_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
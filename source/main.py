@@ -4,6 +4,9 @@
 #
 
 # ---[ Libraries ]--- #
+from ai_teacher.resources import startup
+
+import argparse
 import os
 import sys
 import tkinter as tk
@@ -12,12 +15,43 @@ os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "1"
 
 from ai_teacher.resources import shared
 from ai_teacher.resources import functions as f
-from ai_teacher import gui
+from ai_teacher import gui  # Only gui.gui, the other windows load on first use
+
+# ---[ Command line ]--- #
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AI Teacher")
+    parser.add_argument("--serve", action="store_true",
+                        help="run the face tracking service for thin clients instead of the app ([Server] in configuration.ini)")
+    parser.add_argument("--host", help="address the service listens on")
+    parser.add_argument("--port", type=int, help="port the service listens on")
+    parser.add_argument("--workers", type=int, help="face tracking processes (0 = one per CPU core)")
+    return parser.parse_args(argv)
+
+# ---[ Face tracking service ]--- #
+def serve(args: argparse.Namespace) -> int:
+    f.init_settings()
+    from ai_teacher.backend import trackserver
+
+    server = shared.settings.server
+    return trackserver.serve(
+        host=args.host if args.host is not None else server.host,
+        port=args.port if args.port is not None else server.port,
+        workers=args.workers if args.workers is not None else server.workers,
+        max_pending=server.max_pending,
+        max_frame_kb=server.max_frame_kb,
+        timeout=server.timeout
+    )
 
 # ---[ Main Program Entry ]--- #
 def main():
     # Early init
+    startup.mark("imports")
     f.init()
+    startup.mark("init")
+    f.dbg(lambda: f"Startup:\n{startup.report()}")
+    # Load OpenCV/MediaPipe, open the camera and build FaceMesh while the user logs in
+    from ai_teacher.backend import warmup
+    warmup.start()
     # Login, license and session type
     from ai_teacher.backend.login import login
     from ai_teacher.resources.notices import show_notices
@@ -27,6 +61,12 @@ def main():
     shared.main_app = gui.gui.app() # Our main application window
     shared.session_type = gui.login.ask_session(shared.main_app)
     f.dbg(f"Session type: {shared.session_type}")
+    shared.session_id = shared.user_store.start_session(shared.session_type, int(shared.build_number))
+    shared.user_store.record_events(shared.session_id)
+    if shared.session_type == "basic":
+        # Index the lessons for the text chat while the camera starts
+        from ai_teacher.backend import retrieval
+        retrieval.start()
     
     # Camera trainer
     gui.camera.camera_trainer(shared.main_app)  # Start mediapipe and the user webcam
@@ -35,6 +75,10 @@ def main():
 
 if __name__ == "__main__":
     import traceback
+
+    args = parse_args()
+    if args.serve:
+        sys.exit(serve(args))
     
     def handle_exception(exc_type, exc_value, exc_traceback): # type: ignore
         if issubclass(exc_type, KeyboardInterrupt):